@@ -0,0 +1,53 @@
+"""Time a completion at a step input source of a large workflow and measure the
+size of the response, with the candidates filtered by the typed word and
+bounded, and as they were before, all sent for the client to filter.
+
+    python benchmarks/completion_benchmark.py [n_steps]
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+
+from benten.code.completionfilter import rank_completions
+from benten.langserver.jsoncodec import StdlibCodec
+from benten.langserver.lspobjects import Position
+
+from lib import load_type_dicts, open_text, synthetic_workflow, Timer
+
+
+def main(n_steps=3000):
+    source = f"      in1: step{n_steps // 2 - 1}/out1"
+    text = synthetic_workflow(n_steps, run="tool.cwl").replace(source, "      in1: step1")
+    doc = open_text(text, load_type_dicts())
+    loc = Position(text.splitlines().index("      in1: step1"), 16)
+    codec = StdlibCodec()
+
+    def all_candidates():
+        items = doc.completion(loc)
+        return items, codec.encode(items)
+
+    def ranked():
+        cmpl = rank_completions(doc.completion(loc), doc.word_before(loc))
+        return cmpl.items, codec.encode(cmpl)
+
+    def best_of(n, fn):
+        best = None
+        for _ in range(n):
+            with Timer() as t:
+                result = fn()
+            best = t.elapsed if best is None else min(best, t.elapsed)
+        return best, result
+
+    t_all, (items, payload_all) = best_of(5, all_candidates)
+    t_ranked, (ranked_items, payload_ranked) = best_of(5, ranked)
+
+    print(f"Workflow with {n_steps} steps, typed '{doc.word_before(loc)}', best of 5")
+    print(f"All candidates:       {t_all * 1e3:8.2f} ms "
+          f"{len(items):6} items {len(payload_all):9} bytes")
+    print(f"Filtered and ranked:  {t_ranked * 1e3:8.2f} ms "
+          f"{len(ranked_items):6} items {len(payload_ranked):9} bytes")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
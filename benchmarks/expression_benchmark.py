@@ -0,0 +1,123 @@
+"""Time hovers over an expression in a tool with a large expressionLib: the
+whole hover (which, repeated, is served from the evaluation cache), and the
+evaluation alone (`evaluate_expressions`, with the cache cleared), which runs in
+the JS workers and their warm interpreters, against the lib and expression
+evaluated in a fresh interpreter in this process (as it was done before the JS
+workers). Then, for a tool with many expressions, hovering each one against the
+inlay hints, which evaluate them all together. Last, a simple parameter
+reference, which `evaluate_expressions` does in Python, against the JS worker.
+
+    python benchmarks/expression_benchmark.py [n_lib_functions] [n_hovers]
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+
+import dukpy
+
+from benten.cwl.expressiontype import evaluate_expressions, ExpressionType, full_expression
+from benten.langserver.lspobjects import Position
+from benten.cwl.expressiontype import CWLExpression
+
+from lib import load_type_dicts, open_text, Timer
+
+
+def tool_with_lib(n_functions: int, n_expressions: int = 1):
+    lines = [
+        "class: CommandLineTool",
+        "cwlVersion: v1.0",
+        "requirements:",
+        "  InlineJavascriptRequirement:",
+        "    expressionLib:"
+    ]
+    lines += [f"      - function helper{n}(x) {{ return x + '_{n}'; }}" for n in range(n_functions)]
+    lines += ["inputs:"]
+    for n in range(n_expressions):
+        lines += [
+            f"  in{n + 1}:",
+            "    type: string",
+            "    inputBinding:",
+            f"      valueFrom: $(helper{n % n_functions}(inputs.in{n + 1}))"
+        ]
+    lines += ["outputs: []", ""]
+    return "\n".join(lines)
+
+
+def expression_at(doc, line: int) -> CWLExpression:
+    return next(ln.intelligence_node for ln in doc.latest.code_intelligence.lookup_table
+                if isinstance(ln.intelligence_node, CWLExpression) and ln.loc.start.line == line)
+
+
+def main(n_functions=1000, n_hovers=20):
+    text = tool_with_lib(n_functions)
+    doc = open_text(text, load_type_dicts())
+    line = text.splitlines().index("      valueFrom: $(helper0(inputs.in1))")
+    execution_context = doc.latest.code_intelligence.execution_context
+    expression = expression_at(doc, line)
+
+    def evaluate(_expression):
+        _expression.execution_context.evaluations.clear()
+        return evaluate_expressions([_expression])[0]
+
+    doc.hover(Position(line, 24))
+    with Timer() as t_hover:
+        for _ in range(n_hovers):
+            doc.hover(Position(line, 24))
+
+    code = full_expression("helper0(inputs.in1)", ExpressionType.ParameterReference)
+    with Timer() as t_fresh:
+        for _ in range(n_hovers):
+            dukpy.evaljs(execution_context.expression_lib + [code], runtime={}, inputs={"in1": "A"}, cwl_self=None)
+
+    evaluate(expression)
+    with Timer() as t_worker:
+        for _ in range(n_hovers):
+            evaluate(expression)
+
+    ref = "inputs.in1.basename"
+    ref_text = tool_with_lib(1).replace("type: string", "type: File").replace(
+        "$(helper0(inputs.in1))", f"$({ref})")
+    ref_doc = open_text(ref_text, load_type_dicts())
+    ref_expression = expression_at(ref_doc, ref_text.splitlines().index(f"      valueFrom: $({ref})"))
+    ref_inputs = {"in1": {"class": "File", "basename": "a.bam"}}
+    js_workers = execution_context.js_workers
+    code = full_expression(ref, ExpressionType.ParameterReference)
+    js_workers.evaluate([], code, runtime={}, inputs=ref_inputs, cwl_self=None)
+    with Timer() as t_ref_js:
+        for _ in range(n_hovers):
+            js_workers.evaluate([], code, runtime={}, inputs=ref_inputs, cwl_self=None)
+    with Timer() as t_ref_py:
+        for _ in range(n_hovers):
+            evaluate(ref_expression)
+
+    print(f"expressionLib with {n_functions} functions")
+    print(f"Hover:              {t_hover.elapsed / n_hovers * 1e3:8.2f} ms")
+    print(f"Fresh interpreter:  {t_fresh.elapsed / n_hovers * 1e3:8.2f} ms")
+    print(f"Evaluation:         {t_worker.elapsed / n_hovers * 1e3:8.2f} ms")
+
+    doc = open_text(tool_with_lib(n_functions, n_expressions=n_hovers), load_type_dicts())
+    document = doc.latest
+    execution_context = document.code_intelligence.execution_context
+    expressions = [ln for ln in document.code_intelligence.lookup_table
+                   if isinstance(ln.intelligence_node, CWLExpression)]
+
+    with Timer() as t_hovers:
+        for ln in expressions:
+            doc.hover(ln.loc.start)
+
+    execution_context.evaluations.clear()
+    with Timer() as t_hints:
+        hints = doc.inlay_hints()
+
+    print(f"{len(expressions)} expressions")
+    print(f"Hover each:         {t_hovers.elapsed * 1e3:8.2f} ms")
+    print(f"Inlay hints:        {t_hints.elapsed * 1e3:8.2f} ms ({len(hints)} hints)")
+
+    print(f"$({ref})")
+    print(f"JS worker:          {t_ref_js.elapsed / n_hovers * 1e6:8.2f} us")
+    print(f"Python:             {t_ref_py.elapsed / n_hovers * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
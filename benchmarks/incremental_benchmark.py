@@ -0,0 +1,68 @@
+"""Time a one character edit inside one step of a large workflow, with the
+analysis of unchanged subtrees reused, against a full re-analysis.
+
+    python benchmarks/incremental_benchmark.py [n_steps]
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+import pathlib
+import tempfile
+
+from benten.code.yaml import parse_yaml
+
+from lib import load_type_dicts, load_text, open_text, synthetic_workflow, Timer
+
+
+tool = """class: CommandLineTool
+cwlVersion: v1.0
+inputs:
+  in1: string
+outputs:
+  out1:
+    type: string
+    outputBinding:
+      outputEval: $(inputs.in1)
+baseCommand: echo
+"""
+
+
+def main(n_steps=500, repeats=5):
+    type_dicts = load_type_dicts()
+    tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix="benten-bench"))
+    pathlib.Path(tmp_dir, "tool.cwl").write_text(tool)
+    doc_path = pathlib.Path(tmp_dir, "wf.cwl")
+
+    with Timer() as t_full:
+        doc = open_text(synthetic_workflow(n_steps, run="tool.cwl"), type_dicts, doc_path)
+
+    # Edit the source of the step in the middle of the workflow, back and forth
+    line = next(n for n, l in enumerate(doc.buffer.lines) if l.startswith(f"  step{n_steps // 2}:")) + 3
+    col = doc.buffer.lines[line].index(":") + 2
+
+    with Timer() as t_edit:
+        for n in range(repeats):
+            doc.apply_changes([{
+                "range": {"start": {"line": line, "character": col},
+                          "end": {"line": line, "character": col + (n % 2)}},
+                "text": "x" if n % 2 == 0 else ""
+            }])
+            doc.update()
+
+    with Timer() as t_yaml:
+        for n in range(repeats):
+            parse_yaml(doc.text)
+
+    with Timer() as t_single:
+        load_text(synthetic_workflow(1, run="tool.cwl"), type_dicts, doc_path)
+
+    print(f"{n_steps} steps")
+    print(f"Full analysis:      {t_full.elapsed * 1e3:8.1f} ms")
+    print(f"One character edit: {t_edit.elapsed / repeats * 1e3:8.1f} ms")
+    print(f"  of which YAML:    {t_yaml.elapsed / repeats * 1e3:8.1f} ms")
+    print(f"One step workflow:  {t_single.elapsed * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,85 @@
+"""Encode and decode throughput of the JSON codecs on Benten's own messages:
+document symbols, completions and diagnostics for a large workflow and the
+didOpen notification that carries it. "to_dict+json" is how messages were
+encoded before the codecs (a to_dict pass, then json.dumps).
+
+    python benchmarks/json_benchmark.py [n_steps]
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+import json
+import timeit
+
+from benten.langserver.lspobjects import to_dict, Position, PublishDiagnosticsParams
+from benten.langserver.jsoncodec import available_codecs, get_codec
+
+from lib import load_type_dicts, load_text, synthetic_workflow
+
+
+def legacy_encode(obj):
+    return json.dumps(to_dict(obj), separators=(",", ":")).encode("utf-8")
+
+
+def legacy_decode(data):
+    return json.loads(bytes(data).decode("utf-8"))
+
+
+def payloads(n_steps):
+    type_dicts = load_type_dicts()
+    text = synthetic_workflow(n_steps)
+
+    doc = load_text(text, type_dicts)
+    symbols = doc.symbols
+
+    # Complete a source in the middle of the workflow: all the steps are candidates
+    lines = text.splitlines()
+    line = next(n for n, l in enumerate(lines) if l.startswith(f"  step{n_steps // 2}:"))
+    line = next(n for n in range(line, len(lines)) if lines[n].startswith("      in1:"))
+    doc = load_text("\n".join(lines[:line] + ["      in1: step"] + lines[line + 1:]), type_dicts)
+    completions = doc.completion(Position(line, len("      in1: step")))
+
+    doc = load_text(text.replace("/out1", "/out2"), type_dicts)
+    diagnostics = PublishDiagnosticsParams(uri="file:///wf.cwl", diagnostics=doc.problems)
+
+    did_open = {
+        "jsonrpc": "2.0",
+        "method": "textDocument/didOpen",
+        "params": {"textDocument": {"uri": "file:///wf.cwl", "languageId": "cwl", "version": 1,
+                                    "text": text + "# Ünïcödé \U0001F600\n"}}
+    }
+
+    def response(result):
+        return {"jsonrpc": "2.0", "id": 1, "result": result}
+
+    return {
+        f"documentSymbol ({len(symbols)} symbols)": response(symbols),
+        f"completion ({len(completions)} items)": response(completions),
+        f"diagnostics ({len(doc.problems)})": {
+            "jsonrpc": "2.0", "method": "textDocument/publishDiagnostics", "params": diagnostics},
+        "didOpen": did_open
+    }
+
+
+def throughput(f, arg, size):
+    n, t = timeit.Timer(lambda: f(arg)).autorange()
+    best = min(timeit.repeat(lambda: f(arg), number=n, repeat=3)) / n
+    return f"{best * 1e6:9.1f} us {size / best / 2**20:7.1f} MB/s"
+
+
+def main(n_steps=500):
+    coders = {"to_dict+json": (legacy_encode, legacy_decode)}
+    coders.update({name: (get_codec(name).encode, get_codec(name).decode) for name in available_codecs})
+
+    for name, message in payloads(n_steps).items():
+        size = len(legacy_encode(message))
+        print(f"{name}: {size / 1024:.0f} KiB")
+        for coder, (encode, decode) in coders.items():
+            data = encode(message)
+            print(f"  {coder:14} encode {throughput(encode, message, size)}"
+                  f"   decode {throughput(decode, memoryview(data), size)}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,98 @@
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import pathlib
+import tempfile
+import time
+
+from benten.code.document import Document
+from benten.code.opendocument import OpenDocument
+from benten.cwl.specification import parse_schema
+
+
+current_path = pathlib.Path(__file__).parent
+schema_path = pathlib.Path(current_path, "../benten/000.package.data/")
+
+
+def load_type_dicts():
+    type_dicts = {}
+    for fname in schema_path.glob("schema-*.json"):
+        version = fname.name[7:-5]
+        type_dicts[version] = parse_schema(fname)
+    return type_dicts
+
+
+def load_text(text: str, type_dicts: dict, doc_path: pathlib.Path = None):
+    doc_path = doc_path or pathlib.Path(tempfile.mkdtemp(prefix="benten-bench"), "wf.cwl")
+    return Document(
+        doc_uri=doc_path.as_uri(),
+        scratch_path=pathlib.Path(tempfile.mkdtemp(prefix="benten-bench")),
+        text=text,
+        version=1,
+        type_dicts=type_dicts)
+
+
+def open_text(text: str, type_dicts: dict, doc_path: pathlib.Path = None):
+    """An OpenDocument, analyzed once"""
+    doc_path = doc_path or pathlib.Path(tempfile.mkdtemp(prefix="benten-bench"), "wf.cwl")
+    doc = OpenDocument(
+        doc_uri=doc_path.as_uri(),
+        scratch_path=pathlib.Path(tempfile.mkdtemp(prefix="benten-bench")),
+        text=text,
+        version=1,
+        type_dicts=type_dicts)
+    doc.update()
+    return doc
+
+
+def synthetic_workflow(n_steps: int, run: str = None):
+    """A chain of `n_steps` steps. Steps use an inline tool unless a `run` path is given"""
+    lines = [
+        "class: Workflow",
+        "cwlVersion: v1.0",
+        "inputs:",
+        "  in0: string",
+        "steps:"
+    ]
+    for n in range(n_steps):
+        src = "in0" if n == 0 else f"step{n - 1}/out1"
+        lines += [f"  step{n}:"]
+        if run is not None:
+            lines += [f"    run: {run}"]
+        else:
+            lines += [
+                "    run:",
+                "      class: CommandLineTool",
+                "      inputs:",
+                "        in1:",
+                "          type: string",
+                "          inputBinding:",
+                "            valueFrom: $(self + '.txt')",
+                "      outputs:",
+                "        out1:",
+                "          type: string",
+                "          outputBinding:",
+                "            outputEval: $(inputs.in1)",
+                "      baseCommand: echo"
+            ]
+        lines += [
+            "    in:",
+            f"      in1: {src}",
+            "    out: [out1]"
+        ]
+    lines += [
+        "outputs:",
+        "  out1:",
+        "    type: string",
+        f"    outputSource: step{n_steps - 1}/out1",
+        ""
+    ]
+    return "\n".join(lines)
+
+
+class Timer:
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.t0
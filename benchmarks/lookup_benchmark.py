@@ -0,0 +1,52 @@
+"""Compares the position index used by Intelligence.get_doc_element with
+the original linear scan of the lookup table.
+
+    python benchmarks/lookup_benchmark.py [n_steps]
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+import random
+
+from benten.code.intelligence import LookupIndex
+from benten.langserver.lspobjects import Position
+
+from lib import load_type_dicts, load_text, synthetic_workflow, Timer
+
+
+def linear_scan(lookup_table, loc: Position):
+    for n in lookup_table:
+        if n.loc.start.line <= loc.line <= n.loc.end.line:
+            if loc.line > n.loc.start.line or loc.character >= n.loc.start.character:
+                if loc.line < n.loc.end.line or loc.character <= n.loc.end.character:
+                    return n.intelligence_node
+
+
+def main(n_steps=2000, n_queries=2000):
+    doc = load_text(synthetic_workflow(n_steps), load_type_dicts())
+    table = doc.code_intelligence.lookup_table
+    line_count = doc.text.count("\n")
+
+    random.seed(0)
+    queries = [Position(random.randint(0, line_count), random.randint(0, 40)) for _ in range(n_queries)]
+
+    with Timer() as t_build:
+        index = LookupIndex(table)
+
+    with Timer() as t_index:
+        for q in queries:
+            index.find(q)
+
+    with Timer() as t_linear:
+        for q in queries:
+            linear_scan(table, q)
+
+    print(f"{n_steps} steps, {len(table)} lookup nodes, {n_queries} queries")
+    print(f"Index build:  {t_build.elapsed * 1e3:8.2f} ms")
+    print(f"Index query:  {t_index.elapsed / n_queries * 1e6:8.2f} us/query")
+    print(f"Linear scan:  {t_linear.elapsed / n_queries * 1e6:8.2f} us/query")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
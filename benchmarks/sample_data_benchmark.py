@@ -0,0 +1,80 @@
+"""Time the first hover over a step expression in a workflow whose steps each run
+their own tool file. The sample data is generated as the expression needs it:
+only the outputs of the step it takes its input from. Generating all of it,
+as was done before, is timed for comparison.
+
+    python benchmarks/sample_data_benchmark.py [n_steps]
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+import pathlib
+import tempfile
+
+from benten.code.sampledata import get_sample_data
+from benten.langserver.lspobjects import Position
+
+from lib import load_type_dicts, open_text, Timer
+
+
+tool = """class: CommandLineTool
+cwlVersion: v1.0
+inputs:
+  in1: string
+outputs:
+  out1: File
+  out2: string[]
+baseCommand: echo
+"""
+
+
+def workflow_with_tools(n_steps: int, tool_dir: pathlib.Path):
+    lines = [
+        "class: Workflow",
+        "cwlVersion: v1.0",
+        "requirements:",
+        "  StepInputExpressionRequirement: {}",
+        "inputs:",
+        "  in0: string",
+        "steps:"
+    ]
+    for n in range(n_steps):
+        (tool_dir / f"tool{n}.cwl").write_text(tool)
+        src = "in0" if n == 0 else f"step{n - 1}/out2"
+        lines += [
+            f"  step{n}:",
+            f"    run: tool{n}.cwl",
+            "    in:",
+            "      in1:",
+            f"        source: {src}",
+            "        valueFrom: $(self[0])",
+            "    out: [out1, out2]"
+        ]
+    lines += ["outputs: []", ""]
+    return "\n".join(lines)
+
+
+def main(n_steps=300):
+    tool_dir = pathlib.Path(tempfile.mkdtemp(prefix="benten-bench"))
+    text = workflow_with_tools(n_steps, tool_dir)
+    doc = open_text(text, load_type_dicts(), doc_path=tool_dir / "wf.cwl")
+    document = doc.latest
+    line = text.splitlines().index(f"        source: step{n_steps // 2 - 1}/out2") + 1
+
+    with Timer() as t_hover:
+        doc.hover(Position(line, 22))
+
+    execution_context = document.code_intelligence.execution_context
+    with Timer() as t_all:
+        sample_data = get_sample_data(
+            execution_context.doc_uri, execution_context.workflow_model, execution_context.user_types)
+        n_values = sum(len(dict(v)) for v in sample_data.values())
+
+    print(f"Workflow with {n_steps} steps")
+    print(f"First hover:          {t_hover.elapsed * 1e3:8.2f} ms")
+    print(f"All sample data:      {t_all.elapsed * 1e3:8.2f} ms ({n_values} values)")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,61 @@
+"""Time loading the language models at startup: building them from the schema
+JSON (cold, empty model cache) against loading them from the model cache (warm).
+
+Each run is a fresh interpreter that sets up a Configuration as the server does,
+so the times include the imports. "initialize" is what the server does before it
+answers the client, the models are loaded after that as documents need them.
+
+    python benchmarks/startup_benchmark.py [runs]
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+startup = """
+import time
+t0 = time.perf_counter()
+from benten.configuration import Configuration
+t1 = time.perf_counter()
+config = Configuration()
+config.initialize()
+t2 = time.perf_counter()
+for version in config.lang_models:
+    _ = config.lang_models[version]
+t3 = time.perf_counter()
+print(f"{t1 - t0} {t2 - t1} {t3 - t2}")
+"""
+
+
+def run_once(config_home):
+    env = dict(os.environ, XDG_CONFIG_HOME=config_home, XDG_DATA_HOME=config_home)
+    out = subprocess.run([sys.executable, "-c", startup], env=env, check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return [float(t) for t in out.split()]
+
+
+def main(runs=5):
+    config_home = tempfile.mkdtemp(prefix="benten-bench")
+    cold, warm = [], []
+    try:
+        for n in range(runs):
+            shutil.rmtree(os.path.join(config_home, "sevenbridges", "benten", "model-cache"), ignore_errors=True)
+            cold += [run_once(config_home)]
+            warm += [run_once(config_home)]
+    finally:
+        shutil.rmtree(config_home, ignore_errors=True)
+
+    def best(times, idx):
+        return min(t[idx] for t in times) * 1e3
+
+    print(f"{'':8} {'imports':>10} {'initialize':>10} {'models':>10}")
+    for name, times in (("cold", cold), ("warm", warm)):
+        print(f"{name:8} " + " ".join(f"{best(times, n):8.1f}ms" for n in range(3)))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
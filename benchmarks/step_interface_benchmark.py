@@ -0,0 +1,81 @@
+"""Time a full analysis of a workflow whose steps run a few tools over and over,
+and the generation of all its sample data, with and without the step interface
+cache (as it was before the cache).
+
+    python benchmarks/step_interface_benchmark.py [n_steps] [n_tools]
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+import pathlib
+import tempfile
+
+from benten.code.processinterface import process_interface_cache
+
+from lib import load_type_dicts, load_text, Timer
+
+
+def tool(n_ports: int):
+    lines = ["class: CommandLineTool", "cwlVersion: v1.0", "inputs:"]
+    lines += [f"  in{n}:\n    type: string\n    doc: Input {n}" for n in range(n_ports)]
+    lines += ["outputs:"]
+    lines += [f"  out{n}:\n    type: File\n    doc: Output {n}" for n in range(n_ports)]
+    lines += ["baseCommand: echo", ""]
+    return "\n".join(lines)
+
+
+def workflow(n_steps: int, n_tools: int):
+    lines = ["class: Workflow", "cwlVersion: v1.0", "inputs:", "  in0: string", "steps:"]
+    for n in range(n_steps):
+        src = "in0" if n == 0 else f"step{n - 1}/out0"
+        lines += [
+            f"  step{n}:",
+            f"    run: tool{n % n_tools}.cwl",
+            "    in:",
+            f"      in0: {src}",
+            "    out: [out0]"
+        ]
+    lines += ["outputs: []", ""]
+    return "\n".join(lines)
+
+
+def analyze(text, type_dicts, doc_path):
+    doc = load_text(text, type_dicts, doc_path=doc_path)
+    inputs = doc.code_intelligence.execution_context.sample_data["inputs"]
+    return doc, len(list(inputs))
+
+
+def main(n_steps=300, n_tools=5):
+    tool_dir = pathlib.Path(tempfile.mkdtemp(prefix="benten-bench"))
+    for n in range(n_tools):
+        (tool_dir / f"tool{n}.cwl").write_text(tool(20))
+    text = workflow(n_steps, n_tools)
+    type_dicts = load_type_dicts()
+
+    # Linked files are read once in any case
+    analyze(text, type_dicts, tool_dir / "wf.cwl")
+
+    def best_of(n):
+        best = None
+        for _ in range(n):
+            with Timer() as t:
+                _, n_values = analyze(text, type_dicts, tool_dir / "wf.cwl")
+            best = t.elapsed if best is None else min(best, t.elapsed)
+        return best, n_values
+
+    t_cached, n_values = best_of(5)
+
+    # Every lookup misses
+    max_size, process_interface_cache.max_size = process_interface_cache.max_size, 0
+    process_interface_cache.clear()
+    t_uncached, _ = best_of(5)
+    process_interface_cache.max_size = max_size
+
+    print(f"{n_steps} steps running {n_tools} tools ({n_values} sample values), best of 5")
+    print(f"Interface cache:      {t_cached * 1e3:8.2f} ms")
+    print(f"No interface cache:   {t_uncached * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
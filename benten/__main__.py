@@ -1,13 +1,14 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
 import sys
-import socketserver
+import asyncio
 import pathlib
 
 from .configuration import Configuration
 
 from benten.version import __version__
-from benten.langserver.jsonrpc import JSONRPC2Connection, ReadWriter, TCPReadWriter
+from benten.langserver.jsonrpc import JSONRPC2Connection, ReadWriter
+from benten.langserver.asyncjsonrpc import AsyncJSONRPC2Connection, open_stdio_connection
 from benten.langserver.server import LangServer
 
 from logging.handlers import RotatingFileHandler
@@ -16,20 +17,24 @@ import logging
 logger = logging.getLogger()
 
 
-# https://stackoverflow.com/a/47075664
-# https://docs.python.org/3.6/library/socketserver.html#socketserver.ForkingMixIn
-class ForkingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    pass
+async def serve_stdio(config):
+    try:
+        conn = await open_stdio_connection()
+    except (OSError, ValueError, NotImplementedError) as e:
+        # E.g. stdin redirected from a file, or a Windows console
+        logger.info(f"Can't use stdin/stdout asynchronously ({e}), reading on a thread instead")
+        conn = JSONRPC2Connection(ReadWriter(sys.stdin.buffer, sys.stdout.buffer))
+    await LangServer(conn=conn, config=config).serve()
 
 
-class LangserverTCPTransport(socketserver.StreamRequestHandler):
+async def serve_tcp(host, addr, config):
 
-    config = None
+    async def serve_client(reader, writer):
+        await LangServer(conn=AsyncJSONRPC2Connection(reader, writer), config=config).serve()
 
-    def handle(self):
-        conn = JSONRPC2Connection(TCPReadWriter(self.rfile, self.wfile))
-        s = LangServer(conn=conn, config=self.config)
-        s.run()
+    server = await asyncio.start_server(serve_client, host, addr, reuse_address=True)
+    async with server:
+        await server.serve_forever()
 
 
 def main():
@@ -65,24 +70,17 @@ def main():
     logger.info(f"Benten {__version__}: CWL Language Server from Rabix (Seven Bridges)")
 
     config.initialize()
+    # Answer `initialize` right away and have the model most documents need ready by the
+    # time they come in. Other versions are loaded when a document first asks for them
+    config.lang_models.prefetch()
 
     if args.mode == "stdio":
         logger.info("Reading on stdin, writing on stdout")
-        s = LangServer(
-            conn=JSONRPC2Connection(ReadWriter(sys.stdin.buffer, sys.stdout.buffer)),
-            config=config)
-        s.run()
+        asyncio.run(serve_stdio(config))
     elif args.mode == "tcp":
         host, addr = "0.0.0.0", args.addr
         logger.info("Accepting TCP connections on %s:%s", host, addr)
-        ForkingTCPServer.allow_reuse_address = True
-        ForkingTCPServer.daemon_threads = True
-        LangserverTCPTransport.config = config
-        s = ForkingTCPServer((host, addr), LangserverTCPTransport)
-        try:
-            s.serve_forever()
-        finally:
-            s.shutdown()
+        asyncio.run(serve_tcp(host, addr, config))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+"""Filter and rank completion candidates by the word already typed at the cursor.
+
+A large workflow can offer thousands of step and port ids at a source field.
+Rather than send them all for the client to filter, only the best matches are
+sent, up to a limit, and the list is marked incomplete whenever candidates
+were left out, so that the client asks again as the word is typed further.
+
+A candidate matches if the typed word is a prefix of it (case sensitive first,
+then not), is found in it, or failing that, if the letters of the typed word
+appear in it in order (a fuzzy match). Within each kind of match the candidates
+whose matching letters are closest together, and start earliest, come first.
+Candidates that rank equally stay in the order they were offered.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import re
+from typing import List, Optional
+
+from ..langserver.lspobjects import CompletionItem, CompletionList
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+max_completion_items = 100
+
+# What can make up the word being completed: an id, a type, a file name. Not a
+# "/" or a "#" so that after "step1/" the port ids are matched by what follows
+_word_end = re.compile(r"[\w.\-]*$")
+
+
+def word_before(line: str, character: int) -> str:
+    """The word that ends at code point index `character` of the line. Leading dots
+    are dropped: the files offered after "run: .." are listed as "/tool.cwl" etc."""
+    return _word_end.search(line[:character]).group(0).lstrip(".")
+
+
+def rank_completions(items: Optional[List[CompletionItem]], typed: str,
+                     limit: int = max_completion_items) -> Optional[CompletionList]:
+    if items is None:
+        return None
+
+    if typed:
+        ranked = []
+        for n, item in enumerate(items):
+            key = _match(typed, item.filterText or item.label)
+            if key is not None:
+                ranked += [(key, n, item)]
+        ranked.sort(key=lambda r: r[:2])
+        matches = [item for _, _, item in ranked]
+    else:
+        matches = list(items)
+
+    is_incomplete = len(matches) < len(items) or len(matches) > limit
+    matches = matches[:limit]
+
+    if typed:
+        # Clients sort by sortText (or the label), which would undo the ranking
+        width = len(str(len(matches)))
+        for n, item in enumerate(matches):
+            item.sortText = str(n).zfill(width)
+
+    return CompletionList(is_incomplete=is_incomplete, items=matches)
+
+
+def _match(typed: str, label):
+    """A sort key for how well the label matches the typed word, None if it does not"""
+    if not isinstance(label, str):
+        return None
+
+    if label.startswith(typed):
+        return 0, 0, 0
+    _typed, _label = typed.lower(), label.lower()
+    if _label.startswith(_typed):
+        return 1, 0, 0
+    start = _label.find(_typed)
+    if start > -1:
+        return 2, 0, start
+
+    # The letters in order, each as early as possible
+    start = end = _label.find(_typed[0])
+    if start < 0:
+        return None
+    for c in _typed[1:]:
+        end = _label.find(c, end + 1)
+        if end < 0:
+            return None
+    return 3, end - start, start
@@ -2,28 +2,44 @@
 
 import time
 import pathlib
+from typing import List
 
 from .yaml import parse_yaml
+from .textbuffer import split_lines
 from .intelligence import Intelligence
 from .intelligencecontext import IntelligenceContext
+from .subtrees import subtree_spans
 from ..cwl.specification import latest_published_cwl_version, process_types
 from ..cwl.typeinference import infer_type
+from ..cwl.expressiontype import CWLExpression, evaluate_expressions
 from .symbols import extract_symbols, extract_step_symbols
 from .workflowgraph import cwl_graph
-from ..langserver.lspobjects import Position
+from ..langserver.lspobjects import Position, Range, InlayHint, MarkupContent
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+# Longer results are cut short in the hint, the whole result is in the tooltip
+inlay_hint_length = 40
+
+
 class Document:
+    """The analysis of one version of a document. It is not modified once constructed,
+    so it can be served from while a newer version is being analyzed.
+
+    Each Document has its own workflow and execution context. Intelligence reused from
+    the previous analysis (see `Intelligence.carry_over`) is pointed at them, and only
+    the caches of the execution context (evaluations, sample data, job file) are shared"""
 
     def __init__(self,
                  doc_uri: str,
                  scratch_path: pathlib.Path,  # Needed for ExecutionContext's example input file
                  text: str,
                  version: int,
-                 type_dicts: dict):
+                 type_dicts: dict,
+                 previous: 'Document' = None,
+                 lines: List[str] = None):
         self.doc_uri = doc_uri
         self.config = scratch_path
         self.text = text
@@ -31,17 +47,19 @@ class Document:
         self.type_dicts = type_dicts
 
         self.problems = None
-        self.code_intelligence = None
-        self.symbols = None
+        self.code_intelligence = Intelligence()
+        self.symbols = []
         self.wf_graph = None
 
-        self.update(text)
+        # Did the YAML load? If not, the last Document that did is the better one to serve
+        self.parsed = False
 
-    def update(self, new_text):
-        self.text = new_text
-        self.code_intelligence = Intelligence()
-        self.symbols = []
+        # Computed on the first request. (job file signature, hints)
+        self._inlay_hints = (None, None)
 
+        self._analyze(previous, lines if lines is not None else split_lines(text))
+
+    def _analyze(self, previous: 'Document', lines: List[str]):
         t0 = time.time()
         cwl, self.problems = parse_yaml(self.text)
         t1 = time.time()
@@ -52,9 +70,17 @@ class Document:
 
         t2 = time.time()
         self.code_intelligence.load_namespaces(cwl)
+        self.code_intelligence.carry_over(
+            previous=previous.code_intelligence if previous is not None and previous.parsed else None,
+            spans=subtree_spans(cwl, len(lines)),
+            lines=lines,
+            doc_context=(str(cwl.get("cwlVersion")), str(cwl.get("class")),
+                         repr(self.code_intelligence.namespaces)))
         self.code_intelligence.prepare_execution_context(self.doc_uri, cwl, self.config)
 
         self.parse(cwl)
+        self.code_intelligence.end_parse()
+        self.parsed = True
         t3 = time.time()
         logger.debug(f"Took {t3 - t2:1.3}s to parse {self.doc_uri}")
 
@@ -75,6 +101,29 @@ class Document:
         if de is not None:
             return de.hover()
 
+    def inlay_hints(self, _range: Range = None) -> List[InlayHint]:
+        """The result of every expression in the document, shown after the expression.
+        All the expressions are evaluated together, on the first request for this version
+        of the document, and again only if the job file changes"""
+        execution_context = self.code_intelligence.execution_context
+        if execution_context is None:
+            return []
+
+        signature = execution_context.check_job_file()
+        last_signature, hints = self._inlay_hints
+        if hints is None or signature != last_signature:
+            expressions = [
+                ln.intelligence_node for ln in self.code_intelligence.lookup_table
+                if isinstance(ln.intelligence_node, CWLExpression) and ln.intelligence_node.range is not None]
+            results = evaluate_expressions(expressions)
+            hints = [_inlay_hint(e, r) for e, r in zip(expressions, results)]
+            self._inlay_hints = (signature, hints)
+
+        if _range is None:
+            return hints
+        start, end = (_range.start.line, _range.start.character), (_range.end.line, _range.end.character)
+        return [h for h in hints if start <= (h.position.line, h.position.character) <= end]
+
     def parse(self, cwl):
         cwl_v = cwl.get("cwlVersion")
         if cwl_v not in self.type_dicts:
@@ -105,4 +154,15 @@ class Document:
                 symbols = extract_step_symbols(cwl, symbols)
 
         self.symbols = list(symbols.values())
-        self.wf_graph = cwl_graph(cwl)
+        self.wf_graph = cwl_graph(self.code_intelligence.workflow_model)
+
+
+def _inlay_hint(expression: CWLExpression, result: str) -> InlayHint:
+    label = result.splitlines()[0] if result else result
+    if len(label) > inlay_hint_length or label != result:
+        label = label[:inlay_hint_length - 1] + "…"
+    return InlayHint(
+        position=expression.range.end,
+        label="= " + label,
+        tooltip=MarkupContent(value="```\n" + result + "\n```"),
+        padding_left=True)
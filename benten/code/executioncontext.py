@@ -1,72 +1,226 @@
-"""Manages aspects related to test executions of the CWL and of JS expressions."""
+"""Manages aspects related to test executions of the CWL and of JS expressions.
+
+The results of evaluating expressions are remembered, keyed by everything that
+goes into an evaluation: the expression, the expression lib, the runtime, `self`
+and the inputs the expression refers to. They are forgotten when the job file
+changes.
+
+The generated sample data is kept until the interface of the process changes.
+It is written out to the job file only when the user asks to see it. The job
+file starts with a line naming the interface it was generated for, so it is
+not rewritten while the interface stays the same. A job file customized by the
+user is read again only when it changes on disk.
+"""
 
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
+import re
+import json
+import hashlib
 import pathlib
-
-from ..cwl.lib import un_mangle_uri, list_as_map
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from ..cwl.lib import un_mangle_uri
+from .jsworkers import default_pool
+from .jscontexts import lib_key
+from .filecache import file_signature
+from .workflowmodel import WorkflowModel
 from .sampledata import (
+    SampleValues,
     get_sample_runtime,
     get_sample_data,
-    get_sample_globbed_files)
-
-from ruamel.yaml import YAML
+    get_sample_globbed_files,
+    interface_hash)
 
 import logging
 logger = logging.getLogger(__name__)
 
-fast_yaml_io = YAML(typ='safe')
-fast_yaml_io.default_flow_style = False
+
+def fast_yaml_io():
+    # ruamel's YAML objects are not thread safe
+    return _thread_fast_yaml_io(threading.get_ident())
+
+
+@lru_cache(maxsize=16)
+def _thread_fast_yaml_io(thread_id):
+    from ruamel.yaml import YAML
+    yaml_io = YAML(typ='safe')
+    yaml_io.default_flow_style = False
+    # Sample values that happen to be shared should not show up as aliases
+    yaml_io.representer.ignore_aliases = lambda data: True
+    return yaml_io
+
 
 job_inputs_ext = ".benten.test.job.yml"
+job_interface_header = "#interface "
+
+# `inputs.name`, and `inputs` used any other way (e.g. `inputs["name"]`)
+input_ref = re.compile(r"\binputs\b(\s*\.\s*(\w+))?")
+
+
+def inputs_slice(expression: str, inputs: dict):
+    """The inputs the expression can see. All of them unless it only uses `inputs.name`.
+    The sample outputs of a workflow's steps ("step/out") are not inputs of the process,
+    they are only looked up by the steps, so they are not generated for this"""
+    names = set()
+    for m in input_ref.finditer(expression):
+        if m.group(2) is None:
+            return inputs.port_values() if isinstance(inputs, SampleValues) else dict(inputs)
+        names.add(m.group(2))
+    return {k: inputs[k] for k in sorted(names) if k in inputs}
+
+
+def evaluation_key(expression: str, expression_lib: str, runtime, inputs, cwl_self) -> str:
+    h = hashlib.sha1(expression_lib.encode())
+    h.update(json.dumps([expression, runtime, inputs, cwl_self], sort_keys=True, default=repr).encode())
+    return h.hexdigest()
+
+
+class EvaluationCache:
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+
+    def get(self, key: str):
+        with self._lock:
+            res = self._results.get(key)
+            if res is not None:
+                self._results.move_to_end(key)
+            return res
+
+    def put(self, key: str, res: str):
+        with self._lock:
+            self._results[key] = res
+            if len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
 
 
 class ExecutionContext:
     """Carries the job object (sample inputs), expression lib and, if a workflow, simulated
     outputs for each step"""
 
-    def __init__(self, doc_uri: str, cwl: dict, user_types: dict, scratch_path: pathlib.Path):
+    def __init__(self, doc_uri: str, cwl: dict, user_types: dict, scratch_path: pathlib.Path,
+                 workflow_model: WorkflowModel = None, caches_from: 'ExecutionContext' = None):
+        """`caches_from` is the context of an earlier parse of the same document, whose
+        evaluation results, sample data and job file state are carried over"""
         self.doc_uri = doc_uri
         self.cwl = cwl
         self.user_types = user_types
+        self.workflow_model = workflow_model or WorkflowModel(cwl)
         self.scratch_path = scratch_path
         self.expression_lib = []
         self._sample_data = None
+        self._interface = None
+        self._interface_checked = False
+        self.js_workers = default_pool()
+        self.evaluations = EvaluationCache()
+        self._job_file_signature = None
+        self._job_file = (None, None)
+        self._job_file_checked = False
+        self._lib = (None, None)
         # self._intermediate_outputs = None
 
+        if caches_from is not None:
+            self.evaluations = caches_from.evaluations
+            self._sample_data = caches_from._sample_data
+            self._interface = caches_from._interface
+            self._job_file_signature = caches_from._job_file_signature
+            self._job_file = caches_from._job_file
+            self._lib = caches_from._lib
+
     def runtime(self, doc_path: tuple):
         return get_sample_runtime(self.cwl, doc_path)
 
     @property
     def sample_data(self):
-        ex_job_file = self.get_sample_data_file_path()
-        if ex_job_file.exists():
-            if ex_job_file.open().readline().startswith("#custom"):
-                self._sample_data = fast_yaml_io.load(ex_job_file.open().read() or "")
-                return self._sample_data
+        # The job file is checked for changes once per request (see `check_job_file`)
+        if not self._job_file_checked:
+            self.check_job_file()
+        custom = self._job_file[1]
+        if custom is not None:
+            return custom
+
+        if not self._interface_checked:
+            interface = interface_hash(self.doc_uri, self.workflow_model, self.user_types)
+            if interface != self._interface:
+                self._sample_data = None
+                self._interface = interface
+            self._interface_checked = True
 
         if self._sample_data is None:
-            self._sample_data = get_sample_data(self.doc_uri, self.cwl, self.user_types)
-            ex_job_file.parent.mkdir(parents=True, exist_ok=True)
-            fast_yaml_io.dump(self._sample_data, ex_job_file)
-
+            self._sample_data = get_sample_data(self.doc_uri, self.workflow_model, self.user_types)
         return self._sample_data
 
+    def write_job_file(self) -> pathlib.Path:
+        """Write out the generated sample data, unless the job file already has it or is
+        customized"""
+        ex_job_file = self.get_sample_data_file_path()
+        self.check_job_file()
+        sample_data = self.sample_data
+        if self._job_file[1] is not None:
+            return ex_job_file
+
+        header = job_interface_header + self._interface
+        if self._job_file[0] != header:
+            ex_job_file.parent.mkdir(parents=True, exist_ok=True)
+            with ex_job_file.open("w") as f:
+                f.write(header + "\n")
+                fast_yaml_io().dump({k: dict(v) for k, v in sample_data.items()}, f)
+            self._job_file_signature = file_signature(ex_job_file)
+            self._job_file = (header, None)
+        return ex_job_file
+
+    def job_file_signature(self):
+        return file_signature(self.get_sample_data_file_path())
+
+    def check_job_file(self):
+        """Look for changes to the job file, and return its signature. Called once for each
+        request or batch of evaluations, which then use the data as it was. The file is read
+        again only when it changes, which also invalidates the evaluation results"""
+        ex_job_file = self.get_sample_data_file_path()
+        signature = file_signature(ex_job_file)
+        self._job_file_checked = True
+        if signature != self._job_file_signature:
+            self._job_file_signature = signature
+            self.evaluations.clear()
+            self._job_file = (None, None)
+            if signature is not None:
+                text = ex_job_file.read_text()
+                header = text.partition("\n")[0]
+                self._job_file = (header, fast_yaml_io().load(text) if header.startswith("#custom") else None)
+        return signature
+
+    def evaluation_key(self, expression: str, runtime: dict, inputs: dict, cwl_self) -> str:
+        # Hashing a big lib takes a while, and it changes only when the document is re-parsed
+        lib, key = self._lib
+        if lib is not self.expression_lib:
+            key = lib_key(self.expression_lib)
+            self._lib = (self.expression_lib, key)
+        return evaluation_key(expression, key, runtime, inputs_slice(expression, inputs or {}), cwl_self)
+
     def get_workflow_step_inputs(self, doc_path: tuple):
         step_id = doc_path[1]
         step_sample_outputs = self.sample_data["inputs"]
-        step_obj = list_as_map(self.cwl.get("steps"), key_field="id", problems=[]).get(step_id)
-        input_obj = {}
-        for k, in_obj in list_as_map(step_obj.get("in"), key_field="id", problems=[]).items():
-            if isinstance(in_obj, dict):
-                src = in_obj.get("source")
-            else:
-                src = in_obj
+        step = self.workflow_model.steps.get(step_id)
+        if step is None:
+            return {}, None
 
-            if isinstance(src, list):
-                input_obj[k] = [step_sample_outputs.get(s) for s in src]
+        input_obj = {}
+        for k, link in step.links.items():
+            values = [step_sample_outputs.get(s.source) if isinstance(s.source, str) else None
+                      for s in link.sources]
+            if link.is_list:
+                input_obj[k] = values
             else:
-                input_obj[k] = step_sample_outputs.get(src)
+                input_obj[k] = values[0] if values else None
 
         self_obj = input_obj.get(doc_path[3])
 
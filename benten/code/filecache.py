@@ -0,0 +1,91 @@
+"""Process wide cache of linked documents (`run` files, `$import`s and `$include`s).
+
+Linked files are read and parsed once and then reused for as long as they are
+unchanged on disk. An entry is checked against the file's mtime, size and inode
+on every access, which costs a `stat` instead of a read and YAML parse. Entries
+can also be dropped explicitly, e.g. on `workspace/didChangeWatchedFiles`, and
+the least recently used are dropped once the cache is full.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import stat
+import pathlib
+import threading
+from collections import OrderedDict
+
+from .yaml import fast_yaml_load
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class LinkedDocument:
+
+    def __init__(self, path: pathlib.Path, signature: tuple, contents: str):
+        self.path = path
+        self.signature = signature
+        self.contents = contents
+        # Shared between all users of the cache. Treat as read only
+        self.node = fast_yaml_load(contents)
+
+
+class LinkedFileCache:
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path: pathlib.Path) -> LinkedDocument:
+        """Returns None if the path is not a readable file. `path` should be resolved"""
+        try:
+            st = path.stat()
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        signature = _signature(st)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(path)
+                return entry
+
+        try:
+            entry = LinkedDocument(path, signature, path.read_text())
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"Could not read {path}: {e}")
+            return None
+
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, path: pathlib.Path = None):
+        """Drop the entry for `path`, or all entries"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+def file_signature(path: pathlib.Path):
+    try:
+        return _signature(path.stat())
+    except OSError:
+        return None
+
+
+def _signature(st):
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+linked_file_cache = LinkedFileCache()
@@ -9,11 +9,15 @@ For details see ../../docs/document-model.md
 
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
-from typing import List
+from typing import List, Dict
+import bisect
+import heapq
 import pathlib
 
 from ..langserver.lspobjects import (Position, Range, CompletionItem, Hover)
 from .executioncontext import ExecutionContext
+from .workflowmodel import WorkflowModel
+from .subtrees import SubtreeAnalysis, shifted, rebound
 
 import logging
 logger = logging.getLogger(__name__)
@@ -47,6 +51,64 @@ class IntelligenceNode:
 #     pass
 
 
+class LookupIndex:
+    """Maps document positions to the most specific (innermost) lookup node.
+
+    Lookup node ranges are inclusive at both ends. We sweep over all the range
+    boundaries once, splitting the document into elementary segments, and note
+    for each segment the innermost node that covers it. A cursor lookup is then
+    a binary search over the segment boundaries.
+
+    When ranges nest, the innermost is the one that starts last (and ends first).
+    Ties go to the node that was added to the lookup table first."""
+
+    def __init__(self, lookup_table: List[LookupNode]):
+        # Positions are packed into single ints, which keeps the sort,
+        # the sweep and the bisect cheap
+        events = []
+        for idx, n in enumerate(lookup_table):
+            if n.loc is None:
+                continue
+            start = _pos_key(n.loc.start.line, n.loc.start.character)
+            end = _pos_key(n.loc.end.line, n.loc.end.character) + 1  # exclusive end
+            if end <= start:
+                continue
+            events.append((start, 1, idx, end))
+            events.append((end, 0, idx, end))
+        events.sort()
+
+        self.boundaries: List[int] = []
+        self.nodes: List[LookupNode] = []
+
+        active, heap = set(), []
+        for point, starting, idx, end in events:
+            if starting:
+                active.add(idx)
+                heapq.heappush(heap, (-point, end, idx))
+            else:
+                active.discard(idx)
+
+            while heap and heap[0][2] not in active:
+                heapq.heappop(heap)
+
+            best = lookup_table[heap[0][2]] if heap else None
+            if self.boundaries and self.boundaries[-1] == point:
+                self.nodes[-1] = best
+            else:
+                self.boundaries.append(point)
+                self.nodes.append(best)
+
+    def find(self, loc: Position):
+        n = bisect.bisect_right(self.boundaries, _pos_key(loc.line, loc.character)) - 1
+        if n < 0:
+            return None
+        return self.nodes[n]
+
+
+def _pos_key(line, character):
+    return (line << 32) + character
+
+
 class Intelligence:
 
     def __init__(self):
@@ -54,31 +116,166 @@ class Intelligence:
         self.type_defs = {}
         self.namespaces = {}
         self.execution_context: ExecutionContext = None
+        self.workflow_model: WorkflowModel = None
+        self._lookup_index: LookupIndex = None
+
+        # For incremental re-analysis. See subtrees.py
+        self.subtrees: Dict[tuple, SubtreeAnalysis] = {}
+        self.linked_files = set()  # Local files the analysis loaded, to know when to redo it
+        self.top_level_workflow = None
+        self._previous_subtrees: Dict[tuple, SubtreeAnalysis] = {}
+        self._previous_execution_context: ExecutionContext = None
+        self._previous_workflow = None
+        self._rebound = {}  # id -> (object of the previous parse, its replacement in this one)
+        self._doc_context = None
+        self._spans = {}
+        self._lines = []
+        self._open_subtrees = []
 
     def add_lookup_node(self, node: LookupNode):
         self.lookup_table.append(node)
+        self._lookup_index = None
 
     def load_namespaces(self, cwl: dict):
         if "$namespaces" in cwl:
             self.namespaces = cwl["$namespaces"]
 
+    def carry_over(self, previous: 'Intelligence', spans: dict, lines: List[str], doc_context: tuple):
+        """Make the analysis of the subtrees of the previous parse available for reuse.
+        Nothing is reused if the document context (e.g. the CWL version) changed.
+        The previous analysis is only read from, as it may still be in use."""
+        self._spans = spans
+        self._lines = lines
+        self._doc_context = doc_context
+
+        if previous is not None:
+            # The caches of the execution context stay good whatever else changed
+            self._previous_execution_context = previous.execution_context
+
+        if previous is not None and previous._doc_context == doc_context:
+            self._previous_subtrees = previous.subtrees
+            self._previous_workflow = previous.top_level_workflow
+
     def prepare_execution_context(self, doc_uri: str, cwl: dict, scratch_path: pathlib.Path):
+        self.workflow_model = WorkflowModel(cwl)
         self.execution_context = ExecutionContext(
             doc_uri=doc_uri,
             scratch_path=scratch_path,
             cwl=cwl,
-            user_types=self.type_defs)
+            user_types=self.type_defs,
+            workflow_model=self.workflow_model,
+            caches_from=self._previous_execution_context)
+        self._rebind(self._previous_execution_context, self.execution_context)
+
+    def set_top_level_workflow(self, workflow):
+        self.top_level_workflow = workflow
+        self._rebind(self._previous_workflow, workflow)
+
+    def _rebind(self, old, new):
+        # Reused intelligence that refers to `old` is copied and pointed at `new`
+        if old is not None:
+            self._rebound[id(old)] = (old, new)
+
+    def end_parse(self):
+        """Let go of the previous parse"""
+        self._previous_subtrees = {}
+        self._previous_execution_context = None
+        self._previous_workflow = None
+        self._rebound = {}
 
     def prepare_expression_lib(self, expression_lib: list):
         self.execution_context.set_expression_lib(expression_lib)
 
+    def add_dependency(self, path):
+        """Note a linked file that the document, and the subtrees being parsed, depend on"""
+        if isinstance(path, pathlib.Path):
+            self.linked_files.add(path)
+        for record, _ in self._open_subtrees:
+            record.add_dependency(path)
+
+    def subtrees_to_parse(self, items, path: tuple, problems: list, workflow=None):
+        """Filter the (key, node) items of a collection, replaying the analysis of
+        those that can be reused and yielding the rest, which the caller parses"""
+        for k, v in items:
+            subtree_path = path + (k,)
+            span = self._spans.get(subtree_path)
+            if span is None:
+                yield k, v
+                continue
+
+            start_line, end_line = span
+            text = "".join(self._lines[start_line:end_line])
+            context = repr(list(self.type_defs.items()))
+
+            previous = self._previous_subtrees.get(subtree_path)
+            if previous is not None and previous.text == text and previous.context == context \
+                    and not previous.is_stale():
+                if previous.start_line != start_line:
+                    previous = shifted(previous, start_line)
+                self._replay(rebound(previous, self._rebound), problems, workflow)
+                continue
+
+            record = SubtreeAnalysis(path=subtree_path, start_line=start_line, text=text, context=context)
+            self._begin(record, problems, workflow)
+            yield k, v
+            self._end(problems, workflow)
+
+    def _begin(self, record: SubtreeAnalysis, problems: list, workflow):
+        state = (
+            len(self.lookup_table),
+            len(problems),
+            dict(self.type_defs),
+            self.execution_context.expression_lib,
+            len(workflow.step_intels) if workflow is not None else 0)
+        if self._open_subtrees:
+            self._open_subtrees[-1][0].children.append(record)
+        self._open_subtrees.append((record, state))
+
+    def _end(self, problems: list, workflow):
+        record, (n_lookup, n_problems, type_defs, expression_lib, n_steps) = self._open_subtrees.pop()
+
+        record.lookup_nodes = self.lookup_table[n_lookup:]
+        record.problems = problems[n_problems:]
+        record.type_defs = {k: v for k, v in self.type_defs.items() if type_defs.get(k) is not v}
+        if self.execution_context.expression_lib is not expression_lib:
+            record.expression_lib = self.execution_context.expression_lib
+        if workflow is not None and len(workflow.step_intels) != n_steps:
+            record.step_intels = dict(list(workflow.step_intels.items())[n_steps:])
+
+        self.subtrees[record.path] = record
+
+    def _replay(self, record: SubtreeAnalysis, problems: list, workflow):
+        self.lookup_table += record.lookup_nodes
+        self._lookup_index = None
+        problems += record.problems
+        self.type_defs.update(record.type_defs)
+        if record.expression_lib is not None:
+            self.prepare_expression_lib(record.expression_lib)
+        if workflow is not None:
+            for step_id, step_intel in record.step_intels.items():
+                workflow.add_step_intel(step_id, step_intel)
+
+        self.linked_files.update(record.dependencies.keys())
+        for open_record, _ in self._open_subtrees:
+            open_record.dependencies.update(record.dependencies)
+            open_record.volatile |= record.volatile
+        if self._open_subtrees:
+            self._open_subtrees[-1][0].children.append(record)
+
+        self._keep(record)
+
+    def _keep(self, record: SubtreeAnalysis):
+        self.subtrees[record.path] = record
+        for child in record.children:
+            self._keep(child)
+
     def get_doc_element(self, loc: Position):
-        # O(n) algorithm, but should do fine for our file sizes
-        # For now doing exact matches on lines, which is sufficient
-        for n in self.lookup_table:
-            if n.loc.start.line <= loc.line <= n.loc.end.line:
-                if loc.line > n.loc.start.line or loc.character >= n.loc.start.character:
-                    if loc.line < n.loc.end.line or loc.character <= n.loc.end.character:
-                        return n.intelligence_node
+        # The index is built once, on the first query after parsing
+        if self._lookup_index is None:
+            self._lookup_index = LookupIndex(self.lookup_table)
+
+        n = self._lookup_index.find(loc)
+        if n is not None:
+            return n.intelligence_node
 
         return None
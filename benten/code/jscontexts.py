@@ -0,0 +1,145 @@
+"""Warm JS interpreters for evaluating expressions.
+
+Starting an interpreter and evaluating the `expressionLib` in it costs far more
+than evaluating a typical expression, so interpreters with a lib already
+evaluated are kept, for the few libs used most recently. A changed lib is a
+different lib: its documents get a new interpreter and the old one is
+eventually dropped.
+
+An interpreter is reused across evaluations and documents, so the global names
+it has once the lib is evaluated are remembered, along with the state of the
+globals the lib defined. `benten_reset_globals()` deletes any global added since,
+and evaluates the lib again if an expression changed one of the lib's globals
+(or an object or array it holds). Callers run it after each evaluation, so that
+one expression does not affect the next. Changes to the builtins are not undone.
+The check walks what the lib defined, so it costs more the larger the lib is.
+
+Not thread safe. The JS workers (see jsworkers.py) each have their own.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import hashlib
+from collections import OrderedDict
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def lib_key(expression_lib: list) -> str:
+    h = hashlib.sha1()
+    for part in expression_lib or []:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# Evaluates the lib (with indirect eval, so the globals it declares can be deleted
+# like those of the expressions, see jsworkers.py) and defines benten_reset_globals()
+snapshot_globals_js = """
+(function (global, lib) {
+    var names = Object.getOwnPropertyNames, describe = Object.getOwnPropertyDescriptor,
+        _Map = typeof Map === 'function' ? Map : null;
+    var builtins = {};
+    names(global).forEach(function (k) { builtins[k] = true; });
+    (0, eval)(lib);
+
+    var kept = {'benten_reset_globals': true}, lib_names = [];
+    names(global).forEach(function (k) {
+        kept[k] = true;
+        if (!builtins.hasOwnProperty(k)) { lib_names.push(k); }
+    });
+
+    // The properties of the lib globals, and of every object reachable from them,
+    // as [object, keys, values]. Accessors are compared by their functions
+    function Accessor(d) { this.get = d.get; this.set = d.set; }
+    var lib_objects;
+
+    function value_of(v, k) {
+        var d = describe(v, k);
+        return 'value' in d ? d.value : new Accessor(d);
+    }
+    function take_snapshot() {
+        var seen = _Map ? new _Map() : null, seen_list = [];
+        lib_objects = [];
+        function visit(v) {
+            if (v === null || (typeof v !== 'object' && typeof v !== 'function') || v instanceof Accessor) {
+                return;
+            }
+            if (seen ? seen.has(v) : seen_list.indexOf(v) >= 0) { return; }
+            if (seen) { seen.set(v, true); } else { seen_list.push(v); }
+            var keys = names(v), values = keys.map(function (k) { return value_of(v, k); });
+            lib_objects.push([v, keys, values]);
+            values.forEach(visit);
+        }
+        lib_objects.push([global, lib_names, lib_names.map(function (k) { return value_of(global, k); })]);
+        lib_objects[0][2].forEach(visit);
+    }
+    function unchanged(v, k, before) {
+        if (before instanceof Accessor) {
+            var d = describe(v, k);
+            return d !== undefined && d.get === before.get && d.set === before.set;
+        }
+        var now = v[k];
+        return now === before ? (now !== undefined || k in v) : (now !== now && before !== before);
+    }
+    function lib_unchanged() {
+        for (var n = 0; n < lib_objects.length; n++) {
+            var v = lib_objects[n][0], keys = lib_objects[n][1], values = lib_objects[n][2];
+            if (n > 0) {
+                var now = names(v);
+                if (now.length !== keys.length) { return false; }
+                for (var j = 0; j < keys.length; j++) {
+                    if (now[j] !== keys[j]) { return false; }
+                }
+            }
+            for (var i = 0; i < keys.length; i++) {
+                if (!unchanged(v, keys[i], values[i])) { return false; }
+            }
+        }
+        return true;
+    }
+    take_snapshot();
+
+    global.benten_reset_globals = function () {
+        names(global).forEach(function (k) {
+            if (!kept.hasOwnProperty(k)) { delete global[k]; }
+        });
+        if (!lib_unchanged()) {
+            (0, eval)(lib);
+            take_snapshot();
+        }
+    };
+})(this, dukpy['benten_lib'])"""
+
+
+def new_interpreter(expression_lib: list):
+    # Deferred: dukpy is only needed once someone evaluates an expression
+    import dukpy
+
+    interpreter = dukpy.JSInterpreter()
+    interpreter.evaljs(snapshot_globals_js, benten_lib=";\n".join(expression_lib or []))
+    return interpreter
+
+
+class JSContexts:
+
+    def __init__(self, max_libs: int = 8):
+        self.max_libs = max_libs
+        self._interpreters = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._interpreters
+
+    def interpreter(self, key: str, expression_lib: list = None):
+        """The interpreter for the lib with this key, started with `expression_lib` if there isn't
+        one. Raises dukpy.JSRuntimeError if the lib itself fails to evaluate"""
+        interpreter = self._interpreters.get(key)
+        if interpreter is None:
+            interpreter = new_interpreter(expression_lib)
+            self._interpreters[key] = interpreter
+            if len(self._interpreters) > self.max_libs:
+                self._interpreters.popitem(last=False)
+        else:
+            self._interpreters.move_to_end(key)
+        return interpreter
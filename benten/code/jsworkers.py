@@ -0,0 +1,313 @@
+"""Evaluates JS expressions in worker processes.
+
+An expression can run forever (`${ while(true){} }`) and an interpreter can't be
+stopped from the outside, so expressions are evaluated in a small pool of
+worker processes. A worker that misses the deadline is killed and replaced and
+the caller gets a `JSTimeout`. Workers are also replaced after a number of
+evaluations, so interpreters that leak don't grow forever.
+
+Each worker keeps warm interpreters for the expression libs it has seen (see
+jscontexts.py). A lib is sent to a worker only when the worker asks for it.
+
+Expressions are sent in batches. Crossing into the interpreter costs more than
+evaluating a typical expression, so a batch is first evaluated in one pass: a
+single script that evaluates each expression in turn. If the pass misses the
+deadline, the batch is evaluated again an expression at a time, in a new
+worker, and the results are sent back one by one, each with its own deadline.
+If one expression times out the rest of the batch goes on in another worker.
+
+                     (key, None, [(code, args), ...], one_pass)
+    JSWorkerPool  ---------------------------------------------->  worker
+                  <----------------------------------------------  ("need_lib", None)
+                     (key, lib, [(code, args), ...], one_pass)
+                  ---------------------------------------------->
+                  <----------------------------------------------  ("ok", result) | ("error", message)
+                  <----------------------------------------------  ... one for each (code, args),
+                                                                   or all of them in a list if one_pass
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import time
+import threading
+import multiprocessing
+import itertools
+
+from .jscontexts import JSContexts, lib_key
+from ..langserver.cancellation import check_cancelled, RequestCancelled
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class JSTimeout(Exception):
+    pass
+
+
+class JSError(Exception):
+    """The expression (or the expression lib) threw, or the worker died"""
+    pass
+
+
+# Scripts are run with indirect eval, in the global scope, which gives us their completion
+# value. Unlike top level `var`s of evaljs code, the globals they declare can be deleted, so
+# the globals are reset after each one (see jscontexts.py)
+single_js = """
+try {
+    (0, eval)(dukpy['benten_code']);
+} finally {
+    benten_reset_globals();
+}"""
+
+# Evaluates each script of the batch as if on its own, with `dukpy.runtime` etc. set from its args
+one_pass_js = """
+(function () {
+    var _batch = dukpy['benten_batch'], _args = dukpy['benten_args'], _results = [];
+    for (var _n = 0; _n < _batch.length; _n++) {
+        var _a = _args[_batch[_n][1]];
+        dukpy['runtime'] = _a.runtime;
+        dukpy['inputs'] = _a.inputs;
+        dukpy['cwl_self'] = _a.cwl_self;
+        try {
+            _results.push(["ok", (0, eval)(_batch[_n][0])]);
+        } catch (e) {
+            _results.push(["error", String(e)]);
+        }
+        benten_reset_globals();
+    }
+    return _results;
+})()"""
+
+
+def worker_main(conn):
+    import dukpy
+
+    contexts = JSContexts()
+    conn.send(("ready", None))
+    while True:
+        try:
+            key, expression_lib, batch, one_pass = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        if key not in contexts and expression_lib is None:
+            conn.send(("need_lib", None))
+            continue
+
+        try:
+            interpreter = contexts.interpreter(key, expression_lib)
+        except dukpy.JSRuntimeError as e:
+            results = [("error", str(e))] * len(batch)
+            if one_pass:
+                conn.send(results)
+            else:
+                for r in results:
+                    conn.send(r)
+            continue
+
+        if one_pass:
+            conn.send(_evaluate_in_one_pass(interpreter, batch))
+            continue
+
+        for code, args in batch:
+            try:
+                conn.send(("ok", interpreter.evaljs(single_js, benten_code=code, **args)))
+            except dukpy.JSRuntimeError as e:
+                conn.send(("error", str(e)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def _evaluate_in_one_pass(interpreter, batch):
+    # Expressions of a document mostly share their args (the job inputs), so each is sent once
+    args, arg_index, items = [], {}, []
+    for code, a in batch:
+        n = arg_index.get(id(a))
+        if n is None:
+            n = arg_index[id(a)] = len(args)
+            args.append(a)
+        items.append([code, n])
+
+    try:
+        return [tuple(r) for r in interpreter.evaljs(one_pass_js, benten_batch=items, benten_args=args)]
+    except Exception as e:
+        return [("error", f"{type(e).__name__}: {e}")] * len(batch)
+
+
+class JSWorker:
+
+    # Python and dukpy have to start up before the first evaluation
+    startup_timeout = 10.0
+
+    def __init__(self, mp_context):
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.evaluations = 0
+
+    def evaluate(self, key: str, expression_lib: list, batch: list, timeout: float, one_pass: bool = False):
+        """Yields the result (or a JSError) for each (code, args) in the batch.
+        Raises JSTimeout for the first one that takes longer than `timeout`, or
+        if one_pass, when the whole batch does"""
+        if not self.ready:
+            self._receive(time.monotonic() + self.startup_timeout)
+            self.ready = True
+
+        self.evaluations += len(batch)
+        deadline = time.monotonic() + timeout
+        self.conn.send((key, None, batch, one_pass))
+        reply = self._receive(deadline)
+        if reply == ("need_lib", None):
+            self.conn.send((key, expression_lib, batch, one_pass))
+            reply = self._receive(deadline)
+
+        if one_pass:
+            replies = reply
+        else:
+            replies = itertools.chain([reply], (self._receive(time.monotonic() + timeout) for _ in batch[1:]))
+
+        for status, result in replies:
+            yield JSError(result) if status == "error" else result
+
+    def _receive(self, deadline: float):
+        # Wait in slices, so a cancelled request doesn't have to sit out the deadline
+        while not self.conn.poll(min(0.05, max(0.0, deadline - time.monotonic()))):
+            check_cancelled()
+            if time.monotonic() >= deadline:
+                raise JSTimeout()
+        return self.conn.recv()
+
+    def kill(self):
+        self.conn.close()
+        self.process.kill()
+        self.process.join()
+
+
+class JSWorkerPool:
+
+    def __init__(self, size: int = 2, timeout: float = 1.0, max_evaluations: int = 1000):
+        self.size = size
+        self.timeout = timeout
+        self.max_evaluations = max_evaluations
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._last_lib = (None, None)
+
+    def evaluate(self, expression_lib: list, code: str, **args):
+        """Evaluate `code` after `expression_lib`, with `args` on the `dukpy` global.
+        Raises JSTimeout, JSError or RequestCancelled"""
+        result = self.evaluate_batch(expression_lib, [(code, args)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def evaluate_batch(self, expression_lib: list, batch: list) -> list:
+        """Evaluate each (code, args) of the batch after `expression_lib`, in the same interpreter.
+        Returns a result, JSError or JSTimeout for each. Raises RequestCancelled"""
+        key = self._lib_key(expression_lib)
+        results = []
+
+        while not self._slots.acquire(timeout=0.05):
+            check_cancelled()
+
+        try:
+            if len(batch) > 1:
+                worker = self._take_worker()
+                try:
+                    results = list(worker.evaluate(key, expression_lib, batch, self.timeout, one_pass=True))
+                except JSTimeout:
+                    logger.warning(f"JS batch took longer than {self.timeout}s, evaluating one at a time")
+                    self._replace(worker)
+                    worker = None
+                except RequestCancelled:
+                    self._replace(worker)
+                    worker = None
+                    raise
+                except (EOFError, OSError) as e:
+                    logger.error(f"JS worker failed: {e}")
+                    self._replace(worker)
+                    worker = None
+                finally:
+                    if worker is not None:
+                        self._return_worker(worker)
+
+            while len(results) < len(batch):
+                worker = self._take_worker()
+                try:
+                    for result in worker.evaluate(key, expression_lib, batch[len(results):], self.timeout):
+                        results.append(result)
+                except JSTimeout as e:
+                    logger.warning(f"JS evaluation took longer than {self.timeout}s, restarting worker")
+                    self._replace(worker)
+                    worker = None
+                    results.append(e)
+                except RequestCancelled:
+                    # The worker may still be busy with it
+                    self._replace(worker)
+                    worker = None
+                    raise
+                except (EOFError, OSError) as e:
+                    logger.error(f"JS worker failed: {e}")
+                    self._replace(worker)
+                    worker = None
+                    results += [JSError("The JS worker stopped unexpectedly")] * (len(batch) - len(results))
+                finally:
+                    if worker is not None:
+                        self._return_worker(worker)
+        finally:
+            self._slots.release()
+
+        return results
+
+    def _lib_key(self, expression_lib: list):
+        # Hashing a big lib takes a while, and it is usually the same lib (object) as last time
+        lib, key = self._last_lib
+        if lib is not expression_lib:
+            key = lib_key(expression_lib)
+            self._last_lib = (expression_lib, key)
+        return key
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.kill()
+
+    def _take_worker(self) -> JSWorker:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return JSWorker(self._mp_context)
+
+    def _return_worker(self, worker: JSWorker):
+        if worker.evaluations >= self.max_evaluations:
+            logger.debug("Recycling JS worker")
+            self._replace(worker)
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def _replace(self, worker: JSWorker):
+        """Kill the worker and start a new one, which will be starting up while we do other things"""
+        if worker is None:
+            return
+        worker.kill()
+        with self._lock:
+            self._idle.append(JSWorker(self._mp_context))
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> JSWorkerPool:
+    """The pool shared by all documents. Workers are started when first needed"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = JSWorkerPool()
+        return _default_pool
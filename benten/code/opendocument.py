@@ -0,0 +1,130 @@
+"""A document the client has open: the text as edited so far and the latest
+analyses of it.
+
+Edits are applied to the text as they arrive. Analysis (`update`) is slow and is
+run separately, normally on the server's analysis thread. Each analysis produces
+a new `Document` which is published only once it is complete, so requests are
+answered straight away from the newest complete `Document`, or, while the YAML
+is broken, from the last one that loaded.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import time
+import pathlib
+import threading
+
+from .document import Document
+from .completionfilter import word_before
+from .textbuffer import TextBuffer
+from ..langserver.lspobjects import Position, Range
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class OpenDocument:
+
+    def __init__(self,
+                 doc_uri: str,
+                 scratch_path: pathlib.Path,
+                 text: str,
+                 version: int,
+                 type_dicts: dict):
+        self.doc_uri = doc_uri
+        self.scratch_path = scratch_path
+        self.type_dicts = type_dicts
+
+        self.buffer = TextBuffer(text)
+        self.version = version
+        self._lock = threading.Lock()
+
+        self.latest: Document = None     # The newest complete analysis
+        self.last_good: Document = None  # The newest analysis where the YAML loaded
+        self.analysis_time = 0.0         # How long the last analysis took (s)
+
+    @property
+    def text(self):
+        with self._lock:
+            return self.buffer.text
+
+    def apply_changes(self, content_changes: list, version: int = None):
+        """Apply `contentChanges` from a `textDocument/didChange` in order.
+        A change with a range is an incremental edit, one without is the full text."""
+        with self._lock:
+            for change in content_changes:
+                if "range" in change:
+                    _range = change["range"]
+                    self.buffer.edit(
+                        _range=Range(start=Position(**_range["start"]), end=Position(**_range["end"])),
+                        new_text=change["text"])
+                else:
+                    self.buffer = TextBuffer(change["text"])
+
+            if version is not None:
+                self.version = version
+
+    def update(self) -> Document:
+        """Analyze the current text and publish the result. Only one update
+        should run at a time for a given document"""
+        with self._lock:
+            text, version, lines = self.buffer.text, self.version, list(self.buffer.lines)
+
+        t0 = time.perf_counter()
+        document = Document(
+            doc_uri=self.doc_uri,
+            scratch_path=self.scratch_path,
+            text=text,
+            version=version,
+            type_dicts=self.type_dicts,
+            previous=self.last_good,
+            lines=lines)
+        self.analysis_time = time.perf_counter() - t0
+
+        self.latest = document
+        if document.parsed:
+            self.last_good = document
+        return document
+
+    @property
+    def servable(self) -> Document:
+        latest = self.latest
+        if latest is not None and not latest.parsed and self.last_good is not None:
+            return self.last_good
+        return latest
+
+    def links_to(self, paths: set) -> bool:
+        """Could a change to any of these files change the analysis? True until
+        there is an analysis to tell"""
+        documents = [d for d in (self.latest, self.last_good) if d is not None]
+        if not documents:
+            return True
+        return any(not paths.isdisjoint(d.code_intelligence.linked_files) for d in documents)
+
+    def definition(self, loc: Position):
+        document = self.servable
+        if document is not None:
+            return document.definition(loc)
+
+    def completion(self, loc: Position):
+        document = self.servable
+        if document is not None:
+            return document.completion(loc)
+
+    def word_before(self, loc: Position) -> str:
+        """The word typed so far at `loc`, from the text as it is now, which may be
+        ahead of the analysis"""
+        with self._lock:
+            line, character = self.buffer._index(loc)
+            return word_before(self.buffer.lines[line], character)
+
+    def hover(self, loc: Position):
+        document = self.servable
+        if document is not None:
+            return document.hover(loc)
+
+    def inlay_hints(self, _range: Range = None):
+        document = self.servable
+        if document is not None:
+            return document.inlay_hints(_range)
+        return []
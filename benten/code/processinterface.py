@@ -0,0 +1,96 @@
+"""Summaries of the interface of a process: the ids, types and docs of its
+inputs and outputs, as needed by the steps that run it.
+
+The same few tools are often run by many steps, in many workflows, so the
+summaries of linked processes are kept in a process wide cache keyed by a hash
+of the linked file's contents. A changed file is a different file, and files
+with the same contents share a summary. Inline processes are summarized each
+time.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from ..cwl.lib import list_as_map
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PortSummary:
+    def __init__(self, port_id: str, node):
+        self.id = port_id
+        # The port as written, e.g. for generating sample values
+        self.node = node
+        self.type = node.get("type") if isinstance(node, dict) else node
+        self.doc = node.get("doc") if isinstance(node, dict) else None
+        self.label = node.get("label") if isinstance(node, dict) else None
+
+
+class ProcessInterface:
+
+    def __init__(self, node: dict):
+        # Found in making the summary, to be reported wherever it is used
+        self.problems = []
+        self.inputs: Dict[str, PortSummary] = _summarize(node.get("inputs"), self.problems)
+        self.outputs: Dict[str, PortSummary] = _summarize(node.get("outputs"), self.problems)
+        # Memo for the sample data (see sampledata.py), by a hash of the user types. Shared by
+        # every step that runs this process, in any document, and filled from any thread
+        self._sample_outputs = {}
+        self._lock = threading.Lock()
+
+    def sample_outputs(self, key: str, generate) -> dict:
+        """The sample outputs for `key`, made by `generate()` the first time. Each caller gets
+        its own copy"""
+        with self._lock:
+            outputs = self._sample_outputs.get(key)
+            if outputs is None:
+                outputs = self._sample_outputs[key] = generate()
+        return copy.deepcopy(outputs)
+
+
+def _summarize(ports, problems) -> Dict[str, PortSummary]:
+    return {
+        k: PortSummary(k, v)
+        for k, v in list_as_map(ports, key_field="id", problems=problems).items()
+    }
+
+
+class ProcessInterfaceCache:
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._interfaces = OrderedDict()
+
+    def get(self, node: dict, contents: str = None) -> ProcessInterface:
+        """The interface of the process in `node`. `contents` is the text of the linked file
+        the node was loaded from, None for an inline process"""
+        if contents is None:
+            return ProcessInterface(node)
+
+        key = hashlib.sha1(contents.encode("utf-8")).hexdigest()
+        with self._lock:
+            interface = self._interfaces.get(key)
+            if interface is not None:
+                self._interfaces.move_to_end(key)
+                return interface
+
+        interface = ProcessInterface(node)
+        with self._lock:
+            self._interfaces[key] = interface
+            if len(self._interfaces) > self.max_size:
+                self._interfaces.popitem(last=False)
+        return interface
+
+    def clear(self):
+        with self._lock:
+            self._interfaces.clear()
+
+
+process_interface_cache = ProcessInterfaceCache()
@@ -15,12 +15,55 @@ The sample data is stored in a dictionary with the following structure
 
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
+import json
 import random
 import string
+import hashlib
+import threading
+from typing import Dict
+from collections.abc import Mapping
 
 from ..cwl.lib import resolve_file_path, list_as_map
 from .schemadef import extract_schemadef
-from .yaml import fast_load
+from .filecache import linked_file_cache, file_signature
+from .workflowmodel import WorkflowModel, StepModel
+from .processinterface import process_interface_cache
+
+
+def _stable_json(obj) -> str:
+    return json.dumps(obj, sort_keys=True, default=repr)
+
+
+def seeded_random(name, cwl_type) -> random.Random:
+    """A generator seeded from the port's name and type, the same from one session to the next"""
+    return random.Random(hashlib.sha1(_stable_json([name, cwl_type]).encode()).hexdigest())
+
+
+def _port_types(ports):
+    if not isinstance(ports, (list, dict)):
+        return {}
+    return {
+        k: {f: v.get(f) for f in ("type", "secondaryFiles")} if isinstance(v, dict) else v
+        for k, v in list_as_map(ports, key_field="id", problems=[]).items()
+    }
+
+
+def interface_hash(doc_uri: str, model: WorkflowModel, user_types: dict) -> str:
+    """Hash of everything the sample data is generated from: the types of the inputs and outputs
+    of the process, the user types and, for a workflow, the outputs of each step's process (a
+    linked process stands in with its file signature)"""
+    steps = []
+    for step_id, step in model.steps.items():
+        run_field = step.run
+        if isinstance(run_field, str):
+            run_field = [run_field, file_signature(resolve_file_path(doc_uri, run_field))]
+        elif isinstance(run_field, dict):
+            run_field = _port_types(run_field.get("outputs"))
+        steps.append([step_id, run_field])
+
+    return hashlib.sha1(_stable_json(
+        [_port_types(model.inputs.as_dict), _port_types(model.outputs.as_dict), steps, user_types]
+    ).encode()).hexdigest()
 
 
 def get_sample_runtime(cwl: dict, doc_path: tuple):
@@ -44,78 +87,115 @@ def get_sample_runtime(cwl: dict, doc_path: tuple):
     return runtime
 
 
-def get_sample_data(doc_uri: str, cwl: dict, user_types: dict):
+def get_sample_data(doc_uri: str, model: WorkflowModel, user_types: dict):
     return {
-        "inputs": {
-            **generate_sample_inputs(cwl, user_types),
-            **generate_sample_intermediate_results(doc_uri, cwl, user_types)
-        },
-        "outputs": generate_sample_outputs(cwl, user_types)
+        "inputs": SampleValues(model.inputs.as_dict, user_types, doc_uri=doc_uri, steps=model.steps),
+        "outputs": SampleValues(model.outputs.as_dict, user_types)
     }
 
 
-def get_sample_globbed_files(name):
-    return [
-        basic_example_value(name + "/globbed_file_" + str(i), "File")
-        for i in range(random.randint(0, 4))
-    ]
+class SampleValues(Mapping):
+    """Sample values for the ports, and for the outputs of the steps ("step/out"), generated as
+    they are looked up. Going over all of them generates all of them"""
 
+    def __init__(self, ports: dict, user_types: dict, doc_uri: str = None, steps: Dict[str, StepModel] = None):
+        self.ports = ports
+        self.user_types = user_types
+        self.doc_uri = doc_uri
+        self.steps = steps or {}
+        self._values = {}
+        self._step_keys = {}
+        self._lock = threading.Lock()
 
-def generate_sample_inputs(cwl: dict, user_types: dict):
-    return generate_values(cwl.get("inputs"), user_types)
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            raise KeyError(key)
 
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
 
-def generate_sample_outputs(cwl: dict, user_types: dict):
-    return generate_values(cwl.get("outputs"), user_types)
+            if key in self.ports:
+                value = self._values[key] = example_value(key, self.ports[key], self.user_types)
+                return value
 
+            step_id = key.partition("/")[0]
+            if step_id in self.steps and step_id not in self._step_keys:
+                self._generate_step(step_id)
+                if key in self._values:
+                    return self._values[key]
 
-def generate_sample_intermediate_results(doc_uri: str, cwl: dict, parent_user_types):
-    return {
-        step_id + "/" + k: v
-        for step_id, step in list_as_map(cwl.get("steps"), key_field="id", problems=[]).items()
-        for k, v in extract_step_sample_outputs(doc_uri, step.get("run"), parent_user_types).items()
-    }
+        raise KeyError(key)
 
+    def _generate_step(self, step_id):
+        outputs = extract_step_sample_outputs(self.doc_uri, self.steps[step_id].run, self.user_types)
+        self._step_keys[step_id] = [step_id + "/" + k for k in outputs]
+        for k, v in outputs.items():
+            self._values[step_id + "/" + k] = v
 
-def generate_values(_ports: dict, user_types: dict):
-    if not isinstance(_ports, (list, dict)):
-        _ports = {}
-    return {
-        k: example_value(k, _type_v, user_types)
-        for k, _type_v in list_as_map(_ports, key_field="id", problems=[]).items()
-    }
+    def port_values(self) -> dict:
+        """The values of the ports, without those of the step outputs"""
+        return {k: self[k] for k in self.ports}
+
+    def __iter__(self):
+        yield from self.ports
+        for step_id in self.steps:
+            with self._lock:
+                if step_id not in self._step_keys:
+                    self._generate_step(step_id)
+            yield from self._step_keys[step_id]
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        return bool(self.ports or self.steps)
+
+
+def get_sample_globbed_files(name):
+    return [
+        basic_example_value(name + "/globbed_file_" + str(i), "File")
+        for i in range(seeded_random(name, "glob").randint(0, 4))
+    ]
 
 
 # This should be invoked when we arrive at the "run" field of a workflow
 def extract_step_sample_outputs(doc_uri: str, run_field, parent_user_types):
 
     # todo: verify this works with inlined steps
-    user_types = parent_user_types
+    user_types, contents = parent_user_types, None
     if isinstance(run_field, str):
         linked_file = resolve_file_path(doc_uri, run_field)
-        if linked_file.exists() and linked_file.is_file():
-            run_field = fast_load.load(linked_file)
+        linked_doc = linked_file_cache.load(linked_file)
+        if linked_doc is not None:
+            run_field, contents = linked_doc.node, linked_doc.contents
             user_types = extract_schemadef(linked_file.as_uri(), run_field)
 
-    outputs = {}
-    if isinstance(run_field, dict):
-        outputs = generate_sample_outputs(run_field, user_types)
+    if not isinstance(run_field, dict):
+        return {}
 
-    return outputs
+    # The values depend only on the ports and the user types, so a tool run by many
+    # steps has the same sample outputs for each
+    interface = process_interface_cache.get(run_field, contents)
+    key = hashlib.sha1(_stable_json(user_types).encode()).hexdigest()
+    return interface.sample_outputs(key, lambda: {
+        k: example_value(k, port.node, user_types) for k, port in interface.outputs.items()
+    })
 
 
 def basic_example_value(name, _type):
-    name = name + "_" + "".join(random.choices(string.ascii_letters, k=5))
+    rng = seeded_random(name, _type)
+    name = name + "_" + "".join(rng.choices(string.ascii_letters, k=5))
     if _type == 'null':
         return 'null'
     elif _type == 'Any':
         return 'Any'
     elif _type == 'boolean':
-        return random.randint(0, 1) > 0
+        return rng.randint(0, 1) > 0
     elif _type == 'int' or _type == 'long':
-        return random.randint(-1000, 1000)
+        return rng.randint(-1000, 1000)
     elif _type == 'float' or _type == 'double':
-        return random.random() * 100 - 50
+        return rng.random() * 100 - 50
     elif _type == 'string':
         return name
     elif _type == 'File':
@@ -138,8 +218,9 @@ def file_example_value(name, cwl_type, ext=".ext"):
 
 
 def _example_file(name, ext):
-    fsize = random.randint(0, 100)
-    contents = "".join(random.choices(string.ascii_letters, k=fsize))
+    rng = seeded_random(name, ext)
+    fsize = rng.randint(0, 100)
+    contents = "".join(rng.choices(string.ascii_letters, k=fsize))
     return {
         'class': 'File',
         'path': f'/path/to/{name}.ext',
@@ -155,8 +236,8 @@ def _example_file(name, ext):
     }
 
 
-def enum_example_value(symbols):
-    return symbols[random.randint(0, len(symbols) - 1)]
+def enum_example_value(name, symbols):
+    return symbols[seeded_random(name, symbols).randint(0, len(symbols) - 1)]
 
 
 def record_example_value(name, _type, user_types):
@@ -172,14 +253,14 @@ def example_value(name, cwl_type, user_types, array_of=False):
 
     if isinstance(cwl_type, list):
         l = len(cwl_type)
-        return example_value(name, cwl_type[random.randint(0, l - 1)], user_types)
+        return example_value(name, cwl_type[seeded_random(name, cwl_type).randint(0, l - 1)], user_types)
 
     elif isinstance(cwl_type, dict) and "type" in cwl_type:
         _type = cwl_type.get("type")
         if _type == "array":
             return example_value(name, cwl_type.get("items"), user_types, array_of=True)
         elif _type == "enum":
-            return enum_example_value(cwl_type.get("symbols"))
+            return enum_example_value(name, cwl_type.get("symbols"))
         elif _type == "record":
             return record_example_value(name, cwl_type, user_types)
         elif _type == "File":
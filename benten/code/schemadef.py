@@ -1,13 +1,7 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
-from ruamel.yaml import YAML
-from ruamel.yaml.parser import ParserError
-from ruamel.yaml.scanner import ScannerError
-
 from ..cwl.lib import resolve_file_path
-
-
-fast_load = YAML(typ='safe')
+from .filecache import linked_file_cache
 
 
 def extract_schemadef(doc_uri: str, cwl: dict):
@@ -32,28 +26,22 @@ def extract_schemadef(doc_uri: str, cwl: dict):
                     _type = load_typedefs_from_file(doc_uri, path)
                     if isinstance(_type, dict):
                         if "name" in _type:
-                            name = path + "#" + _type.pop("name")
+                            name = path + "#" + _type["name"]
                 else:
-                    name = _type.pop("name", None)
+                    name = _type.get("name")
 
+                # The loaded documents may be shared, so we copy instead of popping the name
                 if name is not None:
-                    types_dict[name] = _type
+                    types_dict[name] = {k: v for k, v in _type.items() if k != "name"}
 
     return types_dict
 
 
 def load_typedefs_from_file(doc_uri, path):
-    linked_file = resolve_file_path(doc_uri, path)
-    type_def = {}
-    if linked_file.exists() and linked_file.is_file():
-        try:
-            type_def = fast_load.load(linked_file.open("r").read())
-        except (ParserError, ScannerError) as e:
-            type_def = {}
-            # todo: flag errors in imported typedefs
-    else:
-        pass
-        # The missing file error should already be flagged by the main parse
-
-    return type_def
+    linked_doc = linked_file_cache.load(resolve_file_path(doc_uri, path))
+    # A missing file error should already be flagged by the main parse
+    # todo: flag errors in imported typedefs
+    if linked_doc is None or linked_doc.node is None:
+        return {}
 
+    return linked_doc.node
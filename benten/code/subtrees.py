@@ -0,0 +1,215 @@
+"""Lets Document.update reuse the analysis of the parts of a document that did not change.
+
+The document is split at natural boundaries: the top level keys and the
+individual entries of the top level `steps`, `inputs` and `outputs`. While
+parsing, we record what each of these subtrees added to the analysis (lookup
+nodes, problems, type definitions, expression lib and step intelligence) along
+with the text of the subtree and the linked files it loaded.
+
+On the next parse a subtree whose text, context and linked files are unchanged
+is not parsed again. Its recorded analysis is replayed instead, shifted by the
+number of lines the subtree moved, and with the intelligence that refers to the
+previous parse's workflow or execution context copied and pointed at the new
+ones. The previous analysis is not modified, since it is still being served.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import copy
+import pathlib
+from typing import Dict, List, Tuple
+
+from .filecache import file_signature
+from ..langserver.lspobjects import Range, Position
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+split_sections = ("steps", "inputs", "outputs")
+
+
+class SubtreeAnalysis:
+
+    def __init__(self, path: tuple, start_line: int, text: str, context: str):
+        self.path = path
+        self.start_line = start_line
+        self.text = text
+        self.context = context
+
+        self.lookup_nodes = []
+        self.problems = []
+        self.type_defs = {}
+        self.expression_lib = None
+        self.step_intels = {}
+        self.dependencies = {}
+        self.volatile = False  # Depends on something we can't check cheaply, like a URL
+        self.children: List[SubtreeAnalysis] = []
+
+    def add_dependency(self, path):
+        if isinstance(path, pathlib.Path):
+            self.dependencies[path] = file_signature(path)
+        else:
+            self.volatile = True
+
+    def is_stale(self):
+        return self.volatile or any(
+            file_signature(path) != signature
+            for path, signature in self.dependencies.items())
+
+
+def subtree_spans(cwl: dict, line_count: int) -> Dict[tuple, Tuple[int, int]]:
+    """Start (inclusive) and end (exclusive) line of each subtree, keyed by path"""
+    spans = {}
+    top_level = _child_spans(cwl, list(cwl.keys()), 0, line_count)
+    spans.update({(k,): span for k, span in top_level.items()})
+
+    for section in split_sections:
+        if section not in top_level:
+            continue
+        node = cwl.get(section)
+        if isinstance(node, dict):
+            keys = list(node.keys())
+        elif isinstance(node, list):
+            keys = [_item.get("id") if isinstance(_item, dict) else None for _item in node]
+        else:
+            continue
+
+        _, end = top_level[section]
+        spans.update({
+            (section, k): span
+            for k, span in _child_spans(node, keys, top_level[section][0], end).items()})
+
+    return spans
+
+
+def _child_spans(node, keys: list, parent_start: int, parent_end: int):
+    if not hasattr(node, "lc") or len(keys) == 0:
+        return {}
+
+    if isinstance(node, dict):
+        starts = [node.lc.key(k)[0] for k in keys]
+    else:
+        starts = [node.lc.item(n)[0] for n in range(len(keys))]
+
+    # Flow style collections can put several children on one line
+    # and then lines can't tell the children apart
+    if any(s1 >= s2 for s1, s2 in zip(starts, starts[1:])) or starts[0] < parent_start:
+        return {}
+
+    ends = starts[1:] + [max(parent_end, starts[-1] + 1)]
+    spans = {}
+    for k, start, end in zip(keys, starts, ends):
+        if not isinstance(k, str):
+            continue
+        if k in spans:
+            spans[k] = None  # Duplicate ids are ambiguous
+        else:
+            spans[k] = (start, end)
+
+    return {k: span for k, span in spans.items() if span is not None}
+
+
+def shifted(record: SubtreeAnalysis, start_line: int, memo: dict = None) -> SubtreeAnalysis:
+    """A copy of the record moved to a new start line. Objects shared between the record
+    and its children are shared between the copies too"""
+    memo = {} if memo is None else memo
+    delta = start_line - record.start_line
+
+    new_record = copy.copy(record)
+    new_record.start_line = start_line
+    new_record.lookup_nodes = [_shifted_lookup_node(ln, delta, memo) for ln in record.lookup_nodes]
+    new_record.problems = [_shifted_object(p, delta, memo) for p in record.problems]
+    new_record.children = [shifted(child, child.start_line + delta, memo) for child in record.children]
+    return new_record
+
+
+def _shifted_lookup_node(ln, delta, memo):
+    if id(ln) not in memo:
+        new_ln = copy.copy(ln)
+        new_ln.loc = _shifted_range(ln.loc, delta, memo)
+        new_ln.intelligence_node = _shifted_object(ln.intelligence_node, delta, memo)
+        memo[id(ln)] = new_ln
+    return memo[id(ln)]
+
+
+def _shifted_object(obj, delta, memo):
+    # Diagnostics and some intelligence nodes (e.g. expressions, for highlighting)
+    # carry a range
+    if not isinstance(getattr(obj, "range", None), Range):
+        return obj
+
+    if id(obj) not in memo:
+        new_obj = copy.copy(obj)
+        new_obj.range = _shifted_range(obj.range, delta, memo)
+        memo[id(obj)] = new_obj
+    return memo[id(obj)]
+
+
+def _shifted_range(_range: Range, delta, memo):
+    if _range is None:
+        return None
+
+    if id(_range) not in memo:
+        memo[id(_range)] = Range(
+            start=Position(_range.start.line + delta, _range.start.character),
+            end=Position(_range.end.line + delta, _range.end.character))
+    return memo[id(_range)]
+
+
+# Attributes by which intelligence nodes refer to the workflow and execution context
+_bound_attributes = ("execution_context", "workflow", "step_intel")
+
+
+def rebound(record: SubtreeAnalysis, memo: dict) -> SubtreeAnalysis:
+    """A copy of the record where the objects in `memo` are replaced. The memo maps the id
+    of an object to the object and its replacement, so the object is kept alive and its id
+    can't be reused while the memo is. It starts with the previous parse's top level
+    workflow and execution context and collects the copies of the nodes that refer to them,
+    so shared nodes stay shared"""
+    step_intels = {k: _rebound_object(v, memo) for k, v in record.step_intels.items()}
+    lookup_nodes = [_rebound_lookup_node(ln, memo) for ln in record.lookup_nodes]
+    children = [rebound(child, memo) for child in record.children]
+    if all(a is b for a, b in zip(
+            [*step_intels.values(), *lookup_nodes, *children],
+            [*record.step_intels.values(), *record.lookup_nodes, *record.children])):
+        return record
+
+    new_record = copy.copy(record)
+    new_record.step_intels = step_intels
+    new_record.lookup_nodes = lookup_nodes
+    new_record.children = children
+    return new_record
+
+
+def _rebound_lookup_node(ln, memo):
+    if id(ln) not in memo:
+        new_ln = ln
+        intelligence_node = _rebound_object(ln.intelligence_node, memo)
+        if intelligence_node is not ln.intelligence_node:
+            new_ln = copy.copy(ln)
+            new_ln.intelligence_node = intelligence_node
+        memo[id(ln)] = (ln, new_ln)
+    return memo[id(ln)][1]
+
+
+def _rebound_object(obj, memo):
+    if obj is None:
+        return None
+
+    if id(obj) not in memo:
+        changes = {}
+        for attr in _bound_attributes:
+            value = getattr(obj, attr, None)
+            if value is not None:
+                new_value = _rebound_object(value, memo)
+                if new_value is not value:
+                    changes[attr] = new_value
+
+        new_obj = obj
+        if changes:
+            new_obj = copy.copy(obj)
+            for attr, value in changes.items():
+                setattr(new_obj, attr, value)
+        memo[id(obj)] = (obj, new_obj)
+    return memo[id(obj)][1]
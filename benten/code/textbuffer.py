@@ -0,0 +1,85 @@
+"""Holds the document text as an array of lines so that ranged edits sent
+by the client (TextDocumentSyncKind.Incremental) can be applied in place
+without the client having to send us the whole document on every keystroke."""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import re
+from typing import List
+
+from ..langserver.lspobjects import Range, Position
+
+
+# LSP (and YAML) only recognize these as line endings. str.splitlines
+# also splits on things like form feeds and unicode line separators
+_line_end = re.compile(r"\r\n|\r|\n")
+
+
+class TextBuffer:
+
+    def __init__(self, text: str):
+        self.lines: List[str] = split_lines(text)
+        self._text = text
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self.lines)
+        return self._text
+
+    def edit(self, _range: Range, new_text: str):
+        start_line, start_char = self._index(_range.start)
+        end_line, end_char = self._index(_range.end)
+        if (end_line, end_char) < (start_line, start_char):
+            start_line, start_char, end_line, end_char = end_line, end_char, start_line, start_char
+
+        new_lines = split_lines(
+            self.lines[start_line][:start_char] + new_text + self.lines[end_line][end_char:])
+
+        if end_line < len(self.lines) - 1:
+            # Not the last line, so the edited text ends with a line ending and
+            # the trailing (empty) piece belongs to the line that follows
+            new_lines.pop()
+
+        self.lines[start_line:end_line + 1] = new_lines
+        self._text = None
+
+    def _index(self, pos: Position):
+        """Convert an LSP position (character offsets are in UTF-16 code units)
+        to a line index and a code point index into that line. Positions past the
+        end of a line or of the document are clamped to the end"""
+        if pos.line >= len(self.lines):
+            line = len(self.lines) - 1
+            return line, len(_content(self.lines[line]))
+
+        line = max(pos.line, 0)
+        content = _content(self.lines[line])
+        return line, code_point_index(content, max(pos.character, 0))
+
+
+def split_lines(text: str) -> List[str]:
+    """Split keeping line endings. There is always a last (possibly empty) line
+    after the final line ending, which is where an edit appending to the document
+    is anchored"""
+    lines, start = [], 0
+    for m in _line_end.finditer(text):
+        lines.append(text[start:m.end()])
+        start = m.end()
+    lines.append(text[start:])
+    return lines
+
+
+def code_point_index(line: str, character: int):
+    if line.isascii():
+        return min(character, len(line))
+
+    units = 0
+    for n, c in enumerate(line):
+        if units >= character:
+            return n
+        units += 2 if ord(c) > 0xFFFF else 1
+    return len(line)
+
+
+def _content(line: str):
+    return line.rstrip("\r\n")
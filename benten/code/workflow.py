@@ -10,15 +10,17 @@ structure.
 In the end we do a global analysis of the workflow, flagging connectivity
 problems and building a graph of the workflow. We use this global analysis
 to enable port completion. For all of this we reuse the previously extracted
-step information.
+step information, and the ports and connections of the workflow model (see
+workflowmodel.py), which is built once per parse.
 """
 
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
 from typing import Dict
 
-from ..cwl.lib import (get_range_for_value, list_as_map, ListOrMap, normalize_source)
 from .intelligence import IntelligenceNode, CompletionItem
+from .workflowmodel import WorkflowModel, StepModel, PortLink, Source
+from .processinterface import process_interface_cache
 from ..langserver.lspobjects import Diagnostic, DiagnosticSeverity
 
 
@@ -34,14 +36,12 @@ class StepInterface:
 
 
 class Workflow:
-    def __init__(self, inputs, outputs, steps):
-        self._inputs = inputs
-        self._outputs = outputs
-        self._steps = steps
+    def __init__(self, model: WorkflowModel):
+        self.model = model
 
         self.step_intels: Dict[str, WFStepIntelligence] = {}
-        self.wf_inputs = set(list_as_map(inputs, key_field="id", problems=[]).keys())
-        self.wf_outputs = set(list_as_map(outputs, key_field="id", problems=[]).keys())
+        self.wf_inputs = set(model.inputs.as_dict.keys())
+        self.wf_outputs = set(model.outputs.as_dict.keys())
 
     def validate_connections(self, problems):
         unused_ports = set(self.wf_inputs)
@@ -50,29 +50,17 @@ class Workflow:
         self.flag_unused_inputs(unused_ports, problems)
 
     def validate_outputs(self, unused_ports, problems):
-        outputs = ListOrMap(self._outputs, key_field="id", problems=[])
-        for output_id, output in outputs.as_dict.items():
-            _validate_source(
-                port=output,
-                src_key="outputSource",
-                value_range=outputs.get_range_for_value(output_id),
-                step_id=None,
-                workflow=self,
-                unused_ports=unused_ports,
-                problems=problems)
+        for link in self.model.output_links.values():
+            _validate_sources(link, step_id=None, workflow=self, unused_ports=unused_ports, problems=problems)
 
     def validate_step_connections(self, unused_ports, problems):
-        _steps = ListOrMap(self._steps, key_field="id", problems=[])
-        for step_id, step in _steps.as_dict.items():
+        for step_id, step in self.model.steps.items():
             step_intel = self.step_intels.get(step_id)
-            if step_intel and isinstance(step, dict):
-                step_intel.validate_connections(
-                    ListOrMap(step.get("in"), key_field="id", problems=[]),
-                    unused_ports=unused_ports,
-                    problems=problems)
+            if step_intel and isinstance(step.node, dict):
+                step_intel.validate_connections(step, unused_ports=unused_ports, problems=problems)
 
     def flag_unused_inputs(self, unused_ports, problems):
-        inputs = ListOrMap(self._inputs, key_field="id", problems=[])
+        inputs = self.model.inputs
         for inp in unused_ports:
             if inp in inputs.as_dict:
                 problems += [
@@ -103,15 +91,15 @@ class WFStepIntelligence:
     def set_step_interface(self, step_interface: StepInterface):
         self.step_interface = step_interface
 
-    def validate_connections(self, inputs: ListOrMap, unused_ports, problems):
+    def validate_connections(self, step: StepModel, unused_ports, problems):
         if self.workflow is None:
             raise RuntimeError("Need to attach workflow first")
 
-        for port_id, port in inputs.as_dict.items():
+        for port_id, link in step.links.items():
             if port_id not in self.step_interface.inputs:
                 problems += [
                     Diagnostic(
-                        _range=inputs.get_range_for_id(port_id),
+                        _range=step.inputs.get_range_for_id(port_id),
                         message=
                         f"Expecting one of: {self.step_interface.inputs}"
                         if self.step_interface.inputs else
@@ -120,10 +108,8 @@ class WFStepIntelligence:
                 ]
 
             else:
-                _validate_source(
-                    port=port,
-                    src_key="source",
-                    value_range=inputs.get_range_for_value(port_id),
+                _validate_sources(
+                    link,
                     step_id=self.step_id,
                     workflow=self.workflow,
                     unused_ports=unused_ports,
@@ -191,69 +177,47 @@ class WFOutputSourceCompleter(PortSourceCompleterBase):
 
 
 # This should be invoked when we arrive at the "run" field of a workflow
-def parse_step_interface(run_field: dict, problems: list):
+def parse_step_interface(run_field: dict, problems: list, contents: str = None):
+    """`contents` is the text of the linked file the process was loaded from, if it was"""
 
     step_interface = StepInterface()
 
     if isinstance(run_field, dict):
+        interface = process_interface_cache.get(run_field, contents)
+        problems += interface.problems
         step_interface = StepInterface(
-            inputs=set(list_as_map(run_field.get("inputs"),
-                                   key_field="id",
-                                   problems=problems).keys()),
-            outputs=set(list_as_map(run_field.get("outputs"),
-                                    key_field="id",
-                                    problems=problems).keys()))
+            inputs=set(interface.inputs.keys()),
+            outputs=set(interface.outputs.keys()))
 
     return step_interface
 
 
-def _validate_source(port, src_key, value_range, step_id, workflow, unused_ports, problems):
-
-    src = None
-    if isinstance(port, (str, list)):
-        src = port
-    elif isinstance(port, dict):
-        if src_key in port:
-            src = port.get(src_key)
-            value_range = get_range_for_value(port, src_key)
-
-    if src is None:
-        return
-
-    if isinstance(src, list):
-        for n, _src in enumerate(src):
-            _validate_one_source(_src, get_range_for_value(src, n), step_id, workflow, unused_ports, problems)
-    elif isinstance(src, str):
-        _validate_one_source(src, value_range, step_id, workflow, unused_ports, problems)
-
-
-def _validate_one_source(src, value_range, step_id, workflow, unused_ports, problems):
-
-    if src is None:
-        return
+def _validate_sources(link: PortLink, step_id, workflow, unused_ports, problems):
+    for src in link.sources:
+        _validate_one_source(src, step_id, workflow, unused_ports, problems)
 
-    src = normalize_source(src)
 
-    unused_ports.discard(src)
+def _validate_one_source(src: Source, step_id, workflow, unused_ports, problems):
 
-    if src in workflow.wf_inputs:
-        return
+    if isinstance(src.source, str):
+        unused_ports.discard(src.source)
+        if src.source in workflow.wf_inputs:
+            return
 
     err_msg = f"No such workflow input. Expecting one of {workflow.wf_inputs}"
 
-    if isinstance(src, str) and "/" in src:
-        src_step, src_port = src.split("/")
+    if src.step is not None:
         err_msg = "Port can not connect to same step"
-        if src_step != step_id:
-            err_msg = f"No step called {src_step}"
-            if src_step in workflow.step_intels:
-                err_msg = f"{src_step} has no port called {src_port}"
-                if src_port in workflow.step_intels[src_step].step_interface.outputs:
+        if src.step != step_id:
+            err_msg = f"No step called {src.step}"
+            if src.step in workflow.step_intels:
+                err_msg = f"{src.step} has no port called {src.port}"
+                if src.port in workflow.step_intels[src.step].step_interface.outputs:
                     return
 
     problems += [
         Diagnostic(
-            _range=value_range,
+            _range=src.range,
             message=err_msg,
             severity=DiagnosticSeverity.Error)
     ]
@@ -1,13 +1,17 @@
-"""Parse CWL and create a JSON file describing the workflow. This dictionary
-is directly suitable for display by vis.js, but can be parsed for any other
-purpose."""
+"""Create a JSON file describing the workflow, from the workflow model. This
+dictionary is directly suitable for display by vis.js, but can be parsed for any
+other purpose.
+
+Nodes and edges have ids, so a client that has a graph can be sent just what
+changed (see `graph_diff`).
+"""
 
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
-from ..cwl.lib import (ListOrMap, normalize_source)
+from .workflowmodel import WorkflowModel
 
 
-def cwl_graph(cwl: dict):
+def cwl_graph(model: WorkflowModel):
 
     graph = {
         "nodes": [],
@@ -15,18 +19,36 @@ def cwl_graph(cwl: dict):
         "line-numbers": {}
     }
 
-    inputs = ListOrMap(cwl.get("inputs", {}), key_field="id", problems=[])
-    _add_nodes(graph, inputs, "inputs")
+    _add_nodes(graph, model.inputs, "inputs")
+    _add_nodes(graph, model.steps_view, "steps")
+    _add_nodes(graph, model.outputs, "outputs")
 
-    steps = ListOrMap(cwl.get("steps", {}), key_field="id", problems=[])
-    _add_nodes(graph, steps, "steps")
+    _add_edges(graph, model)
+    _add_edge_ids(graph)
 
-    outputs = ListOrMap(cwl.get("outputs", {}), key_field="id", problems=[])
-    _add_nodes(graph, outputs, "outputs")
+    return graph
 
-    _add_edges(graph, inputs, outputs, steps)
 
-    return graph
+def graph_diff(old: dict, new: dict) -> dict:
+    """The nodes and edges to update (add or replace) and remove, by id, and the line numbers
+    that changed, to get from the old graph to the new one"""
+    old = old or {"nodes": [], "edges": [], "line-numbers": {}}
+    diff = {}
+    for part in ("nodes", "edges"):
+        old_items = {item["id"]: item for item in old[part]}
+        new_items = {item["id"]: item for item in new[part]}
+        diff[part] = {
+            "update": [item for _id, item in new_items.items() if old_items.get(_id) != item],
+            "remove": [_id for _id in old_items if _id not in new_items]
+        }
+    diff["line-numbers"] = {
+        k: line for k, line in new["line-numbers"].items() if old["line-numbers"].get(k) != line
+    }
+    return diff
+
+
+def is_empty_diff(diff: dict) -> bool:
+    return not (diff["line-numbers"] or any(v for part in ("nodes", "edges") for v in diff[part].values()))
 
 
 def _add_nodes(graph, grp, grp_id):
@@ -62,20 +84,24 @@ def _mark_step_modifiers(node_data, node):
         node_data["title"] = "<br/>".join(title)
 
 
-def _add_edges(graph, inputs, outputs, steps):
+def _add_edges(graph, model: WorkflowModel):
+
+    for k, step in model.steps.items():
+        for link in step.links.values():
+            graph["edges"] += [{"from": _f, "to": k} for _f in _get_source_step(link)]
+
+    for k, link in model.output_links.items():
+        graph["edges"] += [{"from": _f, "to": k} for _f in _get_source_step(link)]
 
-    for k, v in steps.as_dict.items():
-        _to = k
-        for _, prt in ListOrMap(v.get("in", {}), key_field="id", problems=[]).as_dict.items():
-            graph["edges"] += [{"from": _f, "to": _to} for _f in _get_source_step(prt, "source")]
 
-    for k, v in outputs.as_dict.items():
-        _to = k
-        graph["edges"] += [{"from": _f, "to": _to} for _f in _get_source_step(v, "outputSource")]
+def _get_source_step(link):
+    return [s.step or s.port for s in link.sources if isinstance(s.source, str)]
 
 
-def _get_source_step(v, key):
-    src = v.get(key) if isinstance(v, dict) else v
-    if not isinstance(src, list):
-        src = [src]
-    return [normalize_source(s).split("/")[0] for s in src if isinstance(s, str)]
+def _add_edge_ids(graph):
+    # The same two nodes can be joined by more than one edge (through different ports)
+    seen = {}
+    for edge in graph["edges"]:
+        _id = f"{edge['from']}->{edge['to']}"
+        n = seen[_id] = seen.get(_id, 0) + 1
+        edge["id"] = _id if n == 1 else f"{_id}#{n}"
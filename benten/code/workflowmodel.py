@@ -0,0 +1,111 @@
+"""A model of the ports, steps and connections of a process, built once per
+parse and shared by everything that needs them: the parse of the list or map
+nodes themselves, connection validation, the workflow graph and the sample
+data.
+
+The model holds `ListOrMap` views of the inputs, outputs, steps and each step's
+`in`, which carry the ranges of the port and step ids, and the sources each
+port is connected to, already normalized and with their ranges. The interface
+of each step's process is found during the parse and kept by the step's
+`WFStepIntelligence` (see workflow.py).
+
+A tool is a process without steps.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+from typing import Dict, List
+
+from ..cwl.lib import get_range_for_value, ListOrMap, normalize_source
+from ..langserver.lspobjects import Range
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Source:
+    def __init__(self, source, _range: Range):
+        # Normally a str, but could be anything while the document is being edited
+        self.source = source
+        self.range = _range
+        # The step the source is an output of, or None for a workflow input
+        self.step, self.port = None, source
+        if isinstance(source, str) and "/" in source:
+            self.step, _, self.port = source.partition("/")
+
+
+class PortLink:
+    """The sources a step input or a workflow output is connected to"""
+    def __init__(self, port_id: str, sources: List[Source], is_list: bool):
+        self.port_id = port_id
+        self.sources = sources
+        self.is_list = is_list
+
+
+class StepModel:
+    def __init__(self, step_id: str, node):
+        self.id = step_id
+        self.node = node
+        self.run = node.get("run") if isinstance(node, dict) else None
+        self.inputs = _ListOrMapView(node.get("in") if isinstance(node, dict) else None)
+        self.links: Dict[str, PortLink] = {
+            port_id: _port_link(port_id, port, "source", self.inputs)
+            for port_id, port in self.inputs.as_dict.items()
+        }
+
+
+class WorkflowModel:
+
+    def __init__(self, node: dict):
+        self.inputs = _ListOrMapView(node.get("inputs"))
+        self.outputs = _ListOrMapView(node.get("outputs"))
+        self.steps_view = _ListOrMapView(node.get("steps"))
+        self.steps: Dict[str, StepModel] = {
+            step_id: StepModel(step_id, step) for step_id, step in self.steps_view.as_dict.items()
+        }
+        self.output_links: Dict[str, PortLink] = {
+            port_id: _port_link(port_id, port, "outputSource", self.outputs)
+            for port_id, port in self.outputs.as_dict.items()
+        }
+
+        self._views = {
+            id(v.original_obj): v
+            for v in [self.inputs, self.outputs, self.steps_view] + [s.inputs for s in self.steps.values()]
+            if isinstance(v.original_obj, (list, dict))
+        }
+
+    def list_or_map(self, node, key_field: str, problems: list) -> ListOrMap:
+        """The view of this node made for the model, if it is one of the model's nodes. Else None"""
+        view = self._views.get(id(node))
+        if view is None or view.original_obj is not node or key_field != "id":
+            return None
+        problems += view.problems
+        return view
+
+
+class _ListOrMapView(ListOrMap):
+    """Keeps the problems found in making the view, for whoever parses the node"""
+    def __init__(self, node):
+        self.problems = []
+        super().__init__(node, key_field="id", problems=self.problems)
+
+
+def _port_link(port_id, port, src_key, ports: ListOrMap) -> PortLink:
+    src, value_range = None, None
+    if isinstance(port, (str, list)):
+        src = port
+        if isinstance(port, str):
+            value_range = ports.get_range_for_value(port_id)
+    elif isinstance(port, dict) and src_key in port:
+        src = port.get(src_key)
+        value_range = get_range_for_value(port, src_key)
+
+    if isinstance(src, list):
+        sources = [
+            Source(normalize_source(s), get_range_for_value(src, n))
+            for n, s in enumerate(src) if s is not None
+        ]
+        return PortLink(port_id, sources, is_list=True)
+
+    sources = [Source(normalize_source(src), value_range)] if isinstance(src, str) else []
+    return PortLink(port_id, sources, is_list=False)
@@ -1,47 +1,73 @@
-"""Load the raw YAML"""
+"""Load the raw YAML
+
+ruamel is imported, and the loaders created, when the first document is loaded
+rather than when the server starts up. ruamel's YAML objects are not thread safe
+and documents are analyzed on their own thread, so each thread gets its own loaders.
+"""
 
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
+import threading
+from functools import lru_cache
 from typing import Tuple, List
 
-from ruamel.yaml import YAML
-from ruamel.yaml.parser import ParserError
-from ruamel.yaml.scanner import ScannerError
-from ruamel.yaml.composer import ComposerError
-from ruamel.yaml.compat import StringIO
-
 from ..langserver.lspobjects import Diagnostic, DiagnosticSeverity, Range, Position
 
 
 import logging
 logger = logging.getLogger(__name__)
 
-_yaml_loader = YAML(typ="rt")
-# TODO: allow checking for duplicate keys, perhaps with self healing
-_yaml_loader.allow_duplicate_keys = True
 
-fast_load = YAML(typ='safe')
-fast_load.indent(mapping=2, sequence=4, offset=2)
-fast_load.default_flow_style = False
+def _yaml_loader():
+    return _thread_yaml_loader(threading.get_ident())
+
+
+@lru_cache(maxsize=16)
+def _thread_yaml_loader(thread_id):
+    from ruamel.yaml import YAML
+    loader = YAML(typ="rt")
+    # TODO: allow checking for duplicate keys, perhaps with self healing
+    loader.allow_duplicate_keys = True
+    return loader
+
+
+def fast_load():
+    return _thread_fast_load(threading.get_ident())
+
+
+@lru_cache(maxsize=16)
+def _thread_fast_load(thread_id):
+    from ruamel.yaml import YAML
+    loader = YAML(typ='safe')
+    loader.indent(mapping=2, sequence=4, offset=2)
+    loader.default_flow_style = False
+    return loader
 
 
 def fast_yaml_load(txt):
+    from ruamel.yaml.parser import ParserError
+    from ruamel.yaml.scanner import ScannerError
     try:
-        return fast_load.load(txt)
+        return fast_load().load(txt)
     except (ParserError, ScannerError) as e:
         pass
 
 
 def yaml_to_string(v: dict):
+    from ruamel.yaml.compat import StringIO
     s = StringIO()
-    fast_load.dump(v, s)
+    fast_load().dump(v, s)
     return s.getvalue()
 
 
 def parse_yaml(text, retries=3) -> Tuple[dict, List[Diagnostic]]:
+    from ruamel.yaml.parser import ParserError
+    from ruamel.yaml.scanner import ScannerError
+    from ruamel.yaml.composer import ComposerError
+
     problems = []
     try:
-        cwl = _yaml_loader.load(text)
+        cwl = _yaml_loader().load(text)
     except (ParserError, ScannerError, ComposerError) as e:
 
         if retries:
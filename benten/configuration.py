@@ -5,7 +5,7 @@ import shutil
 from pathlib import Path as P
 import configparser
 
-from .cwl.specification import parse_schema
+from .cwl.modelcache import LanguageModels
 
 import logging
 logger = logging.getLogger(__name__)
@@ -38,6 +38,7 @@ class Configuration(configparser.ConfigParser):
         self.cfg_path = P(os.getenv(xdg_config_dir["env"], xdg_config_dir["default"]), sbg_config_dir)
         self.log_path = P(os.getenv(xdg_data_home["env"], xdg_data_home["default"]), sbg_config_dir, "logs")
         self.scratch_path = P(os.getenv(xdg_data_home["env"], xdg_data_home["default"]), sbg_config_dir, "scratch")
+        self.model_cache_path = P(self.cfg_path, "model-cache")
 
         if not self.cfg_path.exists():
             self.cfg_path.mkdir(parents=True)        
@@ -57,7 +58,7 @@ class Configuration(configparser.ConfigParser):
         self._copy_missing_language_files()
 
         # TODO: allow multiple language specifications
-        logging.info("Loading language model ...")
+        # The models themselves are loaded when first needed, see LanguageModels
         self._load_language_files()
 
     # https://stackoverflow.com/questions/1611799/preserve-case-in-configparser
@@ -83,7 +84,6 @@ class Configuration(configparser.ConfigParser):
                 shutil.copy(str(src_file), str(dst_file))
 
     def _load_language_files(self):
-        for fname in self.cfg_path.glob("schema-*.json"):
-            version = fname.name[7:-5]
-            self.lang_models[version] = parse_schema(fname)
-            logger.info(f"Loaded language schema {version}")
+        self.lang_models = LanguageModels(
+            schema_files={fname.name[7:-5]: fname for fname in self.cfg_path.glob("schema-*.json")},
+            cache_dir=self.model_cache_path)
@@ -2,24 +2,93 @@
 
 import re
 from enum import IntEnum
-
-import dukpy
+from typing import List
 
 from .basetype import (CWLBaseType, MapSubjectPredicate, TypeCheck, Match,
                        Intelligence, IntelligenceContext)
 from ..langserver.lspobjects import Range, Hover, Location
+from ..langserver.cancellation import check_cancelled
 from ..code.intelligence import LookupNode
+from ..code.jsworkers import JSTimeout
+from ..code.executioncontext import inputs_slice
+from .parameterreference import evaluate_parameter_reference, Unresolved
 
 import logging
 logger = logging.getLogger(__name__)
 
 
-parameter_ref = re.compile(r"\$\(((.(?<!\$({|\()))*)\)", flags=re.DOTALL | re.M)
-expression_ref = re.compile(r"\${((.(?<!\$({|\()))*)}", flags=re.DOTALL | re.M)
-
 inputs_scan = re.compile(r"inputs\.([\w]*)", flags=re.DOTALL | re.M)
 
 
+expression_start = re.compile(r"\$[({]")
+
+# The common case, which needs no scanning: a parameter reference without brackets or strings
+simple_parameter_ref = re.compile(r"\$\(([^()\[\]{}'\"`/]*)\)")
+
+# String literals and comments, in which brackets don't count. A lone quote is a string that doesn't end
+_skipped = r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`(?:[^`\\]|\\.)*`|//[^\n]*|/\*.*?\*/|['"`]"""
+
+# What the scanner stops at inside each kind of expression. Only its own kind of bracket decides
+# where it ends
+expression_tokens = {
+    "(": (")", re.compile(r"[()]|" + _skipped, flags=re.DOTALL)),
+    "{": ("}", re.compile(r"[{}]|" + _skipped, flags=re.DOTALL))
+}
+
+
+def split_fragments(text: str) -> list:
+    """Split the text into plain strings, parameter references `$(...)` and JS expressions
+    `${...}`, in one pass. Brackets inside an expression have to balance, and brackets in
+    string literals and comments don't count. Text from an unclosed `$(` or `${` on is a
+    plain string"""
+    fragments, cursor = [], 0
+    m = expression_start.search(text)
+    while m is not None:
+        n, opener = m.start(), m.group()[1]
+
+        simple = simple_parameter_ref.match(text, n) if opener == "(" else None
+        end = simple.end() - 1 if simple is not None else _find_closing(text, n + 1)
+        if end < 0:
+            break
+
+        fragments += [
+            _fragment(text[cursor:n], ExpressionType.PlainString, (cursor, n)),
+            _fragment(text[n + 2:end],
+                      ExpressionType.ParameterReference if opener == "(" else ExpressionType.JSExpression,
+                      (n, end + 1))]
+        cursor = end + 1
+        m = expression_start.search(text, cursor)
+
+    fragments += [_fragment(text[cursor:], ExpressionType.PlainString, (cursor, len(text)))]
+    return fragments
+
+
+def _find_closing(text: str, start: int) -> int:
+    """Index of the bracket that closes the one at `start`, or -1"""
+    opener = text[start]
+    closer, tokens = expression_tokens[opener]
+    depth = 0
+    for m in tokens.finditer(text, start):
+        c = m.group()
+        if c == opener:
+            depth += 1
+        elif c == closer:
+            depth -= 1
+            if depth == 0:
+                return m.start()
+        elif len(c) == 1:
+            return -1
+    return -1
+
+
+def _fragment(exp: str, exp_type: 'ExpressionType', span: tuple):
+    return {
+        "exp": exp,
+        "type": exp_type,
+        "span": span
+    }
+
+
 class CWLExpressionType(CWLBaseType):
 
     def check(self, node, node_key: str=None, map_sp: MapSubjectPredicate=None) -> TypeCheck:
@@ -41,6 +110,7 @@ class CWLExpression(CWLBaseType):
     def __init__(self, text: str):
         super().__init__("Expression")
         self.text = text
+        self.fragments = None
         self.intel_context = None
         self.execution_context = None
         self.range = None
@@ -63,12 +133,20 @@ class CWLExpression(CWLBaseType):
         self.intel_context = intel_context
         self.execution_context = code_intel.execution_context
         self.range = value_range  # For the highlighting of the expression
+        self.fragments = split_fragments(self.text)
 
         ln = LookupNode(loc=value_range)
         ln.intelligence_node = self
         code_intel.add_lookup_node(ln)
 
     def hover(self):
+        check_cancelled()
+        res = evaluate_expressions([self])[0]
+        logger.debug(f"Guessing expression inputs are: {self.guess_inputs()}")
+        return Hover(res, self.range, wrap_as_code_block=True)
+
+    def evaluation_args(self):
+        """The inputs, runtime and `self` this expression is evaluated with"""
 
         def _self_is_io(_path):
             if "in" in _path:
@@ -112,80 +190,11 @@ class CWLExpression(CWLBaseType):
         except (ValueError, IndexError) as e:
             pass
 
-        if job_inputs:
-            res = "".join(
-                evaluate_expression(
-                    expression=fragment["exp"],
-                    exp_type=fragment["type"],
-                    expression_lib=self.execution_context.expression_lib,
-                    runtime=self.execution_context.runtime(self.intel_context.path),
-                    inputs=job_inputs,
-                    cwl_self=cwl_self)
-                for fragment in self._split_fragments())
-        else:
-            res = "Job inputs have not been filled out"
-
-        logger.debug(f"Guessing expression inputs are: {self.guess_inputs()}")
-        return Hover(res, self.range, wrap_as_code_block=True)
+        return job_inputs, self.execution_context.runtime(self.intel_context.path), cwl_self
 
     def definition(self):
         # Hijacking this to show the sample inputs file
-        return Location(self.execution_context.get_sample_data_file_path().as_uri())
-
-    def _split_fragments(self) -> list:
-        refs = parameter_ref.finditer(self.text)
-        exps = expression_ref.finditer(self.text)
-        r, e = next(refs, None), next(exps, None)
-
-        cursor = 0
-        fragments = []
-        while r or e:
-            if r is not None and e is not None:
-                if r.start() < e.start():
-                    _frag = self._add_ref(r)
-                    r = next(refs, None)
-                else:
-                    _frag = self._add_exp(e)
-                    e = next(exps, None)
-            else:
-                if r is not None:
-                    _frag = self._add_ref(r)
-                    r = next(refs, None)
-                elif e is not None:
-                    _frag = self._add_exp(e)
-                    e = next(exps, None)
-
-            plain_string_frag = self._add_plain_string(self.text, (cursor, _frag["span"][0]))
-            cursor = _frag["span"][1]
-            fragments += [plain_string_frag, _frag]
-
-        plain_string_frag = self._add_plain_string(self.text, (cursor, len(self.text)))
-        fragments += [plain_string_frag]
-        return fragments
-
-    @staticmethod
-    def _add_plain_string(text, span):
-        return {
-            "exp": text[span[0]:span[1]],
-            "type": ExpressionType.PlainString,
-            "span": span
-        }
-
-    @staticmethod
-    def _add_ref(r):
-        return {
-            "exp": r.groups()[0],
-            "type": ExpressionType.ParameterReference,
-            "span": r.span()
-        }
-
-    @staticmethod
-    def _add_exp(e):
-        return {
-            "exp": e.groups()[0],
-            "type": ExpressionType.JSExpression,
-            "span": e.span()
-        }
+        return Location(self.execution_context.write_job_file().as_uri())
 
 
 def parameter_reference_template(expression):
@@ -207,33 +216,83 @@ function benten_eval_func() {{
 benten_eval_func()"""
 
 
-def evaluate_expression(
-        expression: str, exp_type: ExpressionType,
-        expression_lib: list, runtime: dict, inputs: dict, cwl_self: dict):
-    if exp_type == ExpressionType.PlainString:
-        return expression
-
-    if inputs:
-        if exp_type == ExpressionType.ParameterReference:
-            full_expression = parameter_reference_template(expression)
-        else:
-            full_expression = js_template(expression)
-
-        try:
-            res = dukpy.evaljs(expression_lib + [full_expression],
-                               runtime=runtime,
-                               inputs=inputs,
-                               cwl_self=cwl_self)
-
-            if res is None and exp_type == ExpressionType.JSExpression:
-                res = "Got a 'null' result. Do you have a `return` for your JS expression?"
-            else:
-                res = str(res)
-
-        except dukpy.JSRuntimeError as e:
-            res = str(e).splitlines()[0]
-            logger.error(res)
+def full_expression(expression: str, exp_type: ExpressionType):
+    if exp_type == ExpressionType.ParameterReference:
+        return parameter_reference_template(expression)
     else:
-        res = "Job inputs have not been filled out"
-
-    return res
+        return js_template(expression)
+
+
+def format_result(res, exp_type: ExpressionType, timeout: float = None):
+    """The text shown for the result of evaluating a fragment. `res` can be a JS exception"""
+    if isinstance(res, JSTimeout):
+        return f"Evaluation timed out after {timeout}s. Is there an endless loop?"
+
+    if isinstance(res, Exception):
+        res = str(res).splitlines()[0]
+        logger.error(res)
+        return res
+
+    if res is None and exp_type == ExpressionType.JSExpression:
+        return "Got a 'null' result. Do you have a `return` for your JS expression?"
+
+    return str(res)
+
+
+def evaluate_expressions(expressions: List[CWLExpression]) -> List[str]:
+    """Evaluate expressions of the same document, as for hovers. Simple parameter references
+    are evaluated here. The rest of the JS fragments of all the expressions that are not in the
+    evaluation cache go to the JS workers as one batch"""
+    if not expressions:
+        return []
+
+    execution_context = expressions[0].execution_context
+    execution_context.check_job_file()
+    results = [None] * len(expressions)
+    pending = []  # (index, key, parts): a part is the text or (fragment type, index in batch)
+    batch = []
+
+    for n, expression in enumerate(expressions):
+        job_inputs, runtime, cwl_self = expression.evaluation_args()
+        if not job_inputs:
+            results[n] = "Job inputs have not been filled out"
+            continue
+
+        # Only the sample values the expression uses are generated
+        job_inputs = inputs_slice(expression.text, job_inputs)
+
+        key = execution_context.evaluation_key(expression.text, runtime, job_inputs, cwl_self)
+        results[n] = execution_context.evaluations.get(key)
+        if results[n] is not None:
+            continue
+
+        args = {"runtime": runtime, "inputs": job_inputs, "cwl_self": cwl_self}
+        parts = []
+        for f in expression.fragments:
+            if f["type"] == ExpressionType.PlainString:
+                parts.append(f["exp"])
+                continue
+
+            if f["type"] == ExpressionType.ParameterReference:
+                res = evaluate_parameter_reference(f["exp"], runtime, job_inputs, cwl_self)
+                if res is not Unresolved:
+                    parts.append(format_result(res, f["type"]))
+                    continue
+
+            parts.append((f["type"], len(batch)))
+            batch.append((full_expression(f["exp"], f["type"]), args))
+        pending.append((n, key, parts))
+
+    js_workers = execution_context.js_workers
+    evaluated = js_workers.evaluate_batch(execution_context.expression_lib, batch) if batch else []
+
+    for n, key, parts in pending:
+        results[n] = "".join(
+            p if isinstance(p, str) else format_result(evaluated[p[1]], p[0], js_workers.timeout)
+            for p in parts)
+        # A timeout may be down to load, and an error to a failed worker, so only
+        # evaluations that completed are remembered
+        if not any(isinstance(evaluated[p[1]], Exception) for p in parts if not isinstance(p, str)):
+            execution_context.evaluations.put(key, results[n])
+
+    return results
@@ -2,11 +2,10 @@
 
 import pathlib
 import urllib.parse
-import urllib.request
-import urllib.error
 
 from ..langserver.lspobjects import Diagnostic, DiagnosticSeverity, Range, Position
 from ..code.yaml import fast_yaml_load
+from ..code.filecache import linked_file_cache
 
 
 def get_range_for_key(parent, key):
@@ -121,10 +120,13 @@ def validate_and_load_linked_file(doc_uri: str, path: str, loc: Range, problems:
     full_path, contents, node_dict = link_url.path, "", {}
 
     if link_url.scheme not in ["file://", ""]:
+        # Deferred, it is one of the slower imports and remote links are rare
+        from urllib.request import urlopen
+        from urllib.error import HTTPError
         try:
-            contents = urllib.request.urlopen(path).read().decode('utf-8')
+            contents = urlopen(path).read().decode('utf-8')
             node_dict = fast_yaml_load(contents)
-        except urllib.error.HTTPError:
+        except HTTPError:
             problems += [
                 Diagnostic(
                     _range=loc,
@@ -150,8 +152,9 @@ def validate_and_load_linked_file(doc_uri: str, path: str, loc: Range, problems:
                 severity=DiagnosticSeverity.Error)
         ]
     else:
-        contents = linked_file.open("r").read()
-        node_dict = fast_yaml_load(contents)
+        linked_doc = linked_file_cache.load(linked_file)
+        if linked_doc is not None:
+            contents, node_dict = linked_doc.contents, linked_doc.node
 
     return linked_file, contents, node_dict
 
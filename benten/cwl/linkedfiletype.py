@@ -36,10 +36,15 @@ class CWLLinkedFile(CWLBaseType):
 
         self.full_path, self._contents, self.node_dict = \
             validate_and_load_linked_file(doc_uri, self.prefix, value_range, problems)
+        code_intel.add_dependency(self.full_path)
         ln = LookupNode(loc=value_range)
         ln.intelligence_node = self
         code_intel.add_lookup_node(ln)
 
+    @property
+    def contents(self) -> str:
+        return self._contents
+
     def hover(self):
         return Hover(self._contents, wrap_as_code_block=True)
 
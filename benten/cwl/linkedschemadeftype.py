@@ -44,6 +44,6 @@ class CWLLinkedSchemaDef(CWLLinkedFile):
             return
 
         for _type in _type_list:
-            if "name" in _type:
-                name = self.prefix + "#" + _type.pop("name")
-                code_intel.type_defs[name] = _type
+            if isinstance(_type, dict) and "name" in _type:
+                name = self.prefix + "#" + _type["name"]
+                code_intel.type_defs[name] = {k: v for k, v in _type.items() if k != "name"}
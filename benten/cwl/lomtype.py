@@ -6,6 +6,7 @@ from .requirementstype import CWLRequirementsType
 from ..langserver.lspobjects import Range
 from ..code.intelligence import LookupNode, IntelligenceNode
 from ..code.intelligencecontext import copy_context
+from ..code.subtrees import split_sections
 from .lib import ListOrMap
 from .typeinference import infer_type
 from ..code import workflow
@@ -51,7 +52,13 @@ class CWLListOrMapType(CWLBaseType):
               value_range: Range = None,
               requirements=None):
 
-        obj = ListOrMap(node, key_field=self.map_subject_predicate.subject, problems=problems)
+        obj = None
+        if intel_context.workflow is not None:
+            # The workflow's ports, steps and step inputs have been gone over already
+            obj = intel_context.workflow.model.list_or_map(
+                node, key_field=self.map_subject_predicate.subject, problems=problems)
+        if obj is None:
+            obj = ListOrMap(node, key_field=self.map_subject_predicate.subject, problems=problems)
 
         # items expressed as a map can have a special case
         # the key completer can be the completer for the subject field
@@ -82,7 +89,13 @@ class CWLListOrMapType(CWLBaseType):
                     ln.intelligence_node = intel_context.workflow.get_output_source_completer("")
                     code_intel.add_lookup_node(ln)
 
-        for k, v in obj.as_dict.items():
+        items = obj.as_dict.items()
+        if len(intel_context.path) == 1 and intel_context.path[0] in split_sections:
+            # Individual steps and ports whose analysis can be reused from the last parse are skipped
+            items = code_intel.subtrees_to_parse(
+                items, path=tuple(intel_context.path), problems=problems, workflow=intel_context.workflow)
+
+        for k, v in items:
 
             this_intel_context = copy_context(intel_context)
             this_intel_context.path += [k]
@@ -0,0 +1,127 @@
+"""Caches the language models built from the CWL schemas, so that they don't
+have to be built from the schema JSON every time the server starts.
+
+A model is pickled to the cache directory under a name that includes a hash of
+the schema file, the Benten version and the cache format. A changed schema
+or a new Benten therefore never picks up a stale model. The old files for that
+schema are removed when a new one is written.
+
+`LanguageModels` holds the models for all the schema versions and loads each
+one the first time it is asked for, so nobody waits for versions they don't use.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import os
+import pickle
+import hashlib
+import pathlib
+import tempfile
+import threading
+from collections.abc import Mapping
+
+from .specification import parse_schema, latest_published_cwl_version
+from ..version import __version__
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Bump this when the classes that make up a language model change
+# in a way that makes pickles from the same Benten version unusable
+cache_format = 1
+
+
+def cache_key(schema_path: pathlib.Path) -> str:
+    h = hashlib.sha256(schema_path.read_bytes())
+    h.update(f"{__version__}:{cache_format}".encode())
+    return h.hexdigest()[:16]
+
+
+def cache_file_path(schema_path: pathlib.Path, cache_dir: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(cache_dir, f"{schema_path.stem}.{cache_key(schema_path)}.pickle")
+
+
+def load_language_model(schema_path: pathlib.Path, cache_dir: pathlib.Path) -> dict:
+    cache_file = cache_file_path(schema_path, cache_dir)
+    try:
+        with cache_file.open("rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # A corrupt or incompatible cache file should never stop us from starting up
+        logger.warning(f"Could not load cached language model {cache_file}: {e}")
+
+    lang_model = parse_schema(schema_path)
+    _write_cache(lang_model, schema_path, cache_file)
+    return lang_model
+
+
+def _write_cache(lang_model: dict, schema_path: pathlib.Path, cache_file: pathlib.Path):
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        for stale in cache_file.parent.glob(f"{schema_path.stem}.*.pickle"):
+            if "." not in stale.name[len(schema_path.stem) + 1:-len(".pickle")]:
+                stale.unlink()
+
+        # Write and rename, so that a server starting up alongside never reads half a file
+        fd, tmp_name = tempfile.mkstemp(dir=str(cache_file.parent), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(lang_model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, str(cache_file))
+    except Exception as e:
+        logger.warning(f"Could not cache language model for {schema_path}: {e}")
+
+
+class LanguageModels(Mapping):
+    """Language models keyed by CWL version, loaded on first access.
+
+    Checking for a version (`in`, iterating) does not load anything. A thread
+    asking for a version that is being loaded (by another request or by
+    `prefetch`) waits for that version only."""
+
+    def __init__(self, schema_files: dict, cache_dir: pathlib.Path):
+        self.schema_files = schema_files
+        self.cache_dir = cache_dir
+        self._models = {}
+        self._locks = {version: threading.Lock() for version in schema_files}
+
+    def __getitem__(self, version):
+        lang_model = self._models.get(version)
+        if lang_model is None:
+            with self._locks[version]:
+                lang_model = self._models.get(version)
+                if lang_model is None:
+                    lang_model = load_language_model(self.schema_files[version], self.cache_dir)
+                    self._models[version] = lang_model
+                    logger.info(f"Loaded language schema {version}")
+        return lang_model
+
+    def __contains__(self, version):
+        return version in self.schema_files
+
+    def __iter__(self):
+        return iter(self.schema_files)
+
+    def __len__(self):
+        return len(self.schema_files)
+
+    def is_loaded(self, version) -> bool:
+        return version in self._models
+
+    def prefetch(self, version=latest_published_cwl_version) -> threading.Thread:
+        """Load one version, by default the one most documents use, on a daemon thread.
+        The others are still loaded only when first asked for"""
+        thread = threading.Thread(target=self._prefetch, args=(version,), name="language-models", daemon=True)
+        thread.start()
+        return thread
+
+    def _prefetch(self, version):
+        if version not in self:
+            return
+        try:
+            _ = self[version]
+        except Exception as e:
+            # Whoever needs this version will get the error when they ask for it
+            logger.error(f"Could not load language schema {version}: {e}")
@@ -0,0 +1,134 @@
+"""Evaluates CWL parameter references, like `$(inputs.bam.basename)` or
+`$(runtime.cores)`, without the JS engine.
+
+https://www.commonwl.org/v1.0/CommandLineTool.html#Parameter_references
+
+    symbol::=             {Unicode alphanumeric}+
+    singleq::=            [' (( {character - { | \\ ' \\} } ) | \\' | \\\\ )* ']
+    doubleq::=            [" (( {character - { | \\ " \\} } ) | \\" | \\\\ )* "]
+    index::=              [ {decimal digit}+ ]
+    segment::=            . {symbol} | {singleq} | {doubleq} | {index}
+    parameter reference::=( {symbol} {segment}*)
+
+The result has to be what the JS engine would have given, so anything that
+would not simply resolve to a value (a missing key, a property of null, a value
+JS would print differently) is left to the JS engine, as is anything that is
+not a parameter reference: `evaluate_parameter_reference` returns `Unresolved`.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import re
+import math
+from functools import lru_cache
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class _Unresolved:
+    def __repr__(self):
+        return "Unresolved"
+
+
+Unresolved = _Unresolved()
+
+
+symbol = re.compile(r"\w+")
+segment = re.compile(
+    r"\.(?P<symbol>\w+)"
+    r"|\['(?P<singleq>(?:[^'\\]|\\['\\])*)'\]"
+    r"|\[\"(?P<doubleq>(?:[^\"\\]|\\[\"\\])*)\"\]"
+    r"|\[(?P<index>\d+)\]")
+escape = re.compile(r"\\(['\"\\])")
+
+# JS orders integer-like keys first, so objects with such keys would print differently
+index_like = re.compile(r"\d+")
+
+
+@lru_cache(maxsize=1024)
+def parse_parameter_reference(expression: str):
+    """(symbol, [segment, ...]) or None if this is not a parameter reference. A segment is a
+    str (property) or an int (index)"""
+    m = symbol.match(expression)
+    if m is None:
+        return None
+
+    root, segments, pos = m.group(), [], m.end()
+    while pos < len(expression):
+        m = segment.match(expression, pos)
+        if m is None:
+            return None
+        if m.group("symbol") is not None:
+            segments.append(m.group("symbol"))
+        elif m.group("index") is not None:
+            segments.append(int(m.group("index")))
+        else:
+            quoted = m.group("singleq") if m.group("singleq") is not None else m.group("doubleq")
+            segments.append(escape.sub(r"\1", quoted))
+        pos = m.end()
+
+    return root, tuple(segments)
+
+
+def evaluate_parameter_reference(expression: str, runtime: dict, inputs: dict, cwl_self):
+    parsed = parse_parameter_reference(expression)
+    if parsed is None:
+        return Unresolved
+
+    root, segments = parsed
+    roots = {"inputs": inputs, "self": cwl_self, "runtime": runtime}
+    if root not in roots:
+        return Unresolved
+
+    value = roots[root]
+    for s in segments:
+        value = _lookup(value, s)
+        if value is Unresolved:
+            return Unresolved
+
+    return _as_js(value)
+
+
+def _lookup(value, s):
+    if isinstance(value, dict):
+        key = str(s)
+        return value[key] if key in value else Unresolved
+
+    if isinstance(value, list):
+        if s == "length":
+            return len(value)
+        if isinstance(s, int) and s < len(value):
+            return value[s]
+
+    if isinstance(value, str) and s == "length":
+        # JS counts UTF-16 code units
+        return len(value.encode("utf-16-le")) // 2
+
+    return Unresolved
+
+
+def _as_js(value):
+    """The value as it comes back from the JS engine (which goes through JSON)"""
+    if value is None or isinstance(value, (str, bool)):
+        return value
+
+    if isinstance(value, int):
+        return value if abs(value) < 2 ** 53 else Unresolved
+
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return Unresolved
+        return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+    if isinstance(value, list):
+        values = [_as_js(v) for v in value]
+        return Unresolved if any(v is Unresolved for v in values) else values
+
+    if isinstance(value, dict):
+        if not all(isinstance(k, str) and not index_like.fullmatch(k) for k in value):
+            return Unresolved
+        values = {k: _as_js(v) for k, v in value.items()}
+        return Unresolved if any(v is Unresolved for v in values.values()) else values
+
+    return Unresolved
@@ -13,6 +13,7 @@ from ..langserver.lspobjects import Range, CompletionItem, Diagnostic, Diagnosti
 from ..code.intelligence import LookupNode
 from ..code.intelligencecontext import copy_context
 from ..code.workflow import Workflow
+from ..code.workflowmodel import WorkflowModel
 from .typeinference import infer_type
 from .lib import get_range_for_key, get_range_for_value
 from ..code import workflow
@@ -103,7 +104,17 @@ class CWLRecordType(CWLBaseType):
         extra_inputs_for_when = []
 
         if self.name == "Workflow":
-            intel_context.workflow = Workflow(node.get("inputs"), node.get("outputs"), node.get("steps"))
+            # The model of the top level process is made before the parse (see Document)
+            model = code_intel.workflow_model \
+                if not intel_context.path and code_intel.workflow_model is not None else WorkflowModel(node)
+            intel_context.workflow = Workflow(model)
+            if not intel_context.path:
+                code_intel.set_top_level_workflow(intel_context.workflow)
+
+        if not intel_context.path:
+            # Top level keys whose analysis can be reused from the last parse are skipped
+            field_iterator = code_intel.subtrees_to_parse(
+                field_iterator, path=(), problems=problems, workflow=intel_context.workflow)
 
         for k, child_node in field_iterator:
 
@@ -196,12 +207,13 @@ class CWLRecordType(CWLBaseType):
                                     this_intel_context.workflow_step_intelligence.get_step_source_completer)
 
             if self.name == "WorkflowStep" and k == "run":
+                contents = None
                 if isinstance(inferred_type, CWLLinkedFile):
-                    linked_process = inferred_type.node_dict
+                    linked_process, contents = inferred_type.node_dict, inferred_type.contents
                 else:
                     linked_process = child_node
 
-                step_interface = workflow.parse_step_interface(linked_process, problems)
+                step_interface = workflow.parse_step_interface(linked_process, problems, contents=contents)
                 step_interface.inputs.update(extra_inputs_for_when)
                 intel_context.workflow_step_intelligence.set_step_interface(step_interface)
 
@@ -0,0 +1,97 @@
+"""Runs document analysis off the message loop.
+
+`didOpen`/`didChange` only apply the edit and schedule the document here. A
+single worker thread analyzes scheduled documents one at a time. A document
+that is edited again before the worker gets to it is analyzed once, with all the
+edits. When an analysis is done `on_analysis` is called (from the worker thread)
+with the `OpenDocument` and the new `Document`.
+
+The analysis of an edited document is put off for a while (debounced), in
+proportion to how long the last analysis of that document took. Small documents
+are analyzed right away, while a burst of typing in a large workflow leads to
+one analysis at the end of the burst, not one per keystroke. So that continuous
+typing doesn't hold up the analysis forever, a document is never put off for
+more than `max_wait` since it was first scheduled.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import time
+import threading
+from typing import Dict
+
+from ..code.opendocument import OpenDocument
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PendingAnalysis:
+
+    def __init__(self, document: OpenDocument, due: float, deadline: float):
+        self.document = document
+        self.due = due
+        self.deadline = deadline
+
+
+class AnalysisWorker:
+
+    def __init__(self, on_analysis, delay_factor: float = 1.0, max_delay: float = 0.5, max_wait: float = 2.0):
+        self.on_analysis = on_analysis
+        self.delay_factor = delay_factor
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+
+        self._pending: Dict[str, PendingAnalysis] = {}
+        self._cv = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="benten-analysis", daemon=True)
+        self._thread.start()
+
+    def schedule(self, document: OpenDocument, debounce: bool = True):
+        """Analyze the document. With `debounce` wait a while for further edits first"""
+        now = time.monotonic()
+        delay = min(self.max_delay, self.delay_factor * document.analysis_time) if debounce else 0
+        with self._cv:
+            pending = self._pending.get(document.doc_uri)
+            if pending is None or pending.document is not document:
+                pending = PendingAnalysis(document, due=now + delay, deadline=now + self.max_wait)
+                self._pending[document.doc_uri] = pending
+            else:
+                pending.due = min(now + delay, pending.deadline)
+            self._cv.notify()
+
+    def stop(self, timeout: float = 5.0):
+        """Drop pending analyses and wait (up to `timeout`) for the one in progress to finish"""
+        with self._cv:
+            self._running = False
+            self._cv.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("Analysis still running after shutdown")
+
+    def _next(self):
+        with self._cv:
+            while self._running:
+                if self._pending:
+                    pending = min(self._pending.values(), key=lambda p: p.due)
+                    wait = pending.due - time.monotonic()
+                    if wait <= 0:
+                        self._pending.pop(pending.document.doc_uri)
+                        return pending.document
+                    self._cv.wait(wait)
+                else:
+                    self._cv.wait()
+            return None
+
+    def _run(self):
+        while True:
+            document = self._next()
+            if document is None:
+                break
+
+            try:
+                self.on_analysis(document, document.update())
+            except Exception as e:
+                logger.error(f"Error analyzing {document.doc_uri}: {e}", exc_info=True)
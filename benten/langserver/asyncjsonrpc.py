@@ -0,0 +1,138 @@
+"""JSON RPC over asyncio streams (stdio or TCP).
+
+Messages are read with `await read_message()`. Outgoing messages are queued and a
+writer task sends them, writing all the frames that have piled up in one go
+before waiting for the stream to drain. The `write_*`/`send_*` methods can be
+called from any thread (handlers run in an executor, diagnostics are sent from
+the analysis thread) and return immediately.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+import asyncio
+
+from .jsonrpc import MessageBuffer, encode_frame
+from .jsoncodec import default_codec
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class AsyncJSONRPC2Connection:
+
+    chunk_size = 65536
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, codec=None):
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec or default_codec
+        self._in_buffer = MessageBuffer()
+        self._loop: asyncio.AbstractEventLoop = None
+        self._outgoing: asyncio.Queue = None
+        self._writer_task: asyncio.Task = None
+
+    def start(self):
+        """Start the writer task. Must be called from the event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._outgoing = asyncio.Queue()
+        self._writer_task = self._loop.create_task(self._write_frames())
+
+    async def close(self):
+        """Send what is queued and close the stream"""
+        if self._writer_task is not None:
+            self._outgoing.put_nowait(None)
+            await self._writer_task
+            self._writer_task = None
+        self.writer.close()
+
+    async def read_message(self):
+        while True:
+            msg = self._in_buffer.next_message(self.codec.decode)
+            if msg is not None:
+                logger.debug("RECV %s", msg)
+                return msg
+
+            data = await self.reader.read(self.chunk_size)
+            if not data:
+                raise EOFError()
+            self._in_buffer.feed(data)
+
+    def _send(self, body):
+        frame = encode_frame(body, self.codec)
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        try:
+            if running_loop is self._loop:
+                self._outgoing.put_nowait(frame)
+            else:
+                self._loop.call_soon_threadsafe(self._outgoing.put_nowait, frame)
+        except RuntimeError:
+            logger.warning("Connection closed, dropping message")
+            return
+
+        logger.debug("SEND %s", body)
+
+    async def _write_frames(self):
+        closing = False
+        while not closing:
+            frames = [await self._outgoing.get()]
+            while not self._outgoing.empty():
+                frames.append(self._outgoing.get_nowait())
+
+            if None in frames:
+                frames = frames[:frames.index(None)]
+                closing = True
+
+            if frames:
+                try:
+                    self.writer.write(b"".join(frames))
+                    await self.writer.drain()
+                except ConnectionError as e:
+                    logger.error(f"Could not write to client: {e}")
+                    break
+
+    def write_response(self, rid, result):
+        self._send({
+            "jsonrpc": "2.0",
+            "id": rid,
+            "result": result,
+        })
+
+    def write_error(self, rid, code, message, data=None):
+        e = {
+            "code": code,
+            "message": message,
+        }
+        if data is not None:
+            e["data"] = data
+        self._send({
+            "jsonrpc": "2.0",
+            "id": rid,
+            "error": e,
+        })
+
+    def send_notification(self, method: str, params):
+        self._send({
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+        })
+
+
+async def open_stdio_connection() -> AsyncJSONRPC2Connection:
+    """Raises OSError or ValueError if stdin/stdout are not pipes or sockets (e.g. a regular file),
+    or NotImplementedError if the event loop can't do pipes"""
+    loop = asyncio.get_running_loop()
+
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout.buffer)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+
+    return AsyncJSONRPC2Connection(reader, writer)
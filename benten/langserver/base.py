@@ -1,9 +1,11 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
+import threading
 from typing import Dict
 from enum import IntEnum
 
-from ..code.document import Document
+from ..code.opendocument import OpenDocument
+from .analysis import AnalysisWorker
 
 import logging
 
@@ -52,9 +54,18 @@ class CWLLangServerBase:
         self.workspace = None
         self.streaming = True
 
-        self.open_documents: Dict[str, Document] = {}
+        self.open_documents: Dict[str, OpenDocument] = {}
+        # The workflow graph of each document as last sent to the client, or written out.
+        # The sent graphs are updated from the analysis thread, under the lock
+        self.sent_graphs: Dict[str, dict] = {}
+        self.sent_graphs_lock = threading.Lock()
+        self.written_graphs: Dict[str, dict] = {}
+        self.analysis = AnalysisWorker(on_analysis=self.analysis_done)
         self.initialization_request_received = False
 
         self.client_capabilities = {}
 
         self.config = config
+
+    def analysis_done(self, document, analysis):
+        pass
@@ -0,0 +1,56 @@
+"""Cooperative cancellation of requests.
+
+Each request the client sends gets a CancellationToken when it is read. The
+token is cancelled when the client sends `$/cancelRequest` for it, or when a
+newer request makes it pointless (e.g. a hover at a new position). A request
+that is cancelled before it runs is answered with `RequestCancelled` without
+running. Long running code (like expression evaluation) calls `check_cancelled`
+now and then so that a request cancelled while running stops early.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import contextvars
+from contextlib import contextmanager
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise RequestCancelled(f"Request {self.request_id} cancelled")
+
+
+_current_token = contextvars.ContextVar("benten_cancellation_token", default=None)
+
+
+@contextmanager
+def cancellable(token: CancellationToken):
+    """Make `token` the one `check_cancelled` checks, for the code in this block"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check_cancelled():
+    """Raise RequestCancelled if the request being served has been cancelled.
+    Does nothing outside of a request, e.g. during analysis"""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
@@ -1,10 +1,14 @@
 """
 textDocument/completion
+
+Candidates are filtered and ranked here by the word typed at the cursor and
+only the best are sent (see code/completionfilter.py)
 """
 
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
 from .lspobjects import Position
+from ..code.completionfilter import rank_completions
 from .base import CWLLangServerBase
 
 import logging
@@ -19,4 +23,4 @@ class Completion(CWLLangServerBase):
         position = Position(**params["position"])
 
         doc = self.open_documents[doc_uri]
-        return doc.completion(position)
+        return rank_completions(doc.completion(position), doc.word_before(position))
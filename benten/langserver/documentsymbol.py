@@ -1,5 +1,14 @@
 """
 textDocument/documentSymbol
+
+and the workflow graph for the preview. A client that declares the experimental
+capability `workflowGraph` is sent a `benten/workflowGraph` notification after
+each analysis that changes the graph of a document, with the nodes and edges to
+update or remove (see workflowgraph.py). The first one for a document has
+`reset` set, and the whole graph as updates, as does the first after the document
+is closed and opened again. Other clients read the graph from a JSON file in the
+scratch directory, which is written when document symbols are asked for, if the
+graph has changed.
 """
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
@@ -8,6 +17,7 @@ import json
 import hashlib
 
 from .base import CWLLangServerBase
+from ..code.workflowgraph import graph_diff, is_empty_diff
 
 import logging
 logger = logging.getLogger(__name__)
@@ -19,14 +29,50 @@ class DocumentSymbol(CWLLangServerBase):
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
 
-        doc = self.open_documents[doc_uri]
+        doc = self.open_documents[doc_uri].servable
+        if doc is None:
+            return []
 
-        self._write_out_graph(doc)
+        if not self._client_takes_graph_notifications():
+            self._write_out_graph(doc)
         return doc.symbols
 
+    # Called from the analysis thread
+    def analysis_done(self, document, analysis):
+        super().analysis_done(document, analysis)
+        if analysis.wf_graph is None or not self._client_takes_graph_notifications():
+            return
+
+        # Held until the notification is queued, so a didClose can't come in between
+        with self.sent_graphs_lock:
+            if self.open_documents.get(document.doc_uri) is not document:
+                return
+
+            previous = self.sent_graphs.get(document.doc_uri)
+            diff = graph_diff(previous, analysis.wf_graph)
+            if previous is not None and is_empty_diff(diff):
+                return
+
+            self.sent_graphs[document.doc_uri] = analysis.wf_graph
+            self.conn.send_notification(
+                method="benten/workflowGraph",
+                params={
+                    "uri": document.doc_uri,
+                    "version": analysis.version,
+                    "reset": previous is None,
+                    **diff
+                })
+
+    def _client_takes_graph_notifications(self):
+        return bool((self.client_capabilities.get("experimental") or {}).get("workflowGraph"))
+
     def _write_out_graph(self, doc):
+        if self.written_graphs.get(doc.doc_uri) == doc.wf_graph:
+            return
+
         graph_data_file = pathlib.Path(
             self.config.scratch_path,
             hashlib.md5(doc.doc_uri.encode()).hexdigest() + ".json")
         with graph_data_file.open("w") as f:
             json.dump(doc.wf_graph, f, indent=2)
+        self.written_graphs[doc.doc_uri] = doc.wf_graph
@@ -39,9 +39,12 @@ interface TextDocumentItem {
 """
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
-from .lspobjects import to_dict, PublishDiagnosticsParams
+from .lspobjects import PublishDiagnosticsParams
 from .base import CWLLangServerBase
 from ..code.document import Document
+from ..code.opendocument import OpenDocument
+from ..code.filecache import linked_file_cache
+from ..cwl.lib import un_mangle_uri
 
 import logging
 logger = logging.getLogger(__name__)
@@ -53,7 +56,7 @@ class FileOperation(CWLLangServerBase):
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
 
-        document = Document(
+        document = OpenDocument(
             doc_uri=doc_uri,
             scratch_path=self.config.scratch_path,
             text=params["textDocument"]["text"],
@@ -61,34 +64,51 @@ class FileOperation(CWLLangServerBase):
             type_dicts=self.config.lang_models)
 
         self.open_documents[doc_uri] = document
-        self._mark_document_issues(doc_uri)
+        self.analysis.schedule(document)
 
     def serve_textDocument_didChange(self, client_query):
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
 
-        content_changes = params["contentChanges"]
-
-        if len(content_changes) > 1:
-            logger.error("Server can currently only handle full text updates")
-
-        content_change = content_changes[0]
-        if "range" in content_change or "rangeLength" in content_change:
-            logger.error("Server can currently only handle full text updates")
-
-        self.open_documents[doc_uri].update(new_text=content_change["text"])
-        self._mark_document_issues(doc_uri)
+        document = self.open_documents[doc_uri]
+        document.apply_changes(
+            content_changes=params["contentChanges"],
+            version=params["textDocument"].get("version"))
+        self.analysis.schedule(document)
 
     def serve_textDocument_didClose(self, client_query):
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
-        self.open_documents.pop(doc_uri)
+        with self.sent_graphs_lock:
+            self.open_documents.pop(doc_uri)
+            # The client drops the graph too. If the document is opened again it gets all of it
+            self.sent_graphs.pop(doc_uri, None)
+        self.written_graphs.pop(doc_uri, None)
+
+    # https://microsoft.github.io/language-server-protocol/specification#workspace_didChangeWatchedFiles
+    # Linked files are cached and checked against their mtime on every access. This
+    # lets us drop changed files right away and refresh the diagnostics of the open
+    # documents that link to them
+    def serve_workspace_didChangeWatchedFiles(self, client_query):
+        params = client_query["params"]
+        changed = set()
+        for change in params.get("changes", []):
+            path = un_mangle_uri(change["uri"]).resolve()
+            linked_file_cache.invalidate(path)
+            changed.add(path)
+
+        for document in list(self.open_documents.values()):
+            if document.links_to(changed):
+                self.analysis.schedule(document)
+
+    # Called from the analysis thread
+    def analysis_done(self, document: OpenDocument, analysis: Document):
+        if self.open_documents.get(document.doc_uri) is not document:
+            return  # Closed (or re-opened) while we were analyzing it
 
-    def _mark_document_issues(self, doc_uri):
-        document = self.open_documents[doc_uri]
         self.conn.send_notification(
             method="textDocument/publishDiagnostics",
-            params=to_dict(
-                PublishDiagnosticsParams(
-                    uri=doc_uri,
-                    diagnostics=document.problems)))
+            params=PublishDiagnosticsParams(
+                uri=document.doc_uri,
+                version=analysis.version,
+                diagnostics=analysis.problems))
@@ -4,8 +4,6 @@ textDocument/formatting
 
 #  Copyright (c) 2020 Seven Bridges. See LICENSE
 
-from cwlformat.formatter import cwl_format
-
 from .base import CWLLangServerBase
 from .lspobjects import Position, Range, TextEdit
 
@@ -16,6 +14,9 @@ logger = logging.getLogger(__name__)
 class Formatting(CWLLangServerBase):
 
     def serve_textDocument_formatting(self, client_query):
+        # Deferred: most sessions never format a document
+        from cwlformat.formatter import cwl_format
+
         params = client_query["params"]
         doc_uri = params["textDocument"]["uri"]
         doc = self.open_documents[doc_uri]
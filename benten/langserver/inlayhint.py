@@ -0,0 +1,26 @@
+"""
+textDocument/inlayHint
+
+Shows the result of each expression after the expression, so the whole
+document can be checked at a glance instead of hovering expressions one by one.
+"""
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+from .lspobjects import Position, Range
+from .base import CWLLangServerBase
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class InlayHint(CWLLangServerBase):
+
+    def serve_textDocument_inlayHint(self, client_query):
+        params = client_query["params"]
+        doc_uri = params["textDocument"]["uri"]
+        _range = params.get("range")
+        if _range is not None:
+            _range = Range(start=Position(**_range["start"]), end=Position(**_range["end"]))
+        doc = self.open_documents[doc_uri]
+
+        return doc.inlay_hints(_range)
@@ -0,0 +1,83 @@
+"""Encoding and decoding of JSON RPC messages.
+
+Uses orjson when it is installed and the standard library otherwise. Set
+BENTEN_JSON_CODEC (json|orjson) to choose one.
+
+LSP objects (`LSPObject`) are converted while encoding, in a single pass,
+instead of first being converted to dicts with `to_dict`. As with `to_dict`,
+fields that are None are left out.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import os
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .lspobjects import LSPObject
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def lsp_default(obj):
+    if isinstance(obj, LSPObject):
+        return {k: v for k, v in obj.__dict__.items() if v is not None}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class StdlibCodec:
+
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"), default=lsp_default)
+
+    def encode(self, obj) -> bytes:
+        return self._encoder.encode(obj).encode("utf-8")
+
+    @staticmethod
+    def decode(data):
+        """data can be bytes or a memoryview"""
+        return json.loads(str(data, "utf-8"))
+
+
+class OrjsonCodec:
+
+    name = "orjson"
+
+    def __init__(self):
+        self._fallback = StdlibCodec()
+
+    def encode(self, obj) -> bytes:
+        try:
+            return orjson.dumps(obj, default=lsp_default)
+        except orjson.JSONEncodeError:
+            # orjson is stricter, e.g. about integers over 64 bits and non str keys
+            return self._fallback.encode(obj)
+
+    @staticmethod
+    def decode(data):
+        return orjson.loads(data)
+
+
+available_codecs = {"json": StdlibCodec}
+if orjson is not None:
+    available_codecs["orjson"] = OrjsonCodec
+
+
+def get_codec(name: str = None):
+    name = name or os.environ.get("BENTEN_JSON_CODEC")
+    if name is None:
+        name = "orjson" if "orjson" in available_codecs else "json"
+    elif name not in available_codecs:
+        logger.warning(f"JSON codec {name} is not available, using json")
+        name = "json"
+    return available_codecs[name]()
+
+
+default_codec = get_codec()
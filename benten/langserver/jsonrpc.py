@@ -24,12 +24,12 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import json
 import logging
-import queue
 import threading
 from collections import deque
 
+from .jsoncodec import default_codec
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,65 +37,112 @@ class JSONRPC2ProtocolError(Exception):
     pass
 
 
+# Content-Length counts bytes (of the UTF-8 encoded body), so all the framing
+# is done on bytes, before anything is decoded
+class MessageBuffer:
+    """Accumulates the bytes read from the client and cuts complete messages out
+    of them. The headers of a message are parsed in one scan once they are all in.
+    The body is handed to the decoder as a memoryview of the buffer, not copied out"""
+
+    header_end = b"\r\n\r\n"
+    content_length = b"Content-Length:"
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._start = 0         # Start of the first unconsumed message
+        self._body_start = None  # Set once the headers of that message are parsed
+        self._body_end = None
+
+    def feed(self, data: bytes):
+        if self._start:
+            # Drop the consumed messages before growing the buffer
+            del self._buffer[:self._start]
+            if self._body_start is not None:
+                self._body_start -= self._start
+                self._body_end -= self._start
+            self._start = 0
+        self._buffer += data
+
+    def next_message(self, decode):
+        """Decode and return the next complete message, or None if it isn't all in yet"""
+        if self._body_start is None and not self._parse_headers():
+            return None
+
+        if len(self._buffer) < self._body_end:
+            return None
+
+        start, end = self._body_start, self._body_end
+        self._start, self._body_start, self._body_end = end, None, None
+        with memoryview(self._buffer) as view, view[start:end] as body:
+            return decode(body)
+
+    def _parse_headers(self):
+        header_end = self._buffer.find(self.header_end, self._start)
+        if header_end < 0:
+            return False
+
+        # A message with bad headers is skipped, so reading can carry on after the error
+        start, self._start = self._start, header_end + len(self.header_end)
+
+        idx = self._buffer.find(self.content_length, start, header_end)
+        if idx < 0:
+            raise JSONRPC2ProtocolError("Missing Content-Length header")
+        value_end = self._buffer.find(b"\r\n", idx, header_end + 2)
+        value = bytes(self._buffer[idx + len(self.content_length):value_end])
+        try:
+            length = int(value)
+        except ValueError:
+            raise JSONRPC2ProtocolError("Invalid Content-Length header: {}".format(value))
+
+        self._body_start = header_end + len(self.header_end)
+        self._body_end = self._body_start + length
+        return True
+
+
+def encode_frame(body, codec) -> bytes:
+    body = codec.encode(body)
+    return (
+        "Content-Length: {}\r\n"
+        "Content-Type: application/vscode-jsonrpc; charset=utf8\r\n\r\n".format(len(body))
+    ).encode("ascii") + body
+
+
 class ReadWriter:
     def __init__(self, reader, writer):
         self.reader = reader
         self.writer = writer
 
-    def readline(self, *args):
-        return self.reader.readline(*args).decode("utf-8")
+    def read_chunk(self, size=65536) -> bytes:
+        """Whatever is available, up to size bytes. Empty at EOF"""
+        read1 = getattr(self.reader, "read1", None)
+        return read1(size) if read1 is not None else self.reader.read(size)
 
-    def read(self, *args):
-        return self.reader.read(*args).decode("utf-8")
-
-    def write(self, out):
-        self.writer.write(out.encode("utf-8"))
-        self.writer.flush()
-
-
-class TCPReadWriter(ReadWriter):
-    def readline(self, *args):
-        data = self.reader.readline(*args)
-        return data.decode("utf-8")
-
-    def read(self, *args):
-        return self.reader.read(*args).decode("utf-8")
-
-    def write(self, out):
-        self.writer.write(out.encode())
+    def write(self, out: bytes):
+        self.writer.write(out)
         self.writer.flush()
 
 
 class JSONRPC2Connection:
-    def __init__(self, conn=None):
+    def __init__(self, conn=None, codec=None):
         self.conn = conn
+        self.codec = codec or default_codec
         self._msg_buffer = deque()
+        self._in_buffer = MessageBuffer()
         self._next_id = 1
-
-    def _read_header_content_length(self, line):
-        if len(line) < 2 or line[-2:] != "\r\n":
-            raise JSONRPC2ProtocolError("Line endings must be \\r\\n")
-        if line.startswith("Content-Length: "):
-            _, value = line.split("Content-Length: ")
-            value = value.strip()
-            try:
-                return int(value)
-            except ValueError:
-                raise JSONRPC2ProtocolError(
-                    "Invalid Content-Length header: {}".format(value))
+        # Notifications are also sent from the analysis thread
+        self._write_lock = threading.Lock()
 
     def _receive(self):
-        line = self.conn.readline()
-        if line == "":
-            raise EOFError()
-        length = self._read_header_content_length(line)
-        # Keep reading headers until we find the sentinel line for the JSON
-        # request.
-        while line != "\r\n":
-            line = self.conn.readline()
-        body = self.conn.read(length)
-        logger.debug("RECV %s", body)
-        return json.loads(body)
+        while True:
+            msg = self._in_buffer.next_message(self.codec.decode)
+            if msg is not None:
+                logger.debug("RECV %s", msg)
+                return msg
+
+            data = self.conn.read_chunk()
+            if not data:
+                raise EOFError()
+            self._in_buffer.feed(data)
 
     def read_message(self, want=None):
         """Read a JSON RPC message sent over the current connection.
@@ -120,13 +167,9 @@ class JSONRPC2Connection:
             self._msg_buffer.append(msg)
 
     def _send(self, body):
-        body = json.dumps(body, separators=(",", ":"))
-        content_length = len(body)
-        response = (
-            "Content-Length: {}\r\n"
-            "Content-Type: application/vscode-jsonrpc; charset=utf8\r\n\r\n"
-            "{}".format(content_length, body))
-        self.conn.write(response)
+        frame = encode_frame(body, self.codec)
+        with self._write_lock:
+            self.conn.write(frame)
         logger.debug("SEND %s", body)
 
     def write_response(self, rid, result):
@@ -171,41 +214,6 @@ class JSONRPC2Connection:
         }
         self._send(body)
 
-    def send_request_batch(self, requests):
-        """Pipelines requests and returns responses.
-        The responses is a generator where the nth response corresponds
-        with the nth request. Users must read the generator until the
-        end, otherwise you will leak a thread.
-        """
-
-        # We communicate the request ids using a thread safe queue.
-        # It also allows us to bound the number of concurrent requests.
-        q = queue.Queue(100)
-
-        def send():
-            for method, params in requests:
-                rid = self._next_id
-                self._next_id += 1
-                q.put(rid)
-                body = {
-                    "jsonrpc": "2.0",
-                    "id": rid,
-                    "method": method,
-                    "params": params,
-                }
-                self._send(body)
-
-            # Sentinel value to indicate we are done
-            q.put(None)
-
-        threading.Thread(target=send).start()
-
-        while True:
-            rid = q.get()
-            if rid is None:
-                break
-            yield self.read_message(want=lambda msg: msg.get("id") == rid)
-
 
 def deque_find_and_pop(d, f):
     idx = None
@@ -95,8 +95,9 @@ class Diagnostic(LSPObject):
 
 
 class PublishDiagnosticsParams(LSPObject):
-    def __init__(self, uri, diagnostics: List[Diagnostic]):
+    def __init__(self, uri, diagnostics: List[Diagnostic], version: int = None):
         self.uri = uri
+        self.version = version
         self.diagnostics = diagnostics
 
 
@@ -257,3 +258,19 @@ class MarkupContent(LSPObject):
     def __init__(self, value, kind="markdown"):
         self.kind = kind
         self.value = value
+
+
+class InlayHintKind(IntEnum):
+    Type = 1
+    Parameter = 2
+
+
+class InlayHint(LSPObject):
+    def __init__(self, position: Position, label: str, kind: InlayHintKind = None,
+                 tooltip=None, padding_left: bool = None, padding_right: bool = None):
+        self.position = position
+        self.label = label
+        self.kind = kind
+        self.tooltip = tooltip
+        self.paddingLeft = padding_left
+        self.paddingRight = padding_right
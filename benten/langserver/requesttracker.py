@@ -0,0 +1,69 @@
+"""Keeps a CancellationToken for each request from the time it is read until it
+has been served, so that `$/cancelRequest` can cancel it whether it is still
+queued or already running.
+
+A hover, completion, definition, document symbol or inlay hint request is also superseded
+(cancelled) by a newer request of the same kind for the same document: by the
+time we got to it, the user has moved on.
+
+Only used from the event loop thread.
+"""
+
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+from typing import Dict, Tuple
+
+from .cancellation import CancellationToken
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+supersedable_methods = {
+    "textDocument/hover",
+    "textDocument/completion",
+    "textDocument/definition",
+    "textDocument/documentSymbol",
+    "textDocument/inlayHint"
+}
+
+
+class RequestTracker:
+
+    def __init__(self):
+        self._tokens: Dict[object, CancellationToken] = {}
+        self._latest: Dict[Tuple[str, str], CancellationToken] = {}
+
+    def received(self, message: dict) -> CancellationToken:
+        """Start tracking a request. Returns None for notifications"""
+        if "id" not in message:
+            return None
+
+        token = CancellationToken(message["id"])
+        self._tokens[message["id"]] = token
+        key = _supersede_key(message)
+        if key is not None:
+            superseded = self._latest.get(key)
+            if superseded is not None:
+                superseded.cancel()
+            self._latest[key] = token
+        return token
+
+    def done(self, message: dict):
+        if "id" in message:
+            token = self._tokens.pop(message["id"], None)
+            key = _supersede_key(message)
+            if key is not None and self._latest.get(key) is token:
+                self._latest.pop(key)
+
+    def cancel(self, request_id):
+        token = self._tokens.get(request_id)
+        if token is not None:
+            logger.debug(f"Cancelling request {request_id}")
+            token.cancel()
+
+
+def _supersede_key(message):
+    method = message.get("method")
+    if method in supersedable_methods:
+        return method, message.get("params", {}).get("textDocument", {}).get("uri")
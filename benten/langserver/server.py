@@ -7,6 +7,7 @@ Expected requests
     "textDocument/didChange": self.serve_doc_did_change,
     "textDocument/completion": self.serve_completion,
     "textDocument/hover": self.serve_hover,
+    "textDocument/inlayHint": self.serve_textDocument_inlayHint,
     "textDocument/codeAction": self.serve_available_commands,
     "textDocument/implementation":
     "textDocument/definition": self.serve_definition,
@@ -17,22 +18,28 @@ Expected requests
     "workspace/symbol": self.serve_symbols,
     "workspace/xpackages": self.serve_x_packages,
     "workspace/xdependencies": self.serve_x_dependencies,
-    "$/cancelRequest": self.serve_ignore,
+    "$/cancelRequest": handled by RequestQueue, cancels the request
     "shutdown": self.serve_ignore,
     "exit": self.serve_exit,
 
 """
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
+import asyncio
+import inspect
+import threading
 from enum import IntEnum
+from concurrent.futures import Executor, ThreadPoolExecutor
 
-from .lspobjects import to_dict
 from .base import CWLLangServerBase, JSONRPC2Error, ServerError, LSPErrCode
+from .cancellation import CancellationToken, RequestCancelled, cancellable
+from .requesttracker import RequestTracker
 from .fileoperation import FileOperation
 from .definition import Definition
 from .completion import Completion
 from .documentsymbol import DocumentSymbol
 from .hover import Hover
+from .inlayhint import InlayHint
 from .formatting import Formatting
 
 import logging
@@ -41,6 +48,7 @@ logger = logging.getLogger(__name__)
 logger.propagate = True
 
 logging.getLogger("benten.langserver.jsonrpc").propagate = False
+logging.getLogger("benten.langserver.asyncjsonrpc").propagate = False
 
 
 class TextDocumentSyncKind(IntEnum):
@@ -51,6 +59,7 @@ class TextDocumentSyncKind(IntEnum):
 
 class LangServer(
         Formatting,
+        InlayHint,
         Hover,
         DocumentSymbol,
         Completion,
@@ -58,15 +67,102 @@ class LangServer(
         FileOperation,
         CWLLangServerBase):
 
+    # Served on the event loop, in the order received, before anything
+    # that comes after them. Notifications are too
+    inline_methods = {"initialize", "shutdown", "exit"}
+
     def run(self):
-        while self.running:
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """Messages are read by a separate task (or thread, for a blocking connection) as
+        they come in, so cancellations are seen straight away. Notifications (which are
+        quick, e.g. didChange only edits the text) are served in order on the event loop.
+        Requests are served concurrently with the reading: coroutine handlers as tasks,
+        others on an executor. The executor has one thread, since code intelligence
+        objects can be shared between analyses and are not safe to use from several
+        threads at once."""
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="benten-handler")
+        tracker = RequestTracker()
+        messages = asyncio.Queue()
+
+        def received(message):
+            if message is None:
+                messages.put_nowait((None, None))
+            elif message.get("method") == "$/cancelRequest":
+                tracker.cancel(message.get("params", {}).get("id"))
+            else:
+                messages.put_nowait((message, tracker.received(message)))
+
+        if inspect.iscoroutinefunction(self.conn.read_message):
+            self.conn.start()
+            reader = loop.create_task(self._read_messages(received))
+        else:
+            reader = None
+            threading.Thread(
+                target=self._read_messages_blocking, args=(loop, received),
+                name="benten-reader", daemon=True).start()
+
+        in_flight = set()
+        try:
+            while self.running:
+                message, token = await messages.get()
+                if message is None:
+                    break
+
+                if token is None or message.get("method") in self.inline_methods:
+                    if message.get("method") == "shutdown" and in_flight:
+                        await asyncio.wait(in_flight)
+                    await self._serve(message, token, None, tracker)
+                else:
+                    task = loop.create_task(self._serve(message, token, executor, tracker))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+            if in_flight:
+                await asyncio.wait(in_flight)
+        finally:
+            if reader is not None:
+                reader.cancel()
+                await self.conn.close()
+            executor.shutdown(wait=False)
+            self.analysis.stop()
+
+    async def _read_messages(self, received):
+        while True:
             try:
-                request = self.conn.read_message()
-                self.handle(request)
+                message = await self.conn.read_message()
             except EOFError:
                 break
             except Exception as e:
-                logger.error("Unexpected error: %s", e, exc_info=True)
+                logger.error("Unexpected error reading message: %s", e, exc_info=True)
+                continue
+            received(message)
+        received(None)
+
+    def _read_messages_blocking(self, loop, received):
+        while True:
+            try:
+                message = self.conn.read_message()
+            except EOFError:
+                break
+            except Exception as e:
+                logger.error("Unexpected error reading message: %s", e, exc_info=True)
+                continue
+            loop.call_soon_threadsafe(received, message)
+        try:
+            loop.call_soon_threadsafe(received, None)
+        except RuntimeError:
+            pass  # The server has already stopped
+
+    async def _serve(self, message, token: CancellationToken, executor: Executor, tracker: RequestTracker):
+        try:
+            await self.handle(message, token, executor)
+        except Exception as e:
+            logger.error("Unexpected error: %s", e, exc_info=True)
+        finally:
+            tracker.done(message)
 
     # Request message:
     # {
@@ -80,7 +176,7 @@ class LangServer(
     # 		...
     # 	}
     # }
-    def handle(self, client_query):
+    async def handle(self, client_query, token: CancellationToken = None, executor: Executor = None):
         logger.info("Client query: {}".format(client_query.get("method")))
 
         is_a_request = "id" in client_query
@@ -92,11 +188,23 @@ class LangServer(
             return
 
         try:
-            response = to_dict(self._dispatch(client_query))
+            if token is not None:
+                token.check()
+
+            # LSP objects in the response are converted as it is encoded
+            response = await self._dispatch(client_query, token, executor)
 
             if is_a_request:
                 self.conn.write_response(client_query["id"], response)
 
+        except RequestCancelled as e:
+            logger.info(str(e))
+            if is_a_request:
+                self.conn.write_error(
+                    client_query["id"],
+                    code=LSPErrCode.RequestCancelled,
+                    message="Request cancelled")
+
         except ServerError as e:
             logger.error(e.server_error_message)
 
@@ -135,14 +243,24 @@ class LangServer(
         else:
             return False
 
-    def _dispatch(self, client_query):
+    async def _dispatch(self, client_query, token: CancellationToken = None, executor: Executor = None):
         # textDocument/didOpen -> serve_textDocument_didOpen
         method_name = "serve_" + client_query.get("method", "noMethod").replace("/", "_")
         try:
             f = getattr(self, method_name)
         except AttributeError as e:
             f = self.serve_unknown
-        return f(client_query)
+
+        if inspect.iscoroutinefunction(f):
+            with cancellable(token):
+                return await f(client_query)
+
+        if executor is None:
+            with cancellable(token):
+                return f(client_query)
+
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, _call_cancellable, f, client_query, token)
 
     @staticmethod
     def serve_noMethod(client_query):
@@ -170,18 +288,18 @@ class LangServer(
     def serve_initialize(self, client_query):
         self.initialization_request_received = True
 
-        self.client_capabilities = client_query.get("capabilities", {})
+        self.client_capabilities = client_query.get("params", {}).get("capabilities", {})
         logger.debug("InitOpts: {}".format(client_query))
 
         return {
             "capabilities": {
-                "textDocumentSync": TextDocumentSyncKind.Full,
-                #  Avoid complexity of incremental updates for now
+                "textDocumentSync": TextDocumentSyncKind.Incremental,
                 "completionProvider": {
                     "resolveProvider": True,
                     "triggerCharacters": [".", "/"]
                 },
                 "hoverProvider": True,
+                "inlayHintProvider": True,
                 "definitionProvider": True,
                 "referencesProvider": True,
                 "documentSymbolProvider": True,
@@ -199,7 +317,11 @@ class LangServer(
                 },
                 # https://github.com/sourcegraph/language-server-protocol/blob/master/extension-files.md#files-extensions-to-lsp
                 # This is not in the spec yet
-                "xfilesProvider": True
+                "xfilesProvider": True,
+                "experimental": {
+                    # benten/workflowGraph notifications, for clients that declare they want them
+                    "workflowGraphProvider": True
+                }
             }
         }
 
@@ -207,3 +329,7 @@ class LangServer(
     def serve_initialized(client_query):
         return {}
 
+
+def _call_cancellable(f, client_query, token):
+    with cancellable(token):
+        return f(client_query)
@@ -26,6 +26,10 @@ setup(
         "dukpy >= 0.2.2",
         "cwlformat"
     ],
+    extras_require={
+        # Faster encoding/decoding of LSP messages
+        "fast-json": ["orjson"]
+    },
     entry_points={
         'console_scripts': [
             'benten-ls = benten.__main__:main'
@@ -4,6 +4,7 @@ import pathlib
 import tempfile
 
 from benten.code.document import Document
+from benten.code.opendocument import OpenDocument
 
 from benten.cwl.specification import parse_schema
 
@@ -17,6 +18,18 @@ def load(doc_path: pathlib.Path, type_dicts: dict):
         type_dicts=type_dicts)
 
 
+def load_open(doc_path: pathlib.Path, type_dicts: dict):
+    """As the server holds it, analyzed once"""
+    doc = OpenDocument(
+        doc_uri=doc_path.as_uri(),
+        scratch_path=tempfile.mkdtemp(prefix="benten-test"),
+        text=doc_path.read_text(),
+        version=1,
+        type_dicts=type_dicts)
+    doc.update()
+    return doc
+
+
 current_path = pathlib.Path(__file__).parent
 schema_path = pathlib.Path(current_path, "../benten/000.package.data/")
 
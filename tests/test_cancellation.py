@@ -0,0 +1,100 @@
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import pathlib
+import tempfile
+import threading
+
+import pytest
+
+from benten.langserver.base import LSPErrCode
+from benten.langserver.cancellation import (
+    CancellationToken, RequestCancelled, cancellable, check_cancelled)
+from benten.langserver.server import LangServer
+
+from lib import load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+
+class Config:
+    scratch_path = pathlib.Path(tempfile.mkdtemp(prefix="benten-test"))
+    lang_models = load_type_dicts()
+
+
+class ScriptedConnection:
+    """Hands out the messages in order. The response to the first request waits
+    until all the messages have been read, so the rest are all queued up by then"""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.all_read = threading.Event()
+        self.sent = []
+
+    def read_message(self):
+        if not self.messages:
+            self.all_read.set()
+            raise EOFError()
+        return self.messages.pop(0)
+
+    def write_response(self, rid, result):
+        self.all_read.wait(10)
+        self.sent += [("result", rid)]
+
+    def write_error(self, rid, code, message, data=None):
+        self.sent += [("error", rid, code)]
+
+    def send_notification(self, method, params):
+        pass
+
+
+def test_check_cancelled():
+    check_cancelled()  # Outside of a request
+
+    token = CancellationToken(1)
+    with cancellable(token):
+        check_cancelled()
+        token.cancel()
+        with pytest.raises(RequestCancelled):
+            check_cancelled()
+
+    check_cancelled()
+
+
+def test_cancelled_and_superseded_requests():
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc_uri = path.as_uri()
+
+    def hover(rid, line):
+        return {"id": rid, "method": "textDocument/hover",
+                "params": {"textDocument": {"uri": doc_uri}, "position": {"line": line, "character": 4}}}
+
+    def definition(rid):
+        return {"id": rid, "method": "textDocument/definition",
+                "params": {"textDocument": {"uri": doc_uri}, "position": {"line": 10, "character": 4}}}
+
+    def completion(rid):
+        return {"id": rid, "method": "textDocument/completion",
+                "params": {"textDocument": {"uri": doc_uri}, "position": {"line": 10, "character": 4}}}
+
+    messages = [
+        {"id": 1, "method": "initialize", "params": {}},
+        {"method": "textDocument/didOpen",
+         "params": {"textDocument": {"uri": doc_uri, "text": path.read_text(), "version": 1}}},
+        hover(2, 1),
+        hover(3, 2),  # Supersedes 2
+        definition(4),
+        {"method": "$/cancelRequest", "params": {"id": 4}},
+        completion(5),
+    ]
+
+    conn = ScriptedConnection(messages)
+    LangServer(conn=conn, config=Config()).run()
+
+    # Requests are served concurrently, so responses can come in any order
+    assert sorted(conn.sent, key=lambda r: r[1]) == [
+        ("result", 1),
+        ("error", 2, LSPErrCode.RequestCancelled),
+        ("result", 3),
+        ("error", 4, LSPErrCode.RequestCancelled),
+        ("result", 5)
+    ]
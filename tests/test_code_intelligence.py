@@ -185,3 +185,28 @@ def test_docs_on_hover():
     hov = doc.hover(Position(10, 6))
     assert "Sibling" in hov.contents.value
     assert hov.contents.kind == "markdown"
+
+
+def test_innermost_lookup_node():
+    from benten.code.intelligence import Intelligence, LookupNode, IntelligenceNode
+    from benten.langserver.lspobjects import Range
+
+    code_intel = Intelligence()
+    outer, inner, other = IntelligenceNode(), IntelligenceNode(), IntelligenceNode()
+    for node, loc in [
+        (outer, Range(Position(2, 4), Position(8, 10))),
+        (inner, Range(Position(4, 6), Position(4, 20))),
+        (other, Range(Position(10, 0), Position(10, 5)))
+    ]:
+        ln = LookupNode(loc=loc)
+        ln.intelligence_node = node
+        code_intel.add_lookup_node(ln)
+
+    assert code_intel.get_doc_element(Position(2, 3)) is None
+    assert code_intel.get_doc_element(Position(2, 4)) is outer
+    assert code_intel.get_doc_element(Position(4, 6)) is inner
+    assert code_intel.get_doc_element(Position(4, 20)) is inner
+    assert code_intel.get_doc_element(Position(4, 21)) is outer
+    assert code_intel.get_doc_element(Position(8, 10)) is outer
+    assert code_intel.get_doc_element(Position(8, 11)) is None
+    assert code_intel.get_doc_element(Position(10, 5)) is other
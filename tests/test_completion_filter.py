@@ -0,0 +1,86 @@
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import tempfile
+import pathlib
+
+from benten.code.completionfilter import rank_completions, word_before
+from benten.code.opendocument import OpenDocument
+from benten.langserver.lspobjects import CompletionItem, CompletionList, Position
+
+from lib import load_type_dicts
+
+type_dicts = load_type_dicts()
+
+
+def workflow(n_steps: int):
+    lines = ["class: Workflow", "cwlVersion: v1.0", "inputs:", "  in0: string", "steps:"]
+    for n in range(n_steps):
+        lines += [
+            f"  step{n}:",
+            "    run:",
+            "      class: CommandLineTool",
+            "      inputs: {in1: string}",
+            "      outputs: {out1: string, out2: string}",
+            "    in:",
+            f"      in1: {'in0' if n == 0 else f'step{n - 1}/out1'}",
+            "    out: [out1, out2]"
+        ]
+    lines += ["outputs: []", ""]
+    return "\n".join(lines)
+
+
+def test_word_before():
+    assert word_before("      in1: step12", 17) == "step12"
+    assert word_before("      in1: step12/ou", 20) == "ou"
+    assert word_before('      in1: "#step1', 18) == "step1"
+    assert word_before("    run: ..", 11) == ""
+    assert word_before("    run: tool.cw", 16) == "tool.cw"
+
+
+def test_ranking():
+    labels = ["in_file", "File", "file_list", "Directory", "profile", "fasta_index"]
+    items = [CompletionItem(label=label) for label in labels]
+
+    cmpl = rank_completions(items, "fi")
+    assert [c.label for c in cmpl.items] == ["file_list", "File", "in_file", "profile", "fasta_index"]
+    assert [c.sortText for c in cmpl.items] == ["0", "1", "2", "3", "4"]
+    assert cmpl.isIncomplete
+
+    cmpl = rank_completions([CompletionItem(label=label) for label in labels], "")
+    assert [c.label for c in cmpl.items] == labels
+    assert not cmpl.isIncomplete
+
+    cmpl = rank_completions([CompletionItem(label=label) for label in labels], "", limit=2)
+    assert [c.label for c in cmpl.items] == labels[:2]
+    assert cmpl.isIncomplete
+
+    assert rank_completions(None, "fi") is None
+
+
+def test_source_completion_is_bounded():
+    text = workflow(500)
+    doc = OpenDocument(
+        doc_uri=pathlib.Path(tempfile.mkdtemp(prefix="benten-test"), "wf.cwl").as_uri(),
+        scratch_path=tempfile.mkdtemp(prefix="benten-test"),
+        text=text,
+        version=1,
+        type_dicts=type_dicts)
+    doc.update()
+
+    line = text.splitlines().index("      in1: step299/out1")
+    doc.apply_changes([{
+        "range": {"start": {"line": line, "character": 17}, "end": {"line": line, "character": 23}},
+        "text": ""}])
+    doc.update()
+    loc = Position(line, 17)
+    assert doc.word_before(loc) == "step29"
+
+    cmpl = rank_completions(doc.completion(loc), doc.word_before(loc))
+    assert isinstance(cmpl, CompletionList)
+    labels = [c.label for c in cmpl.items]
+    assert labels[:11] == ["step29"] + [f"step29{n}" for n in range(10)]
+    assert labels[11:14] == ["step129", "step209", "step219"]
+    assert len(labels) < 100 and cmpl.isIncomplete
+
+    cmpl = rank_completions(doc.completion(Position(line, 15)), "st")
+    assert len(cmpl.items) == 100 and cmpl.isIncomplete
@@ -1,29 +1,17 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
 import os
-import shutil
 import pathlib
 
 from benten.configuration import Configuration
 
-test_dir = "./benten-test-config"
-
-
-def setup():
-    # First we make sure there is no existing config file, say from a previous run
-    shutil.rmtree(pathlib.Path(test_dir), ignore_errors=True)
-
-
-def teardown():
-    shutil.rmtree(pathlib.Path(test_dir), ignore_errors=True)
-
 
 # monkey patch is amazing!
 # https://docs.pytest.org/en/latest/monkeypatch.html
 # https://holgerkrekel.net/2009/03/03/monkeypatching-in-unit-tests-done-right/
-def test_basic(monkeypatch):
-    monkeypatch.setitem(os.environ, "XDG_CONFIG_HOME", test_dir)
-    monkeypatch.setitem(os.environ, "XDG_DATA_HOME", test_dir)
+def test_basic(monkeypatch, tmp_path):
+    monkeypatch.setitem(os.environ, "XDG_CONFIG_HOME", str(tmp_path))
+    monkeypatch.setitem(os.environ, "XDG_DATA_HOME", str(tmp_path))
 
     # test creation of config dirs and default files
     config = Configuration()
@@ -34,3 +22,56 @@ def test_basic(monkeypatch):
     assert config.scratch_path.exists()
 
     assert "v1.0" in config.lang_models
+
+
+def test_language_model_cache(monkeypatch, tmp_path):
+    monkeypatch.setitem(os.environ, "XDG_CONFIG_HOME", str(tmp_path))
+    monkeypatch.setitem(os.environ, "XDG_DATA_HOME", str(tmp_path))
+
+    config = Configuration()
+    config.initialize()
+    assert not config.lang_models.is_loaded("v1.0")
+    _ = config.lang_models["v1.0"]
+    assert config.lang_models.is_loaded("v1.0")
+    assert not config.lang_models.is_loaded("v1.1")
+    cached = sorted(config.model_cache_path.glob("schema-v1.0.*.pickle"))
+    assert len(cached) == 1
+
+    # Loaded from the cache
+    config = Configuration()
+    config.initialize()
+    assert sorted(config.model_cache_path.glob("schema-v1.0.*.pickle")) == cached
+    assert "Workflow" in config.lang_models["v1.0"]
+    assert config.lang_models["v1.0"]["Workflow"].fields["steps"].required
+
+    # A changed schema is not served from the stale cache, which is replaced
+    schema_path = pathlib.Path(config.cfg_path, "schema-v1.0.json")
+    schema_path.write_text(schema_path.read_text().replace('"Workflow"', '"WorkFlow"'))
+    config = Configuration()
+    config.initialize()
+    assert "WorkFlow" in config.lang_models["v1.0"]
+    assert "Workflow" not in config.lang_models["v1.0"]
+    assert len(list(config.model_cache_path.glob("schema-v1.0.*.pickle"))) == 1
+    assert sorted(config.model_cache_path.glob("schema-v1.0.*.pickle")) != cached
+
+    # A corrupt cache file is rebuilt
+    corrupt = next(config.model_cache_path.glob("schema-v1.0.*.pickle"))
+    corrupt.write_bytes(b"not a pickle")
+    config = Configuration()
+    config.initialize()
+    assert "WorkFlow" in config.lang_models["v1.0"]
+
+
+def test_language_model_prefetch(monkeypatch, tmp_path):
+    monkeypatch.setitem(os.environ, "XDG_CONFIG_HOME", str(tmp_path))
+    monkeypatch.setitem(os.environ, "XDG_DATA_HOME", str(tmp_path))
+
+    config = Configuration()
+    config.initialize()
+    thread = config.lang_models.prefetch("v1.0")
+
+    # Can be asked for while another is loading
+    assert "Workflow" in config.lang_models["v1.1"]
+    thread.join()
+    assert config.lang_models.is_loaded("v1.0")
+    assert not config.lang_models.is_loaded("v1.2.0-dev1")
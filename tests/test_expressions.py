@@ -1,10 +1,19 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
+import time
 import pathlib
 
-from benten.langserver.lspobjects import Position
+import pytest
 
-from lib import load, load_type_dicts
+from benten.langserver.lspobjects import Position, Range
+from benten.code.jscontexts import JSContexts, lib_key
+from benten.code.jsworkers import JSWorkerPool, JSTimeout, JSError
+from benten.code.executioncontext import ExecutionContext, inputs_slice
+from benten.code.workflowmodel import WorkflowModel
+from benten.cwl.expressiontype import ExpressionType, format_result, split_fragments, js_template
+from benten.cwl.parameterreference import evaluate_parameter_reference, Unresolved
+
+from lib import load, load_open, load_type_dicts
 
 current_path = pathlib.Path(__file__).parent
 schema_path = pathlib.Path(current_path, "../benten/000.package.data/")
@@ -49,3 +58,325 @@ def test_v1_1_runtime():
 
     hov = doc.hover(loc=Position(31, 34))
     assert "exitCode" in hov.contents.value
+
+
+def test_expression_lib(tmp_path):
+    cwl = """class: CommandLineTool
+cwlVersion: v1.0
+requirements:
+  InlineJavascriptRequirement:
+    expressionLib:
+      - function tag(x) { return "LIB1_" + x; }
+inputs:
+  in1:
+    type: string
+    inputBinding:
+      valueFrom: $(tag(inputs.in1))
+outputs: []
+"""
+    path = tmp_path / "clt.cwl"
+    path.write_text(cwl)
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+    assert "LIB1_" in doc.hover(loc=Position(10, 22)).contents.value
+
+    doc.apply_changes([{"text": cwl.replace("LIB1_", "LIB2_")}], version=2)
+    doc.update()
+    assert "LIB2_" in doc.hover(loc=Position(10, 22)).contents.value
+
+    doc.apply_changes([{"text": cwl.replace("tag(inputs.in1)", "nope(inputs.in1)")}], version=3)
+    doc.update()
+    assert "ReferenceError" in doc.hover(loc=Position(10, 22)).contents.value
+
+
+def test_js_contexts():
+    contexts = JSContexts(max_libs=2)
+    lib1, lib2, lib3 = ["var x = 1;"], ["var x = 2;"], ["var x = 3;"]
+
+    warm = contexts.interpreter(lib_key(lib1), lib1)
+    assert warm.evaljs("x") == 1
+    assert contexts.interpreter(lib_key(lib1)) is warm
+    assert contexts.interpreter(lib_key(lib2), lib2).evaljs("x") == 2
+    assert contexts.interpreter(lib_key(lib3), lib3).evaljs("x") == 3
+    assert lib_key(lib1) not in contexts
+
+
+def test_js_workers():
+    pool = JSWorkerPool(size=1, timeout=0.5, max_evaluations=3)
+    try:
+        lib = ["function inc(x) { return x + 1; }"]
+        assert pool.evaluate(lib, "inc(dukpy['inputs'].a)", inputs={"a": 1}) == 2
+        pid = pool._idle[0].process.pid
+
+        with pytest.raises(JSError):
+            pool.evaluate(lib, "nope()")
+
+        # The runaway worker is replaced
+        t0 = time.monotonic()
+        with pytest.raises(JSTimeout):
+            pool.evaluate(lib, "while(true){}")
+        assert time.monotonic() - t0 < 2
+        assert pool.evaluate(lib, "inc(1)") == 2
+        assert pool._idle[0].process.pid != pid
+
+        # In a batch, only the runaway expression times out
+        results = pool.evaluate_batch(lib, [("inc(1)", {}), ("while(true){}", {}), ("nope()", {}), ("inc(2)", {})])
+        assert results[0] == 2 and results[3] == 3
+        assert isinstance(results[1], JSTimeout)
+        assert isinstance(results[2], JSError)
+
+        # And recycled after max_evaluations
+        pid = pool._idle[0].process.pid
+        pool.evaluate(lib, "inc(1)")
+        pool.evaluate(lib, "inc(1)")
+        assert pool._idle[0].process.pid != pid
+    finally:
+        pool.close()
+
+
+def test_js_globals_do_not_carry_over():
+    pool = JSWorkerPool(size=1, timeout=2)
+    try:
+        lib = ["var fromLib = 1;"]
+        leak = "leaked = 42; fromLib"
+        read = "typeof leaked + ' ' + fromLib"
+        # In one batch, and in separate evaluations in the same warm interpreter
+        batch = [(leak, {}), (read, {}), ("var declared = 1; 2", {}), ("typeof declared", {})]
+        assert pool.evaluate_batch(lib, batch) == [1, "undefined 1", 2, "undefined"]
+        assert pool.evaluate(lib, leak) == 1
+        assert pool.evaluate(lib, read) == "undefined 1"
+        # As the expressions of a document are sent
+        assert pool.evaluate(lib, js_template("leaked = 1; return 1;"), inputs={}) == 1
+        assert pool.evaluate(lib, read) == "undefined 1"
+    finally:
+        pool.close()
+
+
+def test_js_lib_globals_are_restored():
+    pool = JSWorkerPool(size=1, timeout=2)
+    try:
+        lib = ["var counts = {n: 0}; var seen = [];", "function f() { return 1; }"]
+        mutate = "counts.n += 1; seen.push(counts.n); f = function () { return 2; }; counts.n"
+        read = "[counts.n, seen.length, f()]"
+        assert pool.evaluate_batch(lib, [(mutate, {}), (read, {})]) == [1, [0, 0, 1]]
+        assert pool.evaluate(lib, mutate) == 1
+        assert pool.evaluate(lib, read) == [0, 0, 1]
+        assert pool.evaluate(lib, "delete counts; typeof counts") == "undefined"
+        assert pool.evaluate(lib, read) == [0, 0, 1]
+    finally:
+        pool.close()
+
+
+def test_endless_loop_hover(tmp_path):
+    cwl = """class: CommandLineTool
+cwlVersion: v1.0
+requirements:
+  InlineJavascriptRequirement: {}
+inputs:
+  in1:
+    type: string
+    inputBinding:
+      valueFrom: ${ while(true){} }
+outputs: []
+"""
+    path = tmp_path / "clt.cwl"
+    path.write_text(cwl)
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    pool = JSWorkerPool(timeout=0.2)
+    doc.code_intelligence.execution_context.js_workers = pool
+    try:
+        assert "timed out" in doc.hover(loc=Position(8, 22)).contents.value
+        # Not remembered: it may have been a busy machine
+        assert len(doc.code_intelligence.execution_context.evaluations._results) == 0
+    finally:
+        pool.close()
+
+
+def test_inputs_slice():
+    inputs = {"a": 1, "b": 2, "c": 3}
+    assert inputs_slice("inputs.a + inputs. b", inputs) == {"a": 1, "b": 2}
+    assert inputs_slice("inputs.a + inputs['b']", inputs) == inputs
+    assert inputs_slice("runtime.cores", inputs) == {}
+
+
+def test_sample_data(tmp_path):
+    cwl = """class: CommandLineTool
+cwlVersion: v1.0
+inputs:
+  in1:
+    type: File
+    inputBinding:
+      valueFrom: $(inputs.in1.size)
+outputs: []
+"""
+    path = tmp_path / "clt.cwl"
+    path.write_text(cwl)
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+    execution_context = doc.latest.code_intelligence.execution_context
+    data = execution_context.sample_data
+    execution_context.write_job_file()
+    signature = execution_context.job_file_signature()
+    assert signature is not None
+
+    # Same interface, same sample data, and the job file is left alone
+    doc.apply_changes([{"text": cwl.replace("size", "basename")}], version=2)
+    doc.update()
+    assert doc.latest.code_intelligence.execution_context.sample_data is data
+    assert execution_context.job_file_signature() == signature
+
+    # ... also in a later session
+    later = ExecutionContext(execution_context.doc_uri, execution_context.cwl,
+                             execution_context.user_types, execution_context.scratch_path)
+    assert later.sample_data == data
+    later.write_job_file()
+    assert later.job_file_signature() == signature
+
+    # A new port changes the interface. The values depend only on the port
+    doc.apply_changes([{"text": cwl.replace("outputs: []", "outputs:\n  out1: int")}], version=3)
+    doc.update()
+    new_data = doc.latest.code_intelligence.execution_context.sample_data
+    assert new_data["inputs"] == data["inputs"]
+    assert isinstance(new_data["outputs"]["out1"], int)
+    execution_context = doc.latest.code_intelligence.execution_context
+    execution_context.write_job_file()
+    assert execution_context.job_file_signature() != signature
+
+
+def test_lazy_sample_data(monkeypatch):
+    import benten.code.sampledata as sampledata
+
+    generated = []
+
+    def step_outputs(doc_uri, run_field, parent_user_types):
+        generated.append(run_field["id"])
+        return {"out1": run_field["id"]}
+
+    monkeypatch.setattr(sampledata, "extract_step_sample_outputs", step_outputs)
+    cwl = {
+        "inputs": {"in1": "string", "in2": "int"},
+        "outputs": {},
+        "steps": {f"step{n}": {"run": {"id": f"tool{n}"}} for n in range(3)}
+    }
+    inputs = sampledata.get_sample_data("file:///wf.cwl", WorkflowModel(cwl), {})["inputs"]
+
+    assert inputs["step1/out1"] == "tool1"
+    assert inputs.get("step1/out2") is None
+    assert generated == ["tool1"]
+    assert inputs_slice("inputs.in1", inputs) == {"in1": inputs["in1"]}
+    assert generated == ["tool1"]
+    # Step outputs are not inputs of the process
+    assert inputs_slice("JSON.stringify(inputs)", inputs) == {"in1": inputs["in1"], "in2": inputs["in2"]}
+    assert generated == ["tool1"]
+
+    assert list(inputs) == ["in1", "in2", "step0/out1", "step1/out1", "step2/out1"]
+    assert generated == ["tool1", "tool0", "tool2"]
+
+
+def test_evaluation_cache(tmp_path):
+    path = current_path / "cwl" / "misc" / "clt1.cwl"
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    execution_context = doc.code_intelligence.execution_context
+    execution_context.scratch_path = tmp_path
+
+    class CountingPool(JSWorkerPool):
+        evaluations = 0
+
+        def evaluate_batch(self, expression_lib, batch):
+            CountingPool.evaluations += len(batch)
+            return super().evaluate_batch(expression_lib, batch)
+
+    pool = CountingPool()
+    execution_context.js_workers = pool
+    try:
+        first = doc.hover(loc=Position(7, 25)).contents.value
+        n = CountingPool.evaluations
+        assert n > 0
+        assert doc.hover(loc=Position(7, 25)).contents.value == first
+        assert CountingPool.evaluations == n
+
+        # Editing the job file invalidates the results
+        job_file = execution_context.write_job_file()
+        job_file.write_text("#custom\ninputs:\n  in1: CUSTOM\noutputs: {}\n")
+        assert "A_CUSTOM_B" in doc.hover(loc=Position(7, 25)).contents.value
+        assert CountingPool.evaluations > n
+    finally:
+        pool.close()
+
+
+def test_inlay_hints(monkeypatch):
+    import benten.code.executioncontext as executioncontext
+
+    path = current_path / "cwl" / "misc" / "clt1.cwl"
+    doc = load(doc_path=path, type_dicts=type_dicts)
+    checks = []
+    signature = executioncontext.file_signature
+    monkeypatch.setattr(executioncontext, "file_signature", lambda p: checks.append(p) or signature(p))
+
+    hints = doc.inlay_hints()
+    assert [h.position.line for h in hints] == [7, 10, 17]
+    assert hints[0].label.startswith("= A_")
+    assert hints[1].label.endswith("…")
+    assert "outdirSize" in hints[1].tooltip.value
+
+    # Evaluated once per version, and the job file is looked at once per request
+    checks.clear()
+    assert doc.inlay_hints() is hints
+    assert len(checks) == 1
+    assert [h.position.line for h in doc.inlay_hints(Range(Position(8, 0), Position(17, 0)))] == [10]
+
+
+def test_parameter_references():
+    import dukpy
+
+    inputs = {
+        "bam": {"class": "File", "basename": "a.bam", "size": 12.0, "secondaryFiles": [{"basename": "a.bai"}]},
+        "n": 3, "x": 0.5, "flag": True, "nothing": None, "words": ["a", "b"], "text": "h\U0001F600",
+        "odd key": "spaces", "quote'd": "quoted", "numbered": {"2": "b", "1": "a"}
+    }
+    runtime = {"cores": 4, "outdir": "/out/dir"}
+
+    simple = [
+        "inputs.bam.basename", "inputs.bam['basename']", 'inputs.bam["basename"]', "inputs.bam.size",
+        "inputs.bam.secondaryFiles[0].basename", "inputs.bam", "inputs.words.length", "inputs.words[1]",
+        "inputs.text.length", "inputs['odd key']", "inputs['quote\\'d']", "inputs.n", "inputs.x",
+        "inputs.flag", "inputs.nothing", "runtime.cores", "runtime", "self"]
+    left_to_js = [
+        "inputs.missing", "inputs.nothing.basename", "inputs.words[5]", "inputs.numbered",
+        "inputs.bam.basename.toUpperCase()", "inputs.n + 1", "inputs . n", "outputs.x", ""]
+
+    for ref in simple:
+        res = evaluate_parameter_reference(ref, runtime, inputs, None)
+        assert res is not Unresolved, ref
+        js = dukpy.evaljs([f"var inputs = dukpy['inputs']; var runtime = dukpy['runtime']; var self = null; {ref}"],
+                          inputs=inputs, runtime=runtime)
+        assert format_result(res, ExpressionType.ParameterReference) == \
+            format_result(js, ExpressionType.ParameterReference), ref
+
+    for ref in left_to_js:
+        assert evaluate_parameter_reference(ref, runtime, inputs, None) is Unresolved, ref
+
+
+def test_split_fragments():
+    def split(text):
+        return [(f["type"], f["exp"]) for f in split_fragments(text)]
+
+    P, R, J = ExpressionType.PlainString, ExpressionType.ParameterReference, ExpressionType.JSExpression
+
+    assert split("A_$(inputs.in1)_B_${return inputs.in1}") == \
+        [(P, "A_"), (R, "inputs.in1"), (P, "_B_"), (J, "return inputs.in1"), (P, "")]
+
+    # Nested brackets, and brackets in strings
+    assert split('${ if (x) { return {a: "}"}; } return ")"; }') == \
+        [(P, ""), (J, ' if (x) { return {a: "}"}; } return ")"; '), (P, "")]
+    assert split("$(inputs['a)'].b) and $(f(g(1)))") == \
+        [(P, ""), (R, "inputs['a)'].b"), (P, " and "), (R, "f(g(1))"), (P, "")]
+    assert split("${ return 'it\\'s }'; }") == [(P, ""), (J, " return 'it\\'s }'; "), (P, "")]
+
+    # Comments
+    assert split("${ // don't {\n return 1; /* } */ }") == [(P, ""), (J, " // don't {\n return 1; /* } */ "), (P, "")]
+
+    # Unclosed
+    assert split("$ $(inputs.a") == [(P, "$ $(inputs.a")]
+    assert split("$(a) ${ return 1;") == [(P, ""), (R, "a"), (P, " ${ return 1;")]
+
+    spans = [f["span"] for f in split_fragments("x$(a)y")]
+    assert spans == [(0, 1), (1, 5), (5, 6)]
@@ -0,0 +1,232 @@
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import queue
+import pathlib
+import tempfile
+
+import pytest
+
+from benten.code.document import Document
+from benten.code.intelligence import LookupNode
+from benten.code.textbuffer import TextBuffer
+from benten.langserver.analysis import AnalysisWorker
+from benten.langserver.lspobjects import Position, Range
+
+from lib import load_open, load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+
+type_dicts = load_type_dicts()
+
+
+def _edit(buffer, start, end, text):
+    buffer.edit(Range(Position(*start), Position(*end)), text)
+
+
+def test_text_buffer_edits():
+    buffer = TextBuffer("line0\nline1\r\nline2")
+
+    _edit(buffer, (1, 4), (1, 5), "X")
+    assert buffer.text == "line0\nlineX\r\nline2"
+
+    _edit(buffer, (0, 5), (2, 0), "")
+    assert buffer.text == "line0line2"
+    assert buffer.lines == ["line0line2"]
+
+    _edit(buffer, (0, 10), (0, 10), "\nline3\n")
+    assert buffer.text == "line0line2\nline3\n"
+    assert buffer.lines == ["line0line2\n", "line3\n", ""]
+
+    _edit(buffer, (2, 0), (2, 0), "line4")
+    assert buffer.text == "line0line2\nline3\nline4"
+
+    # Past the end of the document
+    _edit(buffer, (10, 0), (10, 0), "!")
+    assert buffer.text == "line0line2\nline3\nline4!"
+
+
+def test_text_buffer_utf16_offsets():
+    # The emoji is two UTF-16 code units, but one python character
+    buffer = TextBuffer("doc: \U0001F600 é\n")
+    _edit(buffer, (0, 7), (0, 8), "_")
+    assert buffer.text == "doc: \U0001F600_é\n"
+
+
+def test_incremental_document_update():
+    path = current_path / "cwl" / "misc" / "wf-unused-input.cwl"
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+    assert len(doc.latest.problems) == 1
+
+    # Connect the unused input, in2 -> in1
+    doc.apply_changes([
+        {
+            "range": {"start": {"line": 12, "character": 18}, "end": {"line": 12, "character": 19}},
+            "text": "1"
+        }
+    ], version=2)
+    doc.update()
+
+    assert doc.latest.version == 2
+    assert "source: in1" in doc.text
+    assert doc.text == path.read_text().replace("source: in2", "source: in1")
+    assert len(doc.latest.problems) == 1
+    assert doc.latest.problems[0].range.start.line == 5
+
+
+def test_unchanged_subtrees_are_reused():
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+    before = dict(doc.latest.code_intelligence.subtrees)
+    assert ("steps", "step1") in before and ("steps", "step2") in before
+
+    # Add a line inside step1
+    doc.apply_changes([
+        {
+            "range": {"start": {"line": 8, "character": 0}, "end": {"line": 8, "character": 0}},
+            "text": "    label: first step\n"
+        }
+    ])
+    doc.update()
+    after = doc.latest.code_intelligence.subtrees
+
+    assert after[("inputs", "in1")] is before[("inputs", "in1")]
+    assert after[("steps", "step1")] is not before[("steps", "step1")]
+    assert after[("steps", "step2")].lookup_nodes[0].intelligence_node is \
+        before[("steps", "step2")].lookup_nodes[0].intelligence_node
+    assert after[("steps", "step2")].start_line == before[("steps", "step2")].start_line + 1
+
+    assert len(doc.latest.problems) == 0
+    cmpl = doc.completion(Position(24, 11))  # Was (23, 11) before the edit
+    assert "out1" in [c.label for c in cmpl]
+
+    # Break a connection in the reused step
+    doc.apply_changes([
+        {
+            "range": {"start": {"line": 17, "character": 22}, "end": {"line": 17, "character": 23}},
+            "text": "2"
+        }
+    ])
+    doc.update()
+    assert len(doc.latest.problems) == 1
+    assert doc.latest.problems[0].message == "step1 has no port called out2"
+
+
+def test_previous_analysis_is_not_modified():
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+    before = doc.latest
+    workflow = before.code_intelligence.top_level_workflow
+    step_intels = dict(workflow.step_intels)
+
+    doc.apply_changes([
+        {
+            "range": {"start": {"line": 8, "character": 0}, "end": {"line": 8, "character": 0}},
+            "text": "    label: first step\n"
+        }
+    ], version=2)
+    doc.update()
+    after = doc.latest.code_intelligence
+
+    # Each analysis has its own workflow and execution context, and only the caches are shared
+    assert after.top_level_workflow is not workflow
+    assert after.execution_context is not before.code_intelligence.execution_context
+    assert after.execution_context.evaluations is before.code_intelligence.execution_context.evaluations
+    assert workflow.step_intels == step_intels
+    assert all(s.workflow is workflow for s in step_intels.values())
+
+    # Reused completers refer to the new workflow
+    reused = after.subtrees[("steps", "step2")].step_intels["step2"]
+    assert reused is not step_intels["step2"] and reused.workflow is after.top_level_workflow
+    cmpl = before.completion(Position(23, 11))
+    assert "out1" in [c.label for c in cmpl]
+
+
+@pytest.mark.parametrize("name", ["biscuit_align.cwl", "stringtie.cwl", "merge_bams.cwl"])
+def test_shifted_subtrees_match_a_fresh_parse(name):
+    path = current_path / "cwl" / "mgi" / "tools" / name
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+
+    # Moves every reused subtree down a line, twice
+    for version in (2, 3):
+        doc.apply_changes([
+            {
+                "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 0}},
+                "text": "\n"
+            }
+        ], version=version)
+        doc.update()
+
+    def lookup_table(code_intelligence):
+        return [
+            ((ln.loc.start.line, ln.loc.start.character, ln.loc.end.line, ln.loc.end.character),
+             type(ln.intelligence_node))
+            for ln in code_intelligence.lookup_table]
+
+    incremental = doc.latest.code_intelligence
+    assert all(isinstance(ln, LookupNode) for ln in incremental.lookup_table)
+
+    fresh = Document(
+        doc_uri=path.as_uri(), scratch_path=tempfile.mkdtemp(prefix="benten-test"),
+        text=doc.text, version=3, type_dicts=type_dicts)
+    assert lookup_table(incremental) == lookup_table(fresh.code_intelligence)
+
+    # And every node can still be looked up
+    for ln in incremental.lookup_table:
+        doc.hover(ln.loc.start)
+
+
+def test_last_good_analysis_is_served():
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+    good = doc.latest
+
+    # Unbalanced flow sequence: the YAML won't load
+    doc.apply_changes([
+        {
+            "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 0}},
+            "text": "x: [\n"
+        }
+    ], version=2)
+    assert doc.latest is good  # Nothing published until the analysis is done
+
+    doc.update()
+    assert doc.latest.version == 2 and not doc.latest.parsed
+    assert doc.latest.problems[0].code == "YAML err"
+    assert doc.last_good is good and doc.servable is good
+
+    cmpl = doc.completion(Position(23, 11))
+    assert "out1" in [c.label for c in cmpl]
+
+
+def test_analysis_worker():
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+    done = queue.Queue()
+    worker = AnalysisWorker(on_analysis=lambda d, analysis: done.put(analysis))
+
+    doc.apply_changes([{"text": path.read_text()}], version=2)
+    worker.schedule(doc)
+    analysis = done.get(timeout=30)
+    worker.stop()
+
+    assert analysis.version == 2 and doc.latest is analysis
+
+
+def test_analysis_is_debounced():
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc = load_open(doc_path=path, type_dicts=type_dicts)
+    done = queue.Queue()
+    worker = AnalysisWorker(on_analysis=lambda d, analysis: done.put(analysis), max_delay=0.3)
+
+    # As if the document took long to analyze, so edits in quick succession are batched up
+    doc.analysis_time = 10
+    for version in range(2, 7):
+        doc.apply_changes([{"text": path.read_text()}], version=version)
+        worker.schedule(doc)
+
+    analysis = done.get(timeout=30)
+    assert analysis.version == 6
+    with pytest.raises(queue.Empty):
+        done.get(timeout=0.5)
+
+    worker.stop()
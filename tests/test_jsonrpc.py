@@ -0,0 +1,140 @@
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import io
+import json
+import asyncio
+
+import pytest
+
+from benten.langserver.jsonrpc import JSONRPC2Connection, JSONRPC2ProtocolError, MessageBuffer, ReadWriter
+from benten.langserver.asyncjsonrpc import AsyncJSONRPC2Connection
+from benten.langserver.jsoncodec import available_codecs, get_codec
+from benten.langserver.lspobjects import (
+    to_dict, Diagnostic, DiagnosticSeverity, Hover, Position, Range, PublishDiagnosticsParams)
+
+
+class BufferWriter:
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes += [data]
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def frame(body: dict):
+    data = json.dumps(body).encode("utf-8")
+    return b"Content-Length: %d\r\n\r\n" % len(data) + data
+
+
+def test_async_connection():
+
+    async def exchange():
+        reader = asyncio.StreamReader()
+        writer = BufferWriter()
+        conn = AsyncJSONRPC2Connection(reader, writer)
+        conn.start()
+
+        # A message split across reads, with a non ASCII character
+        data = frame({"id": 1, "method": "textDocument/hover", "params": {"text": "é\U0001F600"}})
+        reader.feed_data(data[:10])
+        reader.feed_data(data[10:] + frame({"method": "initialized"}))
+        reader.feed_eof()
+
+        received = [await conn.read_message(), await conn.read_message()]
+        try:
+            await conn.read_message()
+        except EOFError:
+            received += ["EOF"]
+
+        conn.write_response(1, {"contents": "é"})
+        conn.send_notification("textDocument/publishDiagnostics", {})
+        await conn.close()
+        return received, writer.writes
+
+    received, writes = asyncio.run(exchange())
+
+    assert received == [
+        {"id": 1, "method": "textDocument/hover", "params": {"text": "é\U0001F600"}},
+        {"method": "initialized"},
+        "EOF"
+    ]
+
+    # Queued frames are written out together
+    assert len(writes) == 1
+    header, body = writes[0].split(b"\r\n\r\n", 1)
+    length = int(header.split(b"\r\n")[0][len(b"Content-Length: "):])
+    assert json.loads(body[:length]) == {"jsonrpc": "2.0", "id": 1, "result": {"contents": "é"}}
+    assert body[length:].startswith(b"Content-Length: ")
+
+
+@pytest.mark.parametrize("codec", available_codecs.keys())
+def test_message_buffer(codec):
+    decode = get_codec(codec).decode
+    messages = [
+        {"id": 1, "method": "textDocument/didOpen", "params": {"text": "doc: é\U0001F600 " * 5000}},
+        {"method": "initialized"},
+        {"id": 2, "result": {"contents": "ü"}}
+    ]
+    data = b"".join(frame(m) for m in messages)
+
+    for chunk_size in [1, 7, 4096, len(data)]:
+        buffer = MessageBuffer()
+        received = []
+        for n in range(0, len(data), chunk_size):
+            buffer.feed(data[n:n + chunk_size])
+            msg = buffer.next_message(decode)
+            while msg is not None:
+                received += [msg]
+                msg = buffer.next_message(decode)
+        assert received == messages
+
+
+def test_message_buffer_skips_bad_headers():
+    decode = get_codec("json").decode
+    message = {"method": "initialized"}
+    buffer = MessageBuffer()
+    buffer.feed(b"Content-Type: x\r\n\r\n" + b"Content-Length: x\r\n\r\n" + frame(message))
+
+    with pytest.raises(JSONRPC2ProtocolError, match="Missing"):
+        buffer.next_message(decode)
+    with pytest.raises(JSONRPC2ProtocolError, match="Invalid"):
+        buffer.next_message(decode)
+    assert buffer.next_message(decode) == message
+    assert buffer.next_message(decode) is None
+
+
+def test_blocking_connection_round_trip():
+    out = io.BytesIO()
+    message = {"id": 1, "method": "textDocument/hover", "params": {"doc": "Ünïcödé \U0001F600"}}
+    conn = JSONRPC2Connection(ReadWriter(io.BufferedReader(io.BytesIO(frame(message) * 2)), out))
+
+    assert conn.read_message() == message
+    assert conn.read_message() == message
+
+    conn.write_response(1, {"contents": "Ünïcödé \U0001F600"})
+    reply = JSONRPC2Connection(ReadWriter(io.BufferedReader(io.BytesIO(out.getvalue())), io.BytesIO()))
+    assert reply.read_message()["result"] == {"contents": "Ünïcödé \U0001F600"}
+
+
+@pytest.mark.parametrize("codec", available_codecs.keys())
+def test_codec_encodes_lsp_objects(codec):
+    codec = get_codec(codec)
+    params = PublishDiagnosticsParams(
+        uri="file:///wf.cwl",
+        diagnostics=[
+            Diagnostic(
+                _range=Range(Position(1, 2), Position(1, 5)),
+                message="Ünknown port \U0001F600",
+                severity=DiagnosticSeverity.Error)])
+    hover = Hover("$(inputs.x)", wrap_as_code_block=True)
+    message = {"jsonrpc": "2.0", "method": "textDocument/publishDiagnostics", "params": [params, hover, None]}
+
+    assert codec.decode(codec.encode(message)) == to_dict(message)
+    assert codec.decode(memoryview(codec.encode(message))) == to_dict(message)
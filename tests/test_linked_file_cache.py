@@ -0,0 +1,137 @@
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import os
+import pathlib
+import tempfile
+
+from benten.code.filecache import LinkedFileCache, linked_file_cache
+from benten.code.schemadef import extract_schemadef
+from benten.code.processinterface import process_interface_cache
+
+from lib import load_open, load_type_dicts
+
+type_dicts = load_type_dicts()
+
+tool = """cwlVersion: v1.0
+class: CommandLineTool
+inputs:
+  in1: string
+outputs:
+  {out}: File
+"""
+
+wf = """cwlVersion: v1.0
+class: Workflow
+inputs:
+  x: string
+outputs:
+  y:
+    type: File
+    outputSource: s1/out2
+steps:
+  s1:
+    run: tool.cwl
+    in:
+      in1: x
+    out: [out1]
+"""
+
+
+def _write(path: pathlib.Path, text: str, mtime_ns: int):
+    path.write_text(text)
+    # Don't depend on the resolution of the file system clock
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_linked_file_is_reloaded_only_when_changed():
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="benten-test")).resolve()
+    tool_path = tmp / "tool.cwl"
+    _write(tool_path, tool.format(out="out1"), 10**18)
+    (tmp / "wf.cwl").write_text(wf)
+
+    doc = load_open(tmp / "wf.cwl", type_dicts)
+    assert [p.message for p in doc.latest.problems] == ["s1 has no port called out2"]
+
+    linked_doc = linked_file_cache.load(tool_path)
+    assert linked_file_cache.load(tool_path) is linked_doc
+
+    doc.update()
+    assert linked_file_cache.load(tool_path) is linked_doc
+
+    _write(tool_path, tool.format(out="out2"), 2 * 10**18)
+    doc.update()
+    assert linked_file_cache.load(tool_path) is not linked_doc
+    assert doc.latest.problems == []
+
+    linked_doc = linked_file_cache.load(tool_path)
+    linked_file_cache.invalidate(tool_path)
+    assert linked_file_cache.load(tool_path) is not linked_doc
+
+    tool_path.unlink()
+    assert linked_file_cache.load(tool_path) is None
+
+
+def test_shared_schemadef_is_not_modified():
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="benten-test")).resolve()
+    (tmp / "types.yml").write_text("name: MyType\ntype: record\nfields: []\n")
+    cwl = {"requirements": [{"class": "SchemaDefRequirement", "types": [{"$import": "types.yml"}]}]}
+
+    doc_uri = (tmp / "wf.cwl").as_uri()
+    assert list(extract_schemadef(doc_uri, cwl).keys()) == ["types.yml#MyType"]
+    assert list(extract_schemadef(doc_uri, cwl).keys()) == ["types.yml#MyType"]
+    assert linked_file_cache.load(tmp / "types.yml").node["name"] == "MyType"
+
+
+def test_process_interface_cache():
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="benten-test")).resolve()
+    _write(tmp / "tool.cwl", tool.format(out="out1"), 10**18)
+    _write(tmp / "same_tool.cwl", tool.format(out="out1"), 10**18)
+    (tmp / "wf.cwl").write_text(wf + "  s2:\n    run: same_tool.cwl\n    in: {}\n    out: [out1]\n")
+
+    doc = load_open(tmp / "wf.cwl", type_dicts)
+    assert [p.message for p in doc.latest.problems] == ["s1 has no port called out2"]
+
+    # Files with the same contents share an interface
+    interface = process_interface_cache.get(
+        linked_file_cache.load(tmp / "tool.cwl").node, (tmp / "tool.cwl").read_text())
+    assert process_interface_cache.get(
+        linked_file_cache.load(tmp / "same_tool.cwl").node, (tmp / "same_tool.cwl").read_text()) is interface
+    assert interface.outputs["out1"].type == "File"
+
+    inputs = doc.latest.code_intelligence.execution_context.sample_data["inputs"]
+    # The same values, but not the same objects
+    assert inputs["s1/out1"] == inputs["s2/out1"]
+    assert inputs["s1/out1"] is not inputs["s2/out1"]
+
+    # A changed file is a different file
+    _write(tmp / "tool.cwl", tool.format(out="out2"), 2 * 10**18)
+    doc.update()
+    assert doc.latest.problems == []
+    assert process_interface_cache.get(
+        linked_file_cache.load(tmp / "tool.cwl").node, (tmp / "tool.cwl").read_text()) is not interface
+
+
+def test_linked_file_cache_is_bounded():
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="benten-test")).resolve()
+    cache = LinkedFileCache(max_size=2)
+    for name in ("a.cwl", "b.cwl", "c.cwl"):
+        (tmp / name).write_text("class: CommandLineTool\n")
+
+    a = cache.load(tmp / "a.cwl")
+    cache.load(tmp / "b.cwl")
+    assert cache.load(tmp / "a.cwl") is a
+    cache.load(tmp / "c.cwl")
+
+    # b was the least recently used
+    assert cache.load(tmp / "a.cwl") is a
+    assert set(cache._entries.keys()) == {tmp / "a.cwl", tmp / "c.cwl"}
+
+
+def test_open_document_knows_its_linked_files():
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="benten-test")).resolve()
+    _write(tmp / "tool.cwl", tool.format(out="out1"), 10**18)
+    (tmp / "wf.cwl").write_text(wf)
+
+    doc = load_open(tmp / "wf.cwl", type_dicts)
+    assert doc.links_to({tmp / "tool.cwl"})
+    assert not doc.links_to({tmp / "other.cwl"})
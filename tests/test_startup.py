@@ -0,0 +1,37 @@
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import sys
+import subprocess
+
+# Importing the entry point is most of what the server does before it can answer `initialize`.
+# The budget is generous (it is ~0.1s on a laptop) so this only trips on real regressions
+import_budget_s = 0.5
+
+deferred_modules = ["cwlformat", "dukpy", "ruamel.yaml", "urllib.request"]
+
+
+def import_times(module):
+    """Like `python -X importtime`: cumulative import time in seconds, by module"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         check=True, stderr=subprocess.PIPE, universal_newlines=True).stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_heavy_imports_are_deferred():
+    times = import_times("benten.__main__")
+    assert "benten.langserver.server" in times
+    for module in deferred_modules:
+        assert module not in times
+
+
+def test_import_time_budget():
+    # Best of a few, to not fail because of a busy machine
+    best = min(import_times("benten.__main__")["benten.__main__"] for _ in range(3))
+    assert best < import_budget_s
@@ -0,0 +1,87 @@
+#  Copyright (c) 2020 Seven Bridges. See LICENSE
+
+import pathlib
+import tempfile
+
+from benten.code.opendocument import OpenDocument
+from benten.code.workflowgraph import graph_diff, is_empty_diff
+from benten.langserver.server import LangServer
+
+from lib import load, load_type_dicts
+
+current_path = pathlib.Path(__file__).parent
+type_dicts = load_type_dicts()
+
+
+class Config:
+    scratch_path = pathlib.Path(tempfile.mkdtemp(prefix="benten-test"))
+    lang_models = type_dicts
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.notifications = []
+
+    def send_notification(self, method, params):
+        self.notifications += [(method, params)]
+
+
+def test_graph_diff(tmp_path):
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    graph = load(doc_path=path, type_dicts=type_dicts).wf_graph
+
+    diff = graph_diff(None, graph)
+    assert diff["nodes"]["update"] == graph["nodes"]
+    assert is_empty_diff(graph_diff(graph, graph))
+
+    new_path = tmp_path / "wf.cwl"
+    new_path.write_text(path.read_text().replace('in1: "#step1/out1"', 'in1: in1'))
+    diff = graph_diff(graph, load(doc_path=new_path, type_dicts=type_dicts).wf_graph)
+    assert diff["nodes"] == {"update": [], "remove": []}
+    assert diff["edges"]["remove"] == ["step1->step2"]
+    assert [e["id"] for e in diff["edges"]["update"]] == ["in1->step2"]
+
+
+def test_workflow_graph_notifications():
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc_uri = path.as_uri()
+    text = path.read_text()
+
+    conn = RecordingConnection()
+    server = LangServer(conn=conn, config=Config())
+    server.analysis.stop()
+    server.client_capabilities = {"experimental": {"workflowGraph": True}}
+
+    document = OpenDocument(doc_uri, Config.scratch_path, text, 1, type_dicts)
+    server.open_documents[doc_uri] = document
+
+    def analyze(new_text=None, version=1):
+        if new_text is not None:
+            document.apply_changes([{"text": new_text}], version=version)
+        server.analysis_done(document, document.update())
+        return [p for m, p in conn.notifications if m == "benten/workflowGraph"]
+
+    sent = analyze()
+    assert len(sent) == 1 and sent[0]["reset"]
+
+    # Nothing changed in the graph, nothing sent
+    assert len(analyze(text.replace("type: string[]", "type: string[]  # comment"), version=2)) == 1
+
+    sent = analyze(text.replace("      - step1/out1\n      - in1", "      - step1/out1"), version=3)
+    assert len(sent) == 2 and not sent[1]["reset"]
+    assert sent[1]["edges"]["remove"] == ["in1->out1"]
+    assert sent[1]["nodes"]["update"] == []
+
+    # The file is not needed by such a client
+    assert not list(Config.scratch_path.glob("*.json"))
+
+    # Closed, the document's graph is forgotten. Opened again, it is sent in full
+    server.serve_textDocument_didClose({"params": {"textDocument": {"uri": doc_uri}}})
+    assert doc_uri not in server.sent_graphs
+    server.analysis_done(document, document.latest)
+    assert len([m for m, p in conn.notifications if m == "benten/workflowGraph"]) == 2
+
+    document = OpenDocument(doc_uri, Config.scratch_path, text, 4, type_dicts)
+    server.open_documents[doc_uri] = document
+    sent = analyze()
+    assert len(sent) == 3 and sent[2]["reset"]
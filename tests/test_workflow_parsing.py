@@ -1,6 +1,7 @@
 #  Copyright (c) 2019 Seven Bridges. See LICENSE
 
 import pathlib
+from concurrent.futures import ThreadPoolExecutor
 
 from lib import load, load_type_dicts
 
@@ -27,8 +28,40 @@ def test_mass_wf_load():
             _ = load(doc_path=fname, type_dicts=type_dicts)
 
 
+def test_concurrent_loads():
+    # Documents are analyzed on their own thread while requests are served on others
+    type_dicts = load_type_dicts()
+    paths = list((current_path / "cwl" / "mgi" / "tools").glob("*.cwl"))[:12]
+    expected = {p: len(load(doc_path=p, type_dicts=type_dicts).code_intelligence.lookup_table) for p in paths}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        loaded = executor.map(
+            lambda p: len(load(doc_path=p, type_dicts=type_dicts).code_intelligence.lookup_table), paths * 4)
+        assert list(loaded) == [expected[p] for p in paths * 4]
+
+
 def test_connections():
     path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
     doc = load(doc_path=path, type_dicts=load_type_dicts())
 
     assert len(doc.problems) == 0
+
+
+def test_workflow_model():
+    path = current_path / "cwl" / "misc" / "wf-port-completer.cwl"
+    doc = load(doc_path=path, type_dicts=load_type_dicts())
+
+    # The model made for the parse is the one the workflow, graph and execution context use
+    model = doc.code_intelligence.workflow_model
+    assert doc.code_intelligence.top_level_workflow.model is model
+    assert doc.code_intelligence.execution_context.workflow_model is model
+
+    assert list(model.steps) == ["step1", "step2"]
+    src = model.steps["step2"].links["in1"].sources[0]
+    assert (src.source, src.step, src.port) == ("step1/out1", "step1", "out1")
+    assert src.range.start.line == 16
+    assert model.output_links["out1"].is_list
+    assert [s.source for s in model.output_links["out1"].sources] == ["step1/out1", "in1"]
+
+    edges = [(e["from"], e["to"]) for e in doc.wf_graph["edges"]]
+    assert ("step1", "step2") in edges
+    assert ("in1", "out1") in edges
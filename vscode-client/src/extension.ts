@@ -26,7 +26,8 @@ import * as path from 'path';
 import { 
 	LanguageClient, LanguageClientOptions, 
 	SettingMonitor, ServerOptions, 
-	ErrorAction, ErrorHandler, CloseAction, TransportKind 
+	ErrorAction, ErrorHandler, CloseAction, TransportKind,
+	ClientCapabilities, StaticFeature
 } from 'vscode-languageclient';
 
 import {Md5} from 'ts-md5'
@@ -40,9 +41,13 @@ function startLangServer(command: string, args: string[], documentSelector: stri
 	};
 	const clientOptions: LanguageClientOptions = {
 		documentSelector: documentSelector,
-    synchronize: { configurationSection: "cwl" }
+    synchronize: {
+      configurationSection: "cwl",
+      // Linked files (run: , $import, $include) are cached by the server
+      fileEvents: workspace.createFileSystemWatcher("**/*.{cwl,yml,yaml,json,js}")
+    }
 	}
-	return new LanguageClient(command, serverOptions, clientOptions).start();
+	return startClient(new LanguageClient(command, serverOptions, clientOptions));
 }
 
 
@@ -61,8 +66,94 @@ function startLangServerTCP(addr: number, documentSelector: string[]): Disposabl
 
 	const clientOptions: LanguageClientOptions = {
 		documentSelector: documentSelector,
+		synchronize: {
+			fileEvents: workspace.createFileSystemWatcher("**/*.{cwl,yml,yaml,json,js}")
+		}
+	}
+	return startClient(new LanguageClient(`tcp lang server (port ${addr})`, serverOptions, clientOptions));
+}
+
+
+// The server sends the changes to the workflow graph of a document as it is edited
+// (benten/workflowGraph) to clients that declare the experimental capability `workflowGraph`
+const workflowGraphFeature: StaticFeature = {
+	fillClientCapabilities(capabilities: ClientCapabilities) {
+		capabilities.experimental = capabilities.experimental || {};
+		(capabilities.experimental as any).workflowGraph = true;
+	},
+	initialize() {}
+}
+
+
+function startClient(client: LanguageClient): Disposable {
+	client.registerFeature(workflowGraphFeature);
+	client.onReady().then(() => {
+		client.onNotification("benten/workflowGraph", applyGraphDiff);
+	});
+	return client.start();
+}
+
+
+interface WorkflowGraph {
+	nodes: {[id: string]: any}
+	edges: {[id: string]: any}
+	"line-numbers": {[id: string]: number}
+}
+
+// The graph of each document, as built up from the benten/workflowGraph notifications
+const workflow_graphs: {[uri: string]: WorkflowGraph} = {}
+
+// The preview, if it is open
+let preview: {panel: WebviewPanel, on_disk_files: any} | undefined = undefined
+
+
+function applyGraphDiff(params: any) {
+	let graph = workflow_graphs[params.uri]
+	if (params.reset || !graph) {
+		graph = workflow_graphs[params.uri] = {nodes: {}, edges: {}, "line-numbers": {}}
+	}
+	for (let part of ["nodes", "edges"]) {
+		const items = (graph as any)[part]
+		for (let item of params[part].update) {
+			items[item.id] = item
+		}
+		for (let id of params[part].remove) {
+			delete items[id]
+		}
+	}
+	Object.assign(graph["line-numbers"], params["line-numbers"])
+
+	const activeEditor = window.activeTextEditor;
+	if (!preview || !activeEditor || activeEditor.document.uri.toString() !== params.uri) {
+		return
+	}
+	if (params.reset) {
+		updateWebviewContent(preview.panel, preview.on_disk_files)
+	} else {
+		preview.panel.webview.postMessage({
+			"command": "update-graph",
+			"nodes": params["nodes"],
+			"edges": params["edges"],
+			"line-numbers": params["line-numbers"]
+		})
+	}
+}
+
+
+function graphData(uri: string) {
+	const graph = workflow_graphs[uri]
+	if (graph) {
+		return {
+			"nodes": Object.keys(graph.nodes).map(k => graph.nodes[k]),
+			"edges": Object.keys(graph.edges).map(k => graph.edges[k]),
+			"line-numbers": graph["line-numbers"]
+		}
 	}
-	return new LanguageClient(`tcp lang server (port ${addr})`, serverOptions, clientOptions).start();
+
+	// A server that doesn't send notifications writes the graph out
+	const graph_name = Md5.hashStr(uri) + ".json"
+	const data_uri = path.join(preview_scratch_directory, graph_name);
+	return JSON.parse(fs.readFileSync(data_uri, "utf8"));
 }
 
 const preview_scratch_directory = get_scratch_dir()
@@ -116,6 +207,8 @@ export function activate(context: ExtensionContext) {
 
 			// And set its HTML content
 			updateWebviewContent(panel, on_disk_files)
+			preview = {panel, on_disk_files}
+			panel.onDidDispose(() => { preview = undefined }, null, context.subscriptions)
 
 			// Handle interactions on the graph
 			panel.webview.onDidReceiveMessage(
@@ -143,10 +236,13 @@ export function activate(context: ExtensionContext) {
 				context.subscriptions
 			)
 			
-			// We update the diagram each time we change the text 
+			// We update the diagram each time we change the text, unless the
+			// server sends us the changes
 			window.onDidChangeTextEditorSelection(
 				e => {
-					updateWebviewContent(panel, on_disk_files)
+					if (!workflow_graphs[e.textEditor.document.uri.toString()]) {
+						updateWebviewContent(panel, on_disk_files)
+					}
 				},
 				null,
 				context.subscriptions
@@ -164,10 +260,7 @@ function updateWebviewContent(panel: WebviewPanel, on_disk_files: [string, Uri])
   if (!activeEditor) {
     return;
 	}
-	const graph_name = Md5.hashStr(activeEditor.document.uri.toString()) + ".json"
-
-	const data_uri = path.join(preview_scratch_directory, graph_name);
-	var graph_data = JSON.parse(fs.readFileSync(data_uri, "utf8"));
+	var graph_data = graphData(activeEditor.document.uri.toString());
 
   panel.webview.html = `<!DOCTYPE html>
 <html lang="en">
@@ -279,6 +372,19 @@ function updateWebviewContent(panel: WebviewPanel, on_disk_files: [string, Uri])
 			"line": line_numbers[node_id]});
 	});
 
+	// Changes to the graph, from benten/workflowGraph notifications
+	window.addEventListener("message", function (event) {
+		const message = event.data
+		if (message.command !== "update-graph") {
+			return
+		}
+		nodes.update(message.nodes.update)
+		nodes.remove(message.nodes.remove)
+		edges.update(message.edges.update)
+		edges.remove(message.edges.remove)
+		Object.assign(line_numbers, message["line-numbers"])
+	});
+
 </script>
 
 </body>